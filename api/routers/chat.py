@@ -1,33 +1,102 @@
-from fastapi import APIRouter, Form, Query
+from fastapi import APIRouter, Form, Query, Request
 from fastapi.responses import JSONResponse, StreamingResponse
-from typing import Optional
+from starlette.concurrency import run_in_threadpool
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import asyncio
 import json
-import markdown2
+import threading
 
-from core.models import ChatRequest
+from core.models import ChatRequest, Source
 from core import pipeline
-from core.sessions import SessionStore, ChatSession
-from core.prompts import renderer
+from core.sessions import ChatExchange, ChatSession, get_session_store
+from core.summarizer import get_summary_worker
+from api.sse import coalesce_deltas
 from api.utils import validate_session_id, clamp_int
-from config import MIN_TOP_K, MAX_TOP_K
+from config import MIN_TOP_K, MAX_TOP_K, SSE_DISCONNECT_POLL, SSE_FLUSH_MS, SSE_FLUSH_BYTES
 
 router = APIRouter()
-store = SessionStore()
+store = get_session_store()
+
+
+async def _pump(source: AsyncIterator, queue: asyncio.Queue) -> None:
+    """Move chunks from ``source`` to ``queue``; ends with ``None``."""
+
+    try:
+        async for chunk in source:
+            queue.put_nowait(chunk)
+    except Exception as e:
+        queue.put_nowait(e)
+    finally:
+        queue.put_nowait(None)
+
+
+async def _watch_disconnect(request: Request, cancel: threading.Event, producer: asyncio.Task) -> None:
+    """Abort ``producer`` once the client of ``request`` has disconnected."""
+
+    while not producer.done():
+        if await request.is_disconnected():
+            cancel.set()
+            producer.cancel()
+            return
+        await asyncio.sleep(SSE_DISCONNECT_POLL)
+
+
+def _record_turn(
+    session_id: str,
+    message: str,
+    inactive_sources: Optional[List[str]],
+    sources: List[Source],
+    assistant: str,
+    usage: Dict,
+    llm_context: Optional[Dict[str, str]],
+) -> Tuple[ChatSession, ChatExchange]:
+    """Append a finished turn to the stored copy of the session.
+
+    The session is re-read when the turn is saved rather than saving the
+    copy loaded when the request started, so a title or summary written by
+    the summary worker during generation is kept.
+    """
+
+    added: List[ChatExchange] = []
+
+    def apply(session: ChatSession) -> None:
+        if inactive_sources is not None:
+            session.inactive_sources = inactive_sources
+        added.append(
+            session.add_exchange(
+                user=message,
+                context_used=[s.model_dump() for s in sources],
+                rag_prompt="",
+                assistant=assistant,
+                usage=usage,
+            )
+        )
+        session.llm_context = llm_context or {}
+        session.trim_history(20)
+
+    session = store.update(session_id, apply, create=True)
+    return session, added[0]
+
 
 @router.post("/chat")
 async def chat(
+    request: Request,
     message: str = Form(...),
     session_id: str = Form(...),
     persona: str = Form(""),
     inactive: Optional[str] = Form(None),
     template_id: str = Form("rag_chat"),
     top_k: int = Form(8),
+    flush_ms: Optional[int] = Form(None),
+    flush_bytes: Optional[int] = Form(None),
     stream: bool = Query(False),
 ):
     """Handle a single chat interaction.
 
     Parameters
     ----------
+    request:
+        Incoming request, watched for client disconnects while streaming.
     message:
         User supplied message content.
     session_id:
@@ -41,8 +110,14 @@ async def chat(
         Prompt template identifier to use when building the request.
     top_k:
         Number of context chunks to retrieve.
+    flush_ms, flush_bytes:
+        Override how long (milliseconds) and how much text (bytes) streamed
+        token deltas are buffered into one SSE frame; ``flush_ms=0`` sends
+        every token on its own.  The first token is always sent at once.
     stream:
         If ``True`` results are returned as a Server‑Sent Events stream.
+        Closing the stream early aborts the generation and skips saving the
+        turn and its summary update.
 
     Returns
     -------
@@ -52,97 +127,109 @@ async def chat(
     """
 
     session_id = validate_session_id(session_id)
-    session = store.load(session_id) or ChatSession.new(session_id=session_id, user_id="default")
-    if inactive:
-        session.inactive_sources = json.loads(inactive)
+    session = await run_in_threadpool(store.load, session_id) or ChatSession.new(session_id=session_id, user_id="default")
+    inactive_sources = json.loads(inactive) if inactive else None
     req = ChatRequest(
         user_id=session.user_id,
+        session_id=session.session_id,
         message=message,
         persona=persona or session.persona,
         template_id=template_id,
         top_k=clamp_int(top_k, MIN_TOP_K, MAX_TOP_K),
-        inactive_sources=session.inactive_sources,
+        inactive_sources=session.inactive_sources if inactive_sources is None else inactive_sources,
         stream=stream,
+        llm_context=session.llm_context or None,
     )
     if not stream:
-        resp = pipeline.chat_once(req)
-        html_response = markdown2.markdown(resp.text)
-        session.add_exchange(
-            user=message,
-            context_used=[s.model_dump() for s in resp.sources],
-            rag_prompt="",
-            assistant=resp.text,
-            html_response=html_response,
+        resp = await pipeline.achat_once(req)
+        session, exchange = await run_in_threadpool(
+            _record_turn, session_id, message, inactive_sources, resp.sources, resp.text, resp.usage, resp.llm_context
         )
-        session.trim_history(20)
-        if not session.title:
-            session.title = renderer.generate_title(f"User: {message}\nAssistant: {resp.text}")
-        session.summary = renderer.update_summary(session.summary, message, resp.text)
-        store.save(session)
+        get_summary_worker().submit(session.session_id, message, resp.text, user_id=session.user_id)
         return JSONResponse(
             {
-                "response": html_response,
+                "response": exchange.html,
                 "context": [s.model_dump() for s in resp.sources],
                 "chat_summary": session.summary,
                 "chat_title": session.title,
+                "usage": resp.usage,
+                "summary_pending": True,
             }
         )
 
+    frame_ms = clamp_int(SSE_FLUSH_MS if flush_ms is None else flush_ms, 0, 1000)
+    frame_bytes = clamp_int(SSE_FLUSH_BYTES if flush_bytes is None else flush_bytes, 1, 65536)
+
     async def event_stream():
+        cancel = threading.Event()
+        queue: asyncio.Queue = asyncio.Queue()
+        producer = asyncio.create_task(_pump(pipeline.achat_stream(req, cancel=cancel), queue))
+        watcher = asyncio.create_task(_watch_disconnect(request, cancel, producer))
         assistant = ""
         try:
-            for chunk in pipeline.chat_stream(req):
+            async for chunk in coalesce_deltas(queue, frame_ms, frame_bytes):
+                if chunk is None or cancel.is_set():
+                    break
+                if isinstance(chunk, Exception):
+                    yield f"event: error\ndata: {json.dumps({'error': str(chunk)})}\n\n"
+                    break
                 if chunk.type == "meta":
                     yield f"event: meta\ndata: {chunk.text or '{}'}\n\n"
                 elif chunk.type == "delta":
                     assistant += chunk.text or ""
                     yield f"event: delta\ndata: {json.dumps(chunk.text or '')}\n\n"
                 elif chunk.type == "done":
-                    html_response = markdown2.markdown(assistant)
-                    session.add_exchange(
-                        user=message,
-                        context_used=[s.model_dump() for s in (chunk.sources or [])],
-                        rag_prompt="",
-                        assistant=assistant,
-                        html_response=html_response,
-                    )
-                    session.trim_history(20)
-                    if not session.title:
-                        session.title = renderer.generate_title(
-                            f"User: {message}\nAssistant: {assistant}"
-                        )
-                    session.summary = renderer.update_summary(
-                        session.summary, message, assistant
+                    await run_in_threadpool(
+                        _record_turn,
+                        session_id,
+                        message,
+                        inactive_sources,
+                        chunk.sources or [],
+                        assistant,
+                        chunk.usage or {},
+                        chunk.llm_context,
                     )
-                    store.save(session)
+                    get_summary_worker().submit(session.session_id, message, assistant, user_id=session.user_id)
                     payload = {
                         "sources": [s.model_dump() for s in (chunk.sources or [])],
                         "usage": chunk.usage or {},
+                        "summary_pending": True,
                     }
                     yield f"event: done\ndata: {json.dumps(payload)}\n\n"
         except Exception as e:
             yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+        finally:
+            watcher.cancel()
+            if not producer.done():
+                cancel.set()
+                producer.cancel()
 
     return StreamingResponse(event_stream(), media_type="text/event-stream")
 
 
 @router.post("/chat-stream")
 async def chat_stream(
+    request: Request,
     message: str = Form(...),
     session_id: str = Form(...),
     persona: str = Form(""),
     inactive: Optional[str] = Form(None),
     template_id: str = Form("rag_chat"),
     top_k: int = Form(8),
+    flush_ms: Optional[int] = Form(None),
+    flush_bytes: Optional[int] = Form(None),
 ):
     """Convenience wrapper that forces streaming mode."""
 
     return await chat(
+        request=request,
         message=message,
         session_id=session_id,
         persona=persona,
         inactive=inactive,
         template_id=template_id,
         top_k=top_k,
+        flush_ms=flush_ms,
+        flush_bytes=flush_bytes,
         stream=True,
     )
@@ -0,0 +1,34 @@
+from fastapi import APIRouter
+
+from config import ANSWER_CACHE_ENABLED
+from core.llm import llm_metrics
+from core.pipeline import cancel_metrics
+from core.llm.cache import get_response_cache
+from core.llm.pool import endpoint_metrics
+from core.llm.scheduler import scheduler_metrics
+from core.warmup import get_warmer
+
+router = APIRouter(prefix="/api", tags=["llm"])
+
+@router.get("/llm/metrics")
+def get_llm_metrics():
+    """Return connection-pool, endpoint health, scheduler queue, cache and cancellation statistics."""
+    cache = get_response_cache()
+    answers = None
+    if ANSWER_CACHE_ENABLED:
+        from core.rag.retriever import get_db
+
+        answers = get_db().answers.stats()
+    return {
+        "clients": llm_metrics(),
+        "schedulers": scheduler_metrics(),
+        "endpoints": endpoint_metrics(),
+        "response_cache": cache.stats() if cache else None,
+        "answer_cache": answers,
+        "cancellations": cancel_metrics(),
+    }
+
+@router.get("/llm/status")
+def get_llm_status():
+    """Report whether the embedding model and Ollama models are warm."""
+    return get_warmer().status()
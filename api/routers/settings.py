@@ -10,6 +10,7 @@ from core.settings import (
     list_prompt_templates,
     get_prompt_template,
 )
+from core.prompts.renderer import invalidate_templates
 
 router = APIRouter(prefix="/api", tags=["settings"])
 
@@ -57,4 +58,5 @@ def put_prompt(tid: str, payload: Dict[str, Any]):
     if target.exists():
         shutil.copy(target, backup_dir / f"{tid}.{int(time.time())}.json")
     tmp.replace(target)
+    invalidate_templates(tid)
     return {"status": "ok"}
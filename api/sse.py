@@ -0,0 +1,81 @@
+from __future__ import annotations
+import asyncio
+from typing import AsyncIterator, List, Union
+
+from core.models import ChatChunk
+
+Item = Union[ChatChunk, Exception, None]
+
+
+async def coalesce_deltas(queue: asyncio.Queue, flush_ms: int, flush_bytes: int) -> AsyncIterator[Item]:
+    """Yield the items of ``queue`` with consecutive ``delta`` chunks merged.
+
+    The first delta is passed on immediately so the time to first token is
+    unchanged.  Later deltas are buffered and flushed as one chunk once
+    ``flush_ms`` milliseconds have passed since the first buffered delta or
+    ``flush_bytes`` bytes of UTF-8 text are waiting, and before any other
+    item.  ``flush_ms <= 0`` disables coalescing.  The stream ends after a
+    ``None`` or an exception item, which are yielded as well.
+
+    Parameters
+    ----------
+    queue:
+        Source of :class:`ChatChunk` items, terminated by ``None`` or an
+        exception.
+    flush_ms:
+        Longest time a delta may wait in the buffer.
+    flush_bytes:
+        Buffer size that triggers a flush regardless of time.
+
+    Returns
+    -------
+    AsyncIterator
+        The items of ``queue`` with deltas merged.
+    """
+
+    loop = asyncio.get_running_loop()
+    parts: List[str] = []
+    size = 0
+    deadline = 0.0
+    first = True
+
+    def flush() -> ChatChunk:
+        nonlocal size
+        text = "".join(parts)
+        parts.clear()
+        size = 0
+        return ChatChunk(type="delta", text=text)
+
+    while True:
+        if not parts:
+            item = await queue.get()
+        else:
+            try:
+                item = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    yield flush()
+                    continue
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    yield flush()
+                    continue
+        if isinstance(item, ChatChunk) and item.type == "delta":
+            if first or flush_ms <= 0:
+                first = False
+                yield item
+                continue
+            if not parts:
+                deadline = loop.time() + flush_ms / 1000
+            parts.append(item.text or "")
+            size += len((item.text or "").encode("utf-8"))
+            if size >= flush_bytes:
+                yield flush()
+            continue
+        if parts:
+            yield flush()
+        yield item
+        if item is None or isinstance(item, Exception):
+            return
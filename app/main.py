@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from config import BASE_DIR, UPLOAD_DIR
@@ -7,11 +8,31 @@ from api.routers.chat import router as chat_router
 from api.routers.search import router as search_router
 from api.routers.ingest import router as ingest_router
 from api.routers.settings import router as settings_router
+from api.routers.llm import router as llm_router
 from app.routes.api_sessions import router as sessions_router
 from app.routes.api_segments import router as segments_router
 from app.auth.session import setup_auth, load_settings_from_config
+from core.sessions import get_session_store, get_session_sweeper
+from core.summarizer import get_summary_worker
+from core.warmup import get_warmer
+from config import WARMUP_ENABLED
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if WARMUP_ENABLED:
+        get_warmer().start()
+    get_session_sweeper().start()
+    yield
+    get_warmer().stop()
+    get_session_sweeper().stop()
+    # Finish queued title/summary updates before the process exits
+    get_summary_worker().stop()
+    # ...then write out sessions still waiting in the write-behind cache
+    get_session_store().close()
+
+
+app = FastAPI(lifespan=lifespan)
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 app.mount("/documents", StaticFiles(directory=UPLOAD_DIR), name="documents")
 manager, settings = setup_auth(app, load_settings_from_config())
@@ -24,4 +45,5 @@ app.include_router(ingest_router)
 app.include_router(sessions_router)
 app.include_router(segments_router)
 app.include_router(settings_router)
+app.include_router(llm_router)
 
@@ -35,7 +35,7 @@ async def list_segments(source: str | None = Query(default=None)):
 async def delete_segment(seg_id: str):
     """Remove a single segment by identifier."""
     try:
-        db.collection.delete(ids=[seg_id])
+        db.delete_segments([seg_id])
         return {"status": "ok"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,32 +1,37 @@
-from fastapi import APIRouter, Request, HTTPException
+from fastapi import APIRouter, Query, Request, HTTPException
 from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 from datetime import datetime
-from core.sessions import ChatSession, SessionStore
-from api.utils import validate_session_id
-
-SESSION_COOKIE_NAME = "chat_session_id"
-
+from core.sessions import ChatSession, get_session_store
+from core.summarizer import get_summary_worker
+from api.utils import clamp_int, validate_session_id
+
+SESSION_COOKIE_NAME = "chat_session_id"
+
 router = APIRouter()
-store = SessionStore()
-
+store = get_session_store()
+
 @router.get("/sessions")
-async def list_sessions():
-    """Return lightweight metadata for all stored sessions."""
-    store.prune_empty()
-    summaries = []
-    for entry in store.list_sessions():
-        session = store.load(entry["id"])
-        if not session or not session.history:
-            continue
-        summaries.append(
-            {
-                "session_id": entry["id"],
-                "title": session.title if session else "",
-                "created_at": datetime.fromtimestamp(entry["modified"]).isoformat(),
-            }
-        )
+async def list_sessions(limit: int = Query(100), offset: int = Query(0)):
+    """Return lightweight metadata for stored sessions, newest first.
+
+    Sessions without any exchange are left out.  ``limit`` and ``offset``
+    page through the list; entries come from the store's metadata index,
+    so no session history is read.
+    """
+    entries = await run_in_threadpool(store.list_meta, clamp_int(limit, 1, 1000), max(offset, 0))
+    summaries = [
+        {
+            "session_id": entry["id"],
+            "title": entry["title"] or "",
+            "created_at": datetime.fromtimestamp(entry["created"]).isoformat(),
+            "modified_at": datetime.fromtimestamp(entry["modified"]).isoformat(),
+            "exchanges": entry["exchanges"],
+        }
+        for entry in entries
+    ]
     return JSONResponse(content=summaries)
-
+
 @router.get("/sessions/{session_id}")
 async def get_session_data(session_id: str):
     """Return the chat history for ``session_id``.
@@ -37,17 +42,13 @@ async def get_session_data(session_id: str):
     """
 
     session_id = validate_session_id(session_id)
-    session = store.load(session_id)
+    session = await run_in_threadpool(store.load, session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
 
     history_pairs = [[ex.user, ex.assistant] for ex in session.history]
-    path = store._session_path(session_id)  # access for timestamp metadata
-    created_at = (
-        datetime.fromtimestamp(path.stat().st_mtime).isoformat()
-        if path.exists()
-        else None
-    )
+    modified = await run_in_threadpool(store.modified, session_id)
+    created_at = datetime.fromtimestamp(modified).isoformat() if modified is not None else None
 
     return JSONResponse(
         content={
@@ -58,24 +59,39 @@ async def get_session_data(session_id: str):
             "history": history_pairs,
         }
     )
-
+
+@router.get("/sessions/{session_id}/meta")
+async def get_session_meta(session_id: str):
+    """Return the title and summary of ``session_id``.
+
+    Titles and summaries are generated in the background after each turn;
+    ``pending`` is ``True`` while an update is still queued or running, so
+    clients can poll until it settles.
+    """
+
+    session_id = validate_session_id(session_id)
+    session = await run_in_threadpool(store.load, session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {
+        "session_id": session.session_id,
+        "title": session.title,
+        "summary": session.summary,
+        "pending": get_summary_worker().is_pending(session_id),
+    }
+
 @router.get("/session")
 async def get_or_create_session(request: Request):
     """Return an existing session or create a new one if none is found."""
-    store.prune_empty()
     session_id = request.cookies.get(SESSION_COOKIE_NAME)
     try:
         session_id = validate_session_id(session_id) if session_id else None
     except ValueError:
         session_id = None
-    if session_id and store.exists(session_id):
-        session = store.load(session_id)
-        if not session or not session.history:
-            session = ChatSession.new(user_id="default")
-            store.save(session)
-    else:
+    session = await run_in_threadpool(store.load, session_id) if session_id else None
+    if session is None:
         session = ChatSession.new(user_id="default")
-        store.save(session)
+        await run_in_threadpool(store.save, session)
 
     response = JSONResponse({"session_id": session.session_id})
     response.set_cookie(key=SESSION_COOKIE_NAME, value=session.session_id, httponly=True)
@@ -87,7 +103,7 @@ async def create_session():
     """Always create and return a new chat session."""
 
     session = ChatSession.new(user_id="default")
-    store.save(session)
+    await run_in_threadpool(store.save, session)
 
     response = JSONResponse({"session_id": session.session_id})
     response.set_cookie(
@@ -4,7 +4,7 @@ from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
 from pathlib import Path
 from core.rag.retriever import db
-from core.sessions import ChatSession, SessionStore
+from core.sessions import ChatSession, get_session_store
 from api.utils import validate_session_id
 
 router = APIRouter()
@@ -13,7 +13,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 templates = Jinja2Templates(directory=BASE_DIR / "templates")
 
 SESSION_COOKIE_NAME = "chat_session_id"
-store = SessionStore()
+store = get_session_store()
 
 def get_documents():
     """Return a summary of ingested documents and segment counts."""
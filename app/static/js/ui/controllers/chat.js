@@ -4,6 +4,23 @@ import { Store } from "../store.js";
 import { md, escapeHtml } from "../render.js";
 import { qs } from "../../dom.js";
 import { showContext } from "./search.js";
+import { bus } from "../../components.js";
+
+// Title and summary are generated server-side after the reply; poll until ready.
+async function refreshSessionMeta(sessionId, tries = 10) {
+  for (let i = 0; i < tries; i++) {
+    await new Promise((r) => setTimeout(r, 1500));
+    try {
+      const meta = await api.getSessionMeta(sessionId);
+      if (!meta.pending) {
+        bus.dispatchEvent(new CustomEvent("session:meta", { detail: meta }));
+        return;
+      }
+    } catch {
+      return;
+    }
+  }
+}
 
 export function initChatController() {
   const chatWin = qs("#win_chat");
@@ -57,6 +74,7 @@ export function initChatController() {
           },
           onDone(data) {
             if (data?.sources) showContext(data.sources, text);
+            if (data?.summary_pending) refreshSessionMeta(Store.sessionId);
           },
         }
       );
@@ -71,6 +89,7 @@ export function initChatController() {
         });
         bubble.innerHTML = md(res.response ?? "(no response)");
         if (res.context) showContext(res.context, text);
+        if (res.summary_pending) refreshSessionMeta(Store.sessionId);
       } catch (e2) {
         bubble.innerHTML = `<em>Error:</em> ${escapeHtml(e2.message)}`;
       }
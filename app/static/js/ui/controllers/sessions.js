@@ -12,6 +12,12 @@ export async function initSessionsController(winId="win_sessions") {
   const comp = getComponent(winId, "session_list");
   if (comp) comp.render(await api.listSessions());
 
+  // a turn finished and its title/summary landed: refresh the list
+  bus.addEventListener("session:meta", async () => {
+    const list = getComponent(winId, "session_list");
+    if (list) list.render(await api.listSessions());
+  });
+
   bus.addEventListener("ui:list-select", async (ev) => {
     const { winId: srcWin, elementId, item, index } = ev.detail || {};
     if (srcWin !== winId || elementId !== "session_list") return;
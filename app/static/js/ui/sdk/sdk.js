@@ -120,6 +120,11 @@ export class DKClient {
     return asJsonSafe(res);
   }
 
+  async getSessionMeta(id) {
+    const res = await ok(await fetch(`/sessions/${encodeURIComponent(id)}/meta`, { headers: JSON_HEADERS, credentials: "same-origin" }));
+    return asJsonSafe(res);
+  }
+
   async listSegments(source) {
     const url = source ? `/segments?source=${encodeURIComponent(source)}` : "/segments";
     const res = await ok(await fetch(url, { headers: JSON_HEADERS, credentials: "same-origin" }));
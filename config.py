@@ -20,11 +20,121 @@ ALLOWED_DOCUMENT_EXTENSIONS = {".txt", ".pdf", ".md", ".html"}
 MIN_TOP_K = 1
 MAX_TOP_K = 20
 
+# === Retrieval ===
+# Coarse-to-fine search: match document vectors first once the library holds
+# at least RETRIEVAL_COARSE_MIN_DOCS documents, then query segments of the
+# best RETRIEVAL_COARSE_DOCS documents only.
+RETRIEVAL_COARSE_DOCS = int(os.getenv("RETRIEVAL_COARSE_DOCS", "20"))
+RETRIEVAL_COARSE_MIN_DOCS = int(os.getenv("RETRIEVAL_COARSE_MIN_DOCS", "50"))
+# Drop retrieved blocks whose distance exceeds this multiple of the best hit
+# (0 disables the cutoff)
+CONTEXT_SCORE_CLIFF = float(os.getenv("CONTEXT_SCORE_CLIFF", "1.5"))
+# Recently embedded queries kept in memory
+QUERY_EMBED_CACHE_SIZE = int(os.getenv("QUERY_EMBED_CACHE_SIZE", "1024"))
+# Opt-in semantic answer cache: reuse the answer of a past question whose
+# embedding is within ANSWER_CACHE_MAX_DISTANCE (cosine) and whose retrieval
+# returned the same segments
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "0") == "1"
+ANSWER_CACHE_MAX_DISTANCE = float(os.getenv("ANSWER_CACHE_MAX_DISTANCE", "0.05"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "2000"))
+
+# === Ingestion ===
+# Approximate size of the pages streamed out of text, Markdown and HTML files
+EXTRACT_PAGE_CHARS = int(os.getenv("EXTRACT_PAGE_CHARS", "8000"))
+# Parallelism and queue bounds for the staged ingest pipeline
+INGEST_PARSE_WORKERS = int(os.getenv("INGEST_PARSE_WORKERS", "2"))
+INGEST_CHUNK_WORKERS = int(os.getenv("INGEST_CHUNK_WORKERS", "1"))
+INGEST_EMBED_BATCH = int(os.getenv("INGEST_EMBED_BATCH", "64"))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "32"))
+# Near-duplicate chunk handling: "off" (store every chunk), "skip" (drop) or
+# "link" (drop but remember); opt-in because it changes what gets stored
+INGEST_DEDUP = os.getenv("INGEST_DEDUP", "off")
+DEDUP_MAX_DISTANCE = int(os.getenv("DEDUP_MAX_DISTANCE", "3"))
+
 # === Ollama ===
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3")
+# Comma-separated pool of Ollama servers; requests are load balanced across
+# them when more than one is given (defaults to OLLAMA_BASE_URL alone)
+OLLAMA_BASE_URLS = [
+    u.strip().rstrip("/") for u in os.getenv("OLLAMA_BASE_URLS", OLLAMA_BASE_URL).split(",") if u.strip()
+]
+# Seconds between health checks of pooled servers
+OLLAMA_HEALTH_INTERVAL = float(os.getenv("OLLAMA_HEALTH_INTERVAL", "10"))
+# Extra in-flight requests tolerated on a session's previous server before
+# its next turn is routed to a less busy one
+OLLAMA_STICKY_SLACK = int(os.getenv("OLLAMA_STICKY_SLACK", "2"))
 # Backwards compatibility for legacy code expecting OLLAMA_URL
 OLLAMA_URL = f"{OLLAMA_BASE_URL}/api/generate"
+# Pooled HTTP session used for every Ollama call (keep-alive connections)
+OLLAMA_POOL_SIZE = int(os.getenv("OLLAMA_POOL_SIZE", "10"))
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+OLLAMA_READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", "300"))
+# How long Ollama keeps a model loaded after each request (e.g. "30m", "-1")
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+# Context window assumed for prompt packing; the user's max_tokens is
+# reserved for the answer and the rest is filled in priority order.
+LLM_CONTEXT_WINDOW = int(os.getenv("LLM_CONTEXT_WINDOW", "4096"))
+# JSON object routing tasks ("answer", "title", "summary") to a model name or
+# {"provider": ..., "model": ...}; users can override it via task_models
+LLM_TASK_ROUTES = os.getenv("LLM_TASK_ROUTES", "")
+# Output token limits of background titles and summaries
+TITLE_MAX_TOKENS = int(os.getenv("TITLE_MAX_TOKENS", "24"))
+SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", "256"))
+# Requests served concurrently per backend; further calls queue by priority
+# (live streams, then blocking calls, then background titles/summaries).
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "2"))
+# Optional JSON object overriding the limit per base URL
+LLM_BACKEND_CONCURRENCY = os.getenv("LLM_BACKEND_CONCURRENCY", "")
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "64"))
+# Seconds of waiting that promote a queued request by one priority class
+LLM_QUEUE_AGING = float(os.getenv("LLM_QUEUE_AGING", "30"))
+
+# === LLM response cache ===
+# Opt-in on-disk cache of responses to byte-identical prompts
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "0") == "1"
+LLM_CACHE_PATH = Path(os.getenv("LLM_CACHE_PATH", str(BASE_DIR / "cache" / "llm_responses.sqlite3")))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_MB", "64")) * 1024 * 1024
+
+# === Warm-up ===
+# Preload the embedding model, vector store and Ollama models at startup
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "1") == "1"
+OLLAMA_WARM_MODELS = [m.strip() for m in os.getenv("OLLAMA_WARM_MODELS", OLLAMA_MODEL).split(",") if m.strip()]
+# Seconds between keep-alive pings, sent only within KEEPALIVE_HOURS
+# (local "start-end" hours, may wrap midnight; empty means always)
+KEEPALIVE_INTERVAL = float(os.getenv("KEEPALIVE_INTERVAL", "600"))
+KEEPALIVE_HOURS = os.getenv("KEEPALIVE_HOURS", "8-18")
+
+# === Streaming ===
+# Seconds between checks whether an SSE client has gone away; a disconnect
+# aborts the upstream generation
+SSE_DISCONNECT_POLL = float(os.getenv("SSE_DISCONNECT_POLL", "0.5"))
+# Token deltas after the first are coalesced into one SSE frame and flushed
+# every SSE_FLUSH_MS milliseconds or SSE_FLUSH_BYTES bytes (0 ms disables)
+SSE_FLUSH_MS = int(os.getenv("SSE_FLUSH_MS", "50"))
+SSE_FLUSH_BYTES = int(os.getenv("SSE_FLUSH_BYTES", "512"))
+
+# === Sessions ===
+# "json" (one file per session under sessions/) or "sqlite" (one WAL-mode
+# database that stores each exchange as its own row)
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "json")
+SESSION_DIR = Path(os.getenv("SESSION_DIR", str(BASE_DIR / "sessions")))
+SESSION_DB_PATH = Path(os.getenv("SESSION_DB_PATH", str(SESSION_DIR / "sessions.sqlite3")))
+# Live sessions kept in memory (0 disables the cache).  Saves are written
+# behind every SESSION_FLUSH_INTERVAL seconds (0 writes through) or as soon as
+# SESSION_DIRTY_LIMIT sessions are waiting, and on shutdown
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "256"))
+SESSION_FLUSH_INTERVAL = float(os.getenv("SESSION_FLUSH_INTERVAL", "2"))
+SESSION_DIRTY_LIMIT = int(os.getenv("SESSION_DIRTY_LIMIT", "32"))
+# Sessions that are still empty SESSION_PRUNE_MIN_AGE seconds after their last
+# save are deleted by a sweep every SESSION_PRUNE_INTERVAL seconds (0 disables)
+SESSION_PRUNE_INTERVAL = float(os.getenv("SESSION_PRUNE_INTERVAL", "900"))
+SESSION_PRUNE_MIN_AGE = float(os.getenv("SESSION_PRUNE_MIN_AGE", "3600"))
+# Titles and summaries are generated in the background; turns arriving within
+# this many seconds of each other are folded into one summary update.
+SUMMARY_DELAY_SECONDS = float(os.getenv("SUMMARY_DELAY_SECONDS", "2"))
 
 # === Prompt Templates ===
 PROMPTS_DIR = BASE_DIR / "prompts"
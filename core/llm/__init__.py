@@ -1,14 +1,54 @@
-from typing import Optional
-from .base import BaseLLM
+from typing import Dict, Optional, Tuple
+import threading
+from .base import AsyncTokenStream, BaseLLM, Generation, GenerationOptions, TokenStream, Usage
 from .ollama_llm import OllamaLLM
 from .openai_llm import OpenAILLM
-import os
+from .pool import OllamaPool, get_health_checker
+from config import OLLAMA_BASE_URLS
 
 DEFAULT_PROVIDER = "ollama"
 
-def make_llm(provider: str, model: Optional[str]) -> BaseLLM:
-    if provider == "openai" and os.getenv("OPENAI_API_KEY"):
-        return OpenAILLM(model=model)
-    if provider == "openai":
-        return OpenAILLM(model=model)
-    return OllamaLLM(model=model)
+_instances: Dict[Tuple[str, str, str], BaseLLM] = {}
+_instances_lock = threading.Lock()
+
+def make_llm(provider: str, model: Optional[str], base_url: Optional[str] = None) -> BaseLLM:
+    """Return the shared LLM client for ``(provider, model, base_url)``.
+
+    Clients are cached for the life of the process so their pooled HTTP
+    connections are reused across chat turns, titles and summaries.  Without
+    an explicit ``base_url`` and with several ``OLLAMA_BASE_URLS`` an
+    :class:`OllamaPool` over per-server clients is returned.
+    """
+
+    provider = "openai" if provider == "openai" else DEFAULT_PROVIDER
+    key = (provider, model or "", base_url or "")
+    if provider == DEFAULT_PROVIDER and not base_url and len(OLLAMA_BASE_URLS) > 1:
+        with _instances_lock:
+            llm = _instances.get(key)
+        if llm is None:
+            pool = OllamaPool(model, OLLAMA_BASE_URLS, client=lambda m, u: make_llm(DEFAULT_PROVIDER, m, u))
+            with _instances_lock:
+                llm = _instances.setdefault(key, pool)
+            get_health_checker()
+        return llm
+    with _instances_lock:
+        llm = _instances.get(key)
+        if llm is None:
+            if provider == "openai":
+                llm = OpenAILLM(model=model)
+            else:
+                llm = OllamaLLM(model=model, base_url=base_url)
+            _instances[key] = llm
+    return llm
+
+def llm_metrics() -> Dict[str, Dict[str, int]]:
+    """Connection-pool statistics for every cached client."""
+
+    with _instances_lock:
+        items = list(_instances.items())
+    out: Dict[str, Dict[str, int]] = {}
+    for (provider, _, _), llm in items:
+        stats = getattr(llm, "pool_stats", None)
+        if stats is not None:
+            out[f"{provider}:{llm.model}@{getattr(llm, 'base_url', '')}"] = stats()
+    return out
@@ -1,4 +1,124 @@
-from typing import Any, Iterator
+from dataclasses import dataclass, field, fields, replace
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+import asyncio
+
+@dataclass
+class Usage:
+    """Token counts and timings of one generation.
+
+    Durations are in milliseconds.  ``ttft_ms`` is measured by the server
+    (model load plus prompt evaluation); ``queue_wait_ms`` is the time spent
+    waiting for a scheduler slot before the request was sent.
+    """
+
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    tokens_per_second: float = 0.0
+    load_ms: float = 0.0
+    ttft_ms: float = 0.0
+    total_ms: float = 0.0
+    queue_wait_ms: float = 0.0
+    cached: bool = False
+
+    def update(self, other: Optional["Usage"]) -> None:
+        """Copy every field that ``other`` has set."""
+
+        if other is None:
+            return
+        for f in fields(self):
+            value = getattr(other, f.name)
+            if value:
+                setattr(self, f.name, value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {
+            f.name: round(getattr(self, f.name), 2) if f.type in ("float", float) else getattr(self, f.name)
+            for f in fields(self)
+            if f.name != "cached"
+        }
+        if self.cached:
+            out["cached"] = 1
+        return out
+
+@dataclass
+class GenerationOptions:
+    """Sampling and length settings of one generation.
+
+    ``None`` leaves a setting at the backend's default.  Backends receive it
+    as the ``options=`` keyword; Ollama maps it onto its ``options`` object.
+    """
+
+    num_predict: Optional[int] = None
+    num_ctx: Optional[int] = None
+    temperature: Optional[float] = None
+    top_p: Optional[float] = None
+    stop: Optional[List[str]] = None
+
+    def merged(self, override: Optional["GenerationOptions"]) -> "GenerationOptions":
+        """Copy of these options with every field ``override`` sets replaced."""
+
+        out = replace(self)
+        if override is not None:
+            for f in fields(override):
+                value = getattr(override, f.name)
+                if value is not None:
+                    setattr(out, f.name, value)
+        return out
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The fields that are set, keyed like Ollama's ``options``."""
+
+        return {f.name: getattr(self, f.name) for f in fields(self) if getattr(self, f.name) is not None}
+
+@dataclass
+class Generation:
+    """Complete response text together with its :class:`Usage`."""
+
+    text: str
+    usage: Usage = field(default_factory=Usage)
+    context: Optional[List[int]] = None
+
+class TokenStream:
+    """Iterator of text chunks whose ``usage`` is filled in as the stream ends.
+
+    Backends that keep conversation state also set ``context`` (the token
+    array to send with the next turn) once the stream is exhausted.
+    """
+
+    def __init__(self, chunks: Iterator[str], usage: Optional[Usage] = None) -> None:
+        self._chunks = iter(chunks)
+        self.usage = usage or Usage()
+        self.context: Optional[List[int]] = None
+
+    def __iter__(self) -> "TokenStream":
+        return self
+
+    def __next__(self) -> str:
+        return next(self._chunks)
+
+    def close(self) -> None:
+        close = getattr(self._chunks, "close", None)
+        if close is not None:
+            close()
+
+class AsyncTokenStream:
+    """Async counterpart of :class:`TokenStream`."""
+
+    def __init__(self, chunks: AsyncIterator[str], usage: Optional[Usage] = None) -> None:
+        self._chunks = chunks.__aiter__()
+        self.usage = usage or Usage()
+        self.context: Optional[List[int]] = None
+
+    def __aiter__(self) -> "AsyncTokenStream":
+        return self
+
+    async def __anext__(self) -> str:
+        return await self._chunks.__anext__()
+
+    async def aclose(self) -> None:
+        aclose = getattr(self._chunks, "aclose", None)
+        if aclose is not None:
+            await aclose()
 
 class BaseLLM:
     """Minimal LLM interface the app expects."""
@@ -10,5 +130,48 @@ class BaseLLM:
         raise NotImplementedError
 
     def stream_text(self, prompt: str, **kwargs: Any) -> Iterator[str]:
-        """Yield chunks of text for streaming UIs."""
+        """Yield chunks of text for streaming UIs.
+
+        Backends that report usage return a :class:`TokenStream`.
+        """
         raise NotImplementedError
+
+    def count_tokens(self, text: str) -> int:
+        """Approximate number of tokens in ``text`` for this model.
+
+        The default is a characters/4 heuristic; backends with access to
+        the model tokenizer may override it.
+        """
+        return (len(text) + 3) // 4 if text else 0
+
+    def generate(self, prompt: str, **kwargs: Any) -> Generation:
+        """Like :meth:`generate_text` but also return usage when the backend reports it."""
+        return Generation(self.generate_text(prompt, **kwargs))
+
+    async def agenerate_text(self, prompt: str, **kwargs: Any) -> str:
+        """Async :meth:`generate_text`; runs the sync call in a worker thread by default."""
+        return await asyncio.to_thread(self.generate_text, prompt, **kwargs)
+
+    async def agenerate(self, prompt: str, **kwargs: Any) -> Generation:
+        """Async :meth:`generate`."""
+        return await asyncio.to_thread(self.generate, prompt, **kwargs)
+
+    def astream_text(self, prompt: str, **kwargs: Any) -> AsyncTokenStream:
+        """Async :meth:`stream_text`; pulls the sync iterator from a worker thread by default."""
+        it = iter(self.stream_text(prompt, **kwargs))
+        stream = AsyncTokenStream(self._pull(it, lambda: stream), getattr(it, "usage", None))
+        return stream
+
+    async def _pull(self, it: Iterator[str], owner) -> AsyncIterator[str]:
+        done = object()
+        try:
+            while True:
+                chunk = await asyncio.to_thread(next, it, done)
+                if chunk is done:
+                    break
+                yield chunk
+            owner().context = getattr(it, "context", None)
+        finally:
+            close = getattr(it, "close", None)
+            if close is not None:
+                close()
@@ -0,0 +1,142 @@
+"""Persistent exact-prompt cache of LLM responses.
+
+Responses are keyed by a hash of provider, model, endpoint, generation
+options and the full prompt, and stored as the list of streamed chunks so a
+hit can be replayed token by token.  Entries expire after ``ttl`` seconds and
+the least recently used ones are evicted once the cache exceeds its entry or
+byte budget.
+"""
+from __future__ import annotations
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+
+from config import (
+    LLM_CACHE_ENABLED,
+    LLM_CACHE_MAX_BYTES,
+    LLM_CACHE_MAX_ENTRIES,
+    LLM_CACHE_PATH,
+    LLM_CACHE_TTL,
+)
+
+
+def cache_key(provider: str, model: str, base_url: str, options: Optional[Dict[str, Any]], prompt: str) -> str:
+    """Stable hex digest identifying one generation request."""
+
+    payload = json.dumps(
+        [provider, model or "", base_url or "", options or {}, prompt],
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=20).hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed response cache with TTL expiry and LRU eviction.
+
+    Parameters
+    ----------
+    path:
+        Database file; created on first use.
+    ttl:
+        Seconds an entry stays valid.
+    max_entries, max_bytes:
+        Size bounds enforced after each insert by dropping the least recently
+        used entries.
+    """
+
+    def __init__(self, path: Path, ttl: float, max_entries: int, max_bytes: int):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.executescript(
+            """
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY, chunks BLOB, size INTEGER, expires REAL, accessed REAL
+            );
+            CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+            """
+        )
+
+    def get(self, key: str) -> Optional[List[str]]:
+        """Return the cached chunks for ``key`` or ``None``."""
+
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT chunks, expires FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or row[1] < now:
+                if row is not None:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, key: str, chunks: List[str]) -> None:
+        """Store ``chunks`` under ``key`` and enforce the size bounds."""
+
+        blob = zlib.compress(json.dumps(chunks, ensure_ascii=False).encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (key, blob, len(blob), now + self.ttl, now),
+            )
+            self._conn.execute("DELETE FROM responses WHERE expires < ?", (now,))
+            self._conn.execute(
+                """
+                DELETE FROM responses WHERE key IN (
+                    SELECT key FROM (
+                        SELECT key,
+                               ROW_NUMBER() OVER (ORDER BY accessed DESC) AS n,
+                               SUM(size) OVER (ORDER BY accessed DESC ROWS UNBOUNDED PRECEDING) AS total
+                        FROM responses
+                    ) WHERE n > ? OR total > ?
+                )
+                """,
+                (self.max_entries, self.max_bytes),
+            )
+            self._conn.execute("COMMIT")
+
+    def clear(self) -> None:
+        """Drop every cached response."""
+
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"entries": entries, "bytes": size, "hits": self.hits, "misses": self.misses}
+
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Return the shared cache, or ``None`` when ``LLM_CACHE_ENABLED`` is off."""
+
+    global _cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache(LLM_CACHE_PATH, LLM_CACHE_TTL, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_MAX_BYTES)
+    return _cache
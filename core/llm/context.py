@@ -0,0 +1,58 @@
+"""Compact storage of Ollama conversation state.
+
+``/api/generate`` returns a ``context`` array of token ids that encodes the
+conversation so far; sending it back with the next prompt lets Ollama skip
+re-evaluating earlier turns.  The array is kept per chat session as base64
+of zlib-compressed little-endian uint32 values, together with the model it
+belongs to and a key of the static prompt prefix it was built with.
+"""
+from __future__ import annotations
+from array import array
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+import base64
+import sys
+import zlib
+
+
+def encode_tokens(tokens: List[int]) -> str:
+    """Pack ``tokens`` into a short ASCII string."""
+
+    arr = array("I", tokens)
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return base64.b64encode(zlib.compress(arr.tobytes(), 6)).decode("ascii")
+
+
+def decode_tokens(data: str) -> List[int]:
+    """Inverse of :func:`encode_tokens`."""
+
+    arr = array("I")
+    arr.frombytes(zlib.decompress(base64.b64decode(data)))
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return arr.tolist()
+
+
+@dataclass
+class ConversationState:
+    """Backend token context for one chat session."""
+
+    model: str
+    prefix: str
+    tokens: List[int]
+
+    def to_dict(self) -> Dict[str, str]:
+        return {"model": self.model, "prefix": self.prefix, "tokens": encode_tokens(self.tokens)}
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, str]]) -> Optional["ConversationState"]:
+        """Rehydrate stored state; returns ``None`` if missing or unreadable."""
+
+        if not data or not data.get("tokens"):
+            return None
+        try:
+            tokens = decode_tokens(data["tokens"])
+        except Exception:
+            return None
+        return cls(model=data.get("model", ""), prefix=data.get("prefix", ""), tokens=tokens)
@@ -1,32 +1,216 @@
-from typing import Any, Iterator
-import requests, json
-from config import OLLAMA_BASE_URL, OLLAMA_MODEL
-from .base import BaseLLM
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+import asyncio, json, weakref
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from config import (
+    OLLAMA_BASE_URL,
+    OLLAMA_MODEL,
+    OLLAMA_POOL_SIZE,
+    OLLAMA_CONNECT_TIMEOUT,
+    OLLAMA_READ_TIMEOUT,
+    OLLAMA_KEEP_ALIVE,
+)
+from .base import AsyncTokenStream, BaseLLM, Generation, GenerationOptions, TokenStream, Usage
 
-GENERATE_URL = f"{OLLAMA_BASE_URL}/api/generate"
+_NS_PER_MS = 1_000_000
+
+
+def _fill_usage(usage: Usage, obj: Dict[str, Any]) -> Usage:
+    """Copy the counters of Ollama's final response object into ``usage``."""
+
+    usage.prompt_tokens = int(obj.get("prompt_eval_count") or 0)
+    usage.completion_tokens = int(obj.get("eval_count") or 0)
+    eval_ns = obj.get("eval_duration") or 0
+    if eval_ns:
+        usage.tokens_per_second = usage.completion_tokens / (eval_ns / 1e9)
+    usage.load_ms = (obj.get("load_duration") or 0) / _NS_PER_MS
+    usage.ttft_ms = usage.load_ms + (obj.get("prompt_eval_duration") or 0) / _NS_PER_MS
+    usage.total_ms = (obj.get("total_duration") or 0) / _NS_PER_MS
+    return usage
 
 class OllamaLLM(BaseLLM):
-    def __init__(self, model: str | None = None, **kwargs: Any) -> None:
+    """Ollama backend talking to ``/api/generate`` over pooled keep-alive connections.
+
+    Sync calls share a :class:`requests.Session`; async calls share one
+    :class:`httpx.AsyncClient` per running event loop.
+    """
+
+    def __init__(
+        self,
+        model: str | None = None,
+        base_url: str | None = None,
+        pool_size: int = OLLAMA_POOL_SIZE,
+        connect_timeout: float = OLLAMA_CONNECT_TIMEOUT,
+        read_timeout: float = OLLAMA_READ_TIMEOUT,
+        keep_alive: str = OLLAMA_KEEP_ALIVE,
+        **kwargs: Any,
+    ) -> None:
         super().__init__(model or OLLAMA_MODEL)
+        self.base_url = (base_url or OLLAMA_BASE_URL).rstrip("/")
+        self.generate_url = f"{self.base_url}/api/generate"
+        self.timeout = (connect_timeout, read_timeout)
+        self.keep_alive = keep_alive
+        self._adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session = requests.Session()
+        self.session.mount("http://", self._adapter)
+        self.session.mount("https://", self._adapter)
+        self._pool_size = pool_size
+        self._aclients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+        self._async_requests = 0
 
-    def generate_text(self, prompt: str, **kwargs: Any) -> str:
-        payload = {"model": self.model, "prompt": prompt, "stream": False}
-        resp = requests.post(GENERATE_URL, json=payload, timeout=kwargs.get("timeout", 120))
+    def pool_stats(self) -> Dict[str, int]:
+        """Requests sent versus TCP connections opened by the pooled session."""
+
+        pools = self._adapter.poolmanager.pools
+        sent = opened = 0
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            sent += pool.num_requests
+            opened += pool.num_connections
+        return {
+            "requests": sent,
+            "connections": opened,
+            "reused": max(sent - opened, 0),
+            "async_requests": self._async_requests,
+        }
+
+    def _async_client(self) -> httpx.AsyncClient:
+        """Return the pooled async client bound to the running event loop."""
+
+        loop = asyncio.get_running_loop()
+        client = self._aclients.get(loop)
+        if client is None or client.is_closed:
+            connect, read = self.timeout
+            client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self._pool_size, max_keepalive_connections=self._pool_size),
+                timeout=httpx.Timeout(read, connect=connect),
+            )
+            self._aclients[loop] = client
+        return client
+
+    def _httpx_timeout(self, kwargs: Dict[str, Any]):
+        t = kwargs.get("timeout")
+        if t is None:
+            return httpx.USE_CLIENT_DEFAULT
+        if isinstance(t, tuple):
+            return httpx.Timeout(t[1], connect=t[0])
+        return httpx.Timeout(t)
+
+    def _payload(self, prompt: str, stream: bool, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """Request body.
+
+        ``options=`` (:class:`GenerationOptions`) becomes Ollama's ``options``
+        object and ``context=`` continues a conversation from its token state.
+        """
+
+        payload: Dict[str, Any] = {"model": self.model, "prompt": prompt, "stream": stream}
+        if self.keep_alive:
+            payload["keep_alive"] = self.keep_alive
+        options = kwargs.get("options")
+        if options is not None and options.to_dict():
+            payload["options"] = options.to_dict()
+        if kwargs.get("context"):
+            payload["context"] = list(kwargs["context"])
+        return payload
+
+    def generate(self, prompt: str, **kwargs: Any) -> Generation:
+        payload = self._payload(prompt, False, kwargs)
+        resp = self.session.post(self.generate_url, json=payload, timeout=kwargs.get("timeout", self.timeout))
         resp.raise_for_status()
         data = resp.json()
-        return data.get("response", "")
+        return Generation(data.get("response", ""), _fill_usage(Usage(), data), data.get("context"))
+
+    def generate_text(self, prompt: str, **kwargs: Any) -> str:
+        return self.generate(prompt, **kwargs).text
+
+    def load(self, options: Optional[GenerationOptions] = None) -> Usage:
+        """Load the model into memory without generating (an empty prompt).
+
+        Also refreshes the model's ``keep_alive`` expiry when it is already
+        loaded; the returned usage carries the load time.  Pass the
+        ``num_ctx`` later requests use, or Ollama reloads the model for them.
+        """
+
+        return self.generate("", options=options).usage
+
+    def running_models(self) -> List[Dict[str, Any]]:
+        """Models currently loaded by the server (``/api/ps``)."""
 
-    def stream_text(self, prompt: str, **kwargs: Any) -> Iterator[str]:
-        payload = {"model": self.model, "prompt": prompt, "stream": True}
-        with requests.post(GENERATE_URL, json=payload, stream=True, timeout=kwargs.get("timeout", None)) as r:
+        resp = self.session.get(f"{self.base_url}/api/ps", timeout=self.timeout)
+        resp.raise_for_status()
+        return resp.json().get("models", [])
+
+    def stream_text(self, prompt: str, **kwargs: Any) -> TokenStream:
+        stream = TokenStream(self._stream(prompt, lambda: stream, kwargs))
+        return stream
+
+    def _stream(self, prompt: str, owner, kwargs: Dict[str, Any]) -> Iterator[str]:
+        """Yield response chunks.
+
+        Once the ``cancel`` event in ``kwargs`` is set the stream stops and
+        leaving the ``with`` block closes the connection, which makes Ollama
+        abort the generation.
+        """
+
+        payload = self._payload(prompt, True, kwargs)
+        cancel = kwargs.get("cancel")
+        with self.session.post(self.generate_url, json=payload, stream=True, timeout=kwargs.get("timeout", self.timeout)) as r:
             r.raise_for_status()
             for line in r.iter_lines(decode_unicode=True):
+                if cancel is not None and cancel.is_set():
+                    break
+                if not line:
+                    continue
+                try:
+                    obj = json.loads(line)
+                except Exception:
+                    yield line
+                    continue
+                chunk = obj.get("response", "")
+                if chunk:
+                    yield chunk
+                if obj.get("done"):
+                    _fill_usage(owner().usage, obj)
+                    owner().context = obj.get("context")
+
+    async def agenerate(self, prompt: str, **kwargs: Any) -> Generation:
+        payload = self._payload(prompt, False, kwargs)
+        self._async_requests += 1
+        resp = await self._async_client().post(self.generate_url, json=payload, timeout=self._httpx_timeout(kwargs))
+        resp.raise_for_status()
+        data = resp.json()
+        return Generation(data.get("response", ""), _fill_usage(Usage(), data), data.get("context"))
+
+    async def agenerate_text(self, prompt: str, **kwargs: Any) -> str:
+        return (await self.agenerate(prompt, **kwargs)).text
+
+    def astream_text(self, prompt: str, **kwargs: Any) -> AsyncTokenStream:
+        stream = AsyncTokenStream(self._astream(prompt, lambda: stream, kwargs))
+        return stream
+
+    async def _astream(self, prompt: str, owner, kwargs: Dict[str, Any]) -> AsyncIterator[str]:
+        payload = self._payload(prompt, True, kwargs)
+        cancel = kwargs.get("cancel")
+        self._async_requests += 1
+        client = self._async_client()
+        async with client.stream("POST", self.generate_url, json=payload, timeout=self._httpx_timeout(kwargs)) as r:
+            r.raise_for_status()
+            async for line in r.aiter_lines():
+                if cancel is not None and cancel.is_set():
+                    break
                 if not line:
                     continue
                 try:
                     obj = json.loads(line)
-                    chunk = obj.get("response", "")
-                    if chunk:
-                        yield chunk
                 except Exception:
                     yield line
+                    continue
+                chunk = obj.get("response", "")
+                if chunk:
+                    yield chunk
+                if obj.get("done"):
+                    _fill_usage(owner().usage, obj)
+                    owner().context = obj.get("context")
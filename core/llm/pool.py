@@ -0,0 +1,354 @@
+"""Load balancing over several Ollama servers.
+
+With more than one URL in ``OLLAMA_BASE_URLS``, :func:`~core.llm.make_llm`
+returns an :class:`OllamaPool` that spreads requests over the servers:
+
+* each request goes to the healthy endpoint with the fewest requests in
+  flight that has the model installed;
+* calls passing ``affinity=`` (the chat session id) stick to the endpoint
+  that served the previous turn, which still holds that conversation in its
+  KV cache, unless it is more than ``sticky_slack`` requests busier than the
+  least loaded endpoint;
+* a request that fails before its first token is retried on another
+  endpoint, and the failing endpoint is ejected;
+* a background thread polls ``/api/tags`` of every endpoint each
+  ``OLLAMA_HEALTH_INTERVAL`` seconds, ejecting servers that stop answering,
+  bringing back those that recover and refreshing their model lists.
+
+Endpoint state is shared by all pools (one per model) in the process.
+"""
+from __future__ import annotations
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Set
+import logging
+import threading
+import time
+
+import httpx
+import requests
+
+from config import OLLAMA_CONNECT_TIMEOUT, OLLAMA_HEALTH_INTERVAL, OLLAMA_STICKY_SLACK
+from .base import AsyncTokenStream, BaseLLM, Generation, TokenStream
+from .ollama_llm import OllamaLLM
+
+log = logging.getLogger(__name__)
+
+_EJECT, _SKIP = "eject", "skip"
+
+
+def _failure_kind(exc: BaseException) -> Optional[str]:
+    """How a failed request affects its endpoint, or ``None`` if it must not be retried.
+
+    Connection problems, timeouts and server errors eject the endpoint; a
+    404 (model not installed there) only skips it for this request.
+    """
+
+    status = None
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        status = exc.response.status_code
+    elif isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+    elif isinstance(exc, (requests.ConnectionError, requests.Timeout, httpx.TransportError)):
+        return _EJECT
+    if status is None:
+        return None
+    if status == 404:
+        return _SKIP
+    return _EJECT if status >= 500 else None
+
+
+def _model_names(model: str) -> Set[str]:
+    return {model} if ":" in model else {model, f"{model}:latest"}
+
+
+@dataclass
+class Endpoint:
+    """Health and load of one Ollama server."""
+
+    url: str
+    healthy: bool = True
+    models: Optional[Set[str]] = None
+    outstanding: int = 0
+    requests: int = 0
+    failures: int = 0
+    last_error: Optional[str] = None
+    checked_at: Optional[float] = None
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def serves(self, model: str) -> bool:
+        """``True`` unless the server's model list is known and lacks ``model``."""
+
+        return self.models is None or bool(self.models & _model_names(model))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "models": sorted(self.models) if self.models is not None else None,
+            "checked_at": self.checked_at,
+        }
+
+
+_endpoints: Dict[str, Endpoint] = {}
+_endpoints_lock = threading.Lock()
+_checker: Optional["HealthChecker"] = None
+
+
+def get_endpoint(url: str) -> Endpoint:
+    url = url.rstrip("/")
+    with _endpoints_lock:
+        ep = _endpoints.get(url)
+        if ep is None:
+            ep = _endpoints[url] = Endpoint(url)
+    return ep
+
+
+def endpoint_metrics() -> Dict[str, Dict[str, Any]]:
+    """State of every pooled endpoint."""
+
+    with _endpoints_lock:
+        items = list(_endpoints.items())
+    return {url: ep.stats() for url, ep in items}
+
+
+class HealthChecker:
+    """Background thread polling ``/api/tags`` of every pooled endpoint."""
+
+    def __init__(self, interval: float = OLLAMA_HEALTH_INTERVAL, timeout: float = OLLAMA_CONNECT_TIMEOUT):
+        self.interval = interval
+        self.timeout = timeout
+        self.session = requests.Session()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self.interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ollama-health", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.check_all()
+
+    def check_all(self) -> None:
+        with _endpoints_lock:
+            endpoints = list(_endpoints.values())
+        for ep in endpoints:
+            self.check(ep)
+
+    def check(self, ep: Endpoint) -> bool:
+        """Probe ``ep``; updates its health and model list."""
+
+        try:
+            resp = self.session.get(f"{ep.url}/api/tags", timeout=self.timeout)
+            resp.raise_for_status()
+            names: Set[str] = set()
+            for m in resp.json().get("models", []):
+                names.update(n for n in (m.get("name"), m.get("model")) if n)
+        except Exception as exc:
+            with ep.lock:
+                if ep.healthy:
+                    log.warning("ejecting Ollama endpoint %s: %s", ep.url, exc)
+                ep.healthy, ep.last_error, ep.checked_at = False, str(exc), time.time()
+            return False
+        with ep.lock:
+            if not ep.healthy:
+                log.info("Ollama endpoint %s is back", ep.url)
+            ep.healthy, ep.models, ep.checked_at = True, names, time.time()
+        return True
+
+
+def get_health_checker() -> HealthChecker:
+    """Return the shared :class:`HealthChecker`, started on first use."""
+
+    global _checker
+    with _endpoints_lock:
+        if _checker is None:
+            _checker = HealthChecker()
+    _checker.start()
+    return _checker
+
+
+class NoEndpointAvailable(RuntimeError):
+    """Raised when every endpoint of a pool has failed a request."""
+
+
+class OllamaPool(BaseLLM):
+    """:class:`OllamaLLM` lookalike that routes each call to one of several servers.
+
+    Parameters
+    ----------
+    model:
+        Model name sent to every endpoint.
+    urls:
+        Base URLs of the Ollama servers.
+    client:
+        Factory returning the per-endpoint client for ``(model, url)``.
+    sticky_slack:
+        Extra in-flight requests tolerated on a session's previous endpoint
+        before it is routed elsewhere.
+    """
+
+    STICKY_MAX = 4096
+
+    def __init__(
+        self,
+        model: Optional[str],
+        urls: List[str],
+        client: Optional[Callable[[Optional[str], str], OllamaLLM]] = None,
+        sticky_slack: int = OLLAMA_STICKY_SLACK,
+    ) -> None:
+        self._client = client or (lambda m, u: OllamaLLM(model=m, base_url=u))
+        self.endpoints = [get_endpoint(u) for u in urls]
+        self._members = {ep.url: self._client(model, ep.url) for ep in self.endpoints}
+        super().__init__(next(iter(self._members.values())).model)
+        self.base_url = ",".join(ep.url for ep in self.endpoints)
+        self.sticky_slack = sticky_slack
+        self._sticky: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    # --- routing ---
+
+    def _acquire(self, affinity: Optional[str], tried: Set[str]) -> Endpoint:
+        with self._lock:
+            pool = [ep for ep in self.endpoints if ep.url not in tried and ep.serves(self.model)]
+            candidates = [ep for ep in pool if ep.healthy] or pool
+            if not candidates:
+                raise NoEndpointAvailable(f"no Ollama endpoint left for {self.model}")
+            least = min(ep.outstanding for ep in candidates)
+            chosen = None
+            if affinity:
+                url = self._sticky.get(affinity)
+                chosen = next((ep for ep in candidates if ep.url == url), None)
+                if chosen is not None and chosen.outstanding > least + self.sticky_slack:
+                    chosen = None
+            if chosen is None:
+                chosen = min(candidates, key=lambda ep: (ep.outstanding, ep.requests))
+            if affinity:
+                self._sticky[affinity] = chosen.url
+                self._sticky.move_to_end(affinity)
+                while len(self._sticky) > self.STICKY_MAX:
+                    self._sticky.popitem(last=False)
+            with chosen.lock:
+                chosen.outstanding += 1
+                chosen.requests += 1
+        return chosen
+
+    def _release(self, ep: Endpoint) -> None:
+        with ep.lock:
+            ep.outstanding -= 1
+
+    def _failed(self, ep: Endpoint, exc: BaseException, tried: Set[str]) -> bool:
+        """Record a failure on ``ep``; ``True`` if the request may move on."""
+
+        kind = _failure_kind(exc)
+        with ep.lock:
+            ep.failures += 1
+            ep.last_error = str(exc)
+            if kind == _EJECT:
+                ep.healthy = False
+        if kind == _EJECT:
+            log.warning("Ollama endpoint %s failed, retrying elsewhere: %s", ep.url, exc)
+        tried.add(ep.url)
+        return kind is not None and len(tried) < len(self.endpoints)
+
+    # --- BaseLLM ---
+
+    def pool_stats(self) -> Dict[str, int]:
+        out: Dict[str, int] = {}
+        for member in self._members.values():
+            for k, v in member.pool_stats().items():
+                out[k] = out.get(k, 0) + v
+        return out
+
+    def generate(self, prompt: str, **kwargs: Any) -> Generation:
+        tried: Set[str] = set()
+        while True:
+            ep = self._acquire(kwargs.get("affinity"), tried)
+            try:
+                return self._members[ep.url].generate(prompt, **kwargs)
+            except Exception as exc:
+                if not self._failed(ep, exc, tried):
+                    raise
+            finally:
+                self._release(ep)
+
+    def generate_text(self, prompt: str, **kwargs: Any) -> str:
+        return self.generate(prompt, **kwargs).text
+
+    async def agenerate(self, prompt: str, **kwargs: Any) -> Generation:
+        tried: Set[str] = set()
+        while True:
+            ep = self._acquire(kwargs.get("affinity"), tried)
+            try:
+                return await self._members[ep.url].agenerate(prompt, **kwargs)
+            except Exception as exc:
+                if not self._failed(ep, exc, tried):
+                    raise
+            finally:
+                self._release(ep)
+
+    async def agenerate_text(self, prompt: str, **kwargs: Any) -> str:
+        return (await self.agenerate(prompt, **kwargs)).text
+
+    def stream_text(self, prompt: str, **kwargs: Any) -> TokenStream:
+        stream = TokenStream(self._stream(prompt, lambda: stream, kwargs))
+        return stream
+
+    def _stream(self, prompt: str, owner, kwargs: Dict[str, Any]) -> Iterator[str]:
+        tried: Set[str] = set()
+        while True:
+            ep = self._acquire(kwargs.get("affinity"), tried)
+            inner = self._members[ep.url].stream_text(prompt, **kwargs)
+            started = False
+            try:
+                for chunk in inner:
+                    started = True
+                    yield chunk
+                owner().usage.update(inner.usage)
+                owner().context = inner.context
+                return
+            except Exception as exc:
+                if started or not self._failed(ep, exc, tried):
+                    raise
+            finally:
+                inner.close()
+                self._release(ep)
+
+    def astream_text(self, prompt: str, **kwargs: Any) -> AsyncTokenStream:
+        stream = AsyncTokenStream(self._astream(prompt, lambda: stream, kwargs))
+        return stream
+
+    async def _astream(self, prompt: str, owner, kwargs: Dict[str, Any]) -> AsyncIterator[str]:
+        tried: Set[str] = set()
+        while True:
+            ep = self._acquire(kwargs.get("affinity"), tried)
+            inner = self._members[ep.url].astream_text(prompt, **kwargs)
+            started = False
+            try:
+                async for chunk in inner:
+                    started = True
+                    yield chunk
+                owner().usage.update(inner.usage)
+                owner().context = inner.context
+                return
+            except Exception as exc:
+                if started or not self._failed(ep, exc, tried):
+                    raise
+            finally:
+                await inner.aclose()
+                self._release(ep)
+
+    def count_tokens(self, text: str) -> int:
+        return next(iter(self._members.values())).count_tokens(text)
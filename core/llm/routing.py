@@ -0,0 +1,81 @@
+"""Task-based model selection.
+
+Not every LLM call needs the chat model: titles and running summaries can be
+served by a small, fast model so they do not compete with answers for the
+large model's memory and compute.  A route maps a task (``answer``,
+``title``, ``summary``, ...) to a provider and model.  Routes come from the
+deployment's ``LLM_TASK_ROUTES`` (a JSON object) and from each user's
+``task_models`` setting; a route value is either a model name, which keeps
+the user's provider, or an object ``{"provider": ..., "model": ...}``::
+
+    LLM_TASK_ROUTES='{"title": "qwen2.5:0.5b", "summary": {"provider": "ollama", "model": "qwen2.5:1.5b"}}'
+
+For a task the user's route wins over the deployment's; without either the
+user's ``llm_provider``/``llm_model`` serve it.
+"""
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Any, Dict, List, Mapping, Optional
+import json
+
+from config import LLM_TASK_ROUTES
+
+TASKS = ("answer", "title", "summary")
+
+
+@dataclass(frozen=True)
+class Route:
+    """Provider and model serving one task; ``None`` fields fall back."""
+
+    provider: Optional[str] = None
+    model: Optional[str] = None
+
+
+def parse_route(value: Any) -> Optional[Route]:
+    """Read a route value (model name or ``{"provider", "model"}`` object)."""
+
+    if isinstance(value, str):
+        return Route(model=value) if value.strip() else None
+    if isinstance(value, Mapping):
+        provider = value.get("provider") or None
+        model = value.get("model") or None
+        return Route(provider, model) if provider or model else None
+    return None
+
+
+def parse_routes(raw: Optional[Mapping[str, Any]]) -> Dict[str, Route]:
+    routes: Dict[str, Route] = {}
+    for task, value in (raw or {}).items():
+        route = parse_route(value)
+        if route is not None:
+            routes[task] = route
+    return routes
+
+
+_deployment_routes = parse_routes(json.loads(LLM_TASK_ROUTES or "{}"))
+
+
+def deployment_routes() -> Dict[str, Route]:
+    """Routes configured for the whole deployment."""
+
+    return dict(_deployment_routes)
+
+
+def resolve_route(task: str, settings: Any = None) -> Route:
+    """Provider and model for ``task`` given a user's ``settings``.
+
+    ``settings`` is a :class:`~core.settings.UserSettings` or ``None``.
+    """
+
+    default = Route(getattr(settings, "llm_provider", None), getattr(settings, "llm_model", "") or None)
+    user_route = parse_route((getattr(settings, "task_models", None) or {}).get(task))
+    route = user_route or _deployment_routes.get(task)
+    if route is None:
+        return default
+    return Route(route.provider or default.provider, route.model or default.model)
+
+
+def routed_models(provider: str = "ollama") -> List[str]:
+    """Models the deployment routes any task to on ``provider``."""
+
+    return [r.model for r in _deployment_routes.values() if r.model and (r.provider or provider) == provider]
@@ -0,0 +1,235 @@
+"""Priority scheduling of LLM requests per backend.
+
+Every generation passes through the :class:`LLMScheduler` of its backend,
+which caps the number of concurrent requests and hands free slots to the
+waiting request with the best *effective* priority.  Priorities age: each
+``aging`` seconds spent waiting promote a request by one class, so
+background work cannot starve behind a steady stream of interactive turns.
+
+Both threads and coroutines can wait for a slot::
+
+    with get_scheduler(url).slot(Priority.INTERACTIVE) as wait:
+        ...
+    async with get_scheduler(url).aslot(Priority.INTERACTIVE_STREAM) as wait:
+        ...
+
+``wait`` is the time in seconds the request spent queued.
+"""
+from __future__ import annotations
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from enum import IntEnum
+from typing import Any, Deque, Dict, List, Tuple
+import asyncio
+import heapq
+import itertools
+import json
+import threading
+import time
+
+from config import LLM_BACKEND_CONCURRENCY, LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE, LLM_QUEUE_AGING
+
+
+class Priority(IntEnum):
+    """Request classes, most urgent first."""
+
+    INTERACTIVE_STREAM = 0
+    INTERACTIVE = 1
+    BACKGROUND = 2
+
+
+class SchedulerBusy(RuntimeError):
+    """Raised when a backend's wait queue is full."""
+
+
+class _Waiter:
+    __slots__ = ("priority", "event", "loop", "future", "granted", "cancelled")
+
+    def __init__(self, priority: Priority, event=None, loop=None, future=None):
+        self.priority = priority
+        self.event = event
+        self.loop = loop
+        self.future = future
+        self.granted = False
+        self.cancelled = False
+
+
+def _resolve(future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class LLMScheduler:
+    """Concurrency limiter with priority classes and aging for one backend.
+
+    Parameters
+    ----------
+    name:
+        Backend identifier, used in metrics.
+    max_concurrency:
+        Requests allowed to run at the same time.
+    max_queue:
+        Waiting requests beyond which :class:`SchedulerBusy` is raised.
+    aging:
+        Seconds of waiting that promote a request by one priority class.
+    """
+
+    def __init__(self, name: str, max_concurrency: int = 2, max_queue: int = 64, aging: float = 30.0):
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max_queue
+        self.aging = aging
+        self._lock = threading.Lock()
+        self._heap: List[Tuple[float, int, _Waiter]] = []
+        self._seq = itertools.count()
+        self._active = 0
+        self._rejected = 0
+        self._waits: Dict[Priority, List[float]] = {p: [0, 0.0, 0.0] for p in Priority}
+        self._recent: Deque[Dict[str, Any]] = deque(maxlen=20)
+
+    def _enqueue(self, waiter: _Waiter) -> bool:
+        """Take a free slot or queue ``waiter``; ``True`` if it may run now."""
+
+        with self._lock:
+            if self._active < self.max_concurrency and not self._heap:
+                self._active += 1
+                return True
+            if len(self._heap) >= self.max_queue:
+                self._rejected += 1
+                raise SchedulerBusy(f"LLM backend {self.name} has {len(self._heap)} requests queued")
+            rank = waiter.priority * self.aging + time.monotonic()
+            heapq.heappush(self._heap, (rank, next(self._seq), waiter))
+            return False
+
+    def _record(self, priority: Priority, wait: float) -> None:
+        with self._lock:
+            stats = self._waits[priority]
+            stats[0] += 1
+            stats[1] += wait
+            stats[2] = max(stats[2], wait)
+            self._recent.append({"priority": priority.name.lower(), "wait_ms": round(wait * 1000, 1)})
+
+    def release(self) -> None:
+        """Free a slot, handing it straight to the best waiting request."""
+
+        with self._lock:
+            while self._heap:
+                _, _, waiter = heapq.heappop(self._heap)
+                if waiter.cancelled:
+                    continue
+                if waiter.event is not None:
+                    waiter.granted = True
+                    waiter.event.set()
+                    return
+                try:
+                    waiter.loop.call_soon_threadsafe(_resolve, waiter.future)
+                except RuntimeError:
+                    continue  # event loop already closed
+                waiter.granted = True
+                return
+            self._active -= 1
+
+    def acquire(self, priority: Priority = Priority.INTERACTIVE) -> float:
+        """Block until a slot is free; returns the seconds spent waiting."""
+
+        start = time.monotonic()
+        waiter = _Waiter(priority, event=threading.Event())
+        if not self._enqueue(waiter):
+            waiter.event.wait()
+        wait = time.monotonic() - start
+        self._record(priority, wait)
+        return wait
+
+    async def aacquire(self, priority: Priority = Priority.INTERACTIVE) -> float:
+        """Async :meth:`acquire`; cancellation while queued gives up the place."""
+
+        start = time.monotonic()
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(priority, loop=loop, future=loop.create_future())
+        if not self._enqueue(waiter):
+            try:
+                await waiter.future
+            except asyncio.CancelledError:
+                with self._lock:
+                    granted = waiter.granted
+                    waiter.cancelled = True
+                if granted:
+                    self.release()
+                raise
+        wait = time.monotonic() - start
+        self._record(priority, wait)
+        return wait
+
+    @contextmanager
+    def slot(self, priority: Priority = Priority.INTERACTIVE):
+        wait = self.acquire(priority)
+        try:
+            yield wait
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def aslot(self, priority: Priority = Priority.INTERACTIVE):
+        wait = await self.aacquire(priority)
+        try:
+            yield wait
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            by_priority = {
+                p.name.lower(): {
+                    "requests": n,
+                    "avg_wait_ms": round(total / n * 1000, 1) if n else 0.0,
+                    "max_wait_ms": round(peak * 1000, 1),
+                }
+                for p, (n, total, peak) in self._waits.items()
+            }
+            return {
+                "active": self._active,
+                "queued": sum(1 for _, _, w in self._heap if not w.cancelled),
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+                "rejected": self._rejected,
+                "by_priority": by_priority,
+                "recent": list(self._recent),
+            }
+
+
+_schedulers: Dict[str, LLMScheduler] = {}
+_schedulers_lock = threading.Lock()
+_backend_limits: Dict[str, int] = json.loads(LLM_BACKEND_CONCURRENCY or "{}")
+
+
+def backend_limit(backend: str) -> int:
+    """Concurrency limit of ``backend``.
+
+    A comma-separated endpoint pool gets the sum of its members' limits.
+    """
+
+    if backend in _backend_limits:
+        return int(_backend_limits[backend])
+    members = [m for m in backend.split(",") if m]
+    if len(members) > 1:
+        return sum(backend_limit(m) for m in members)
+    return LLM_MAX_CONCURRENCY
+
+
+def get_scheduler(backend: str) -> LLMScheduler:
+    """Return the shared scheduler for ``backend`` (usually its base URL)."""
+
+    with _schedulers_lock:
+        sched = _schedulers.get(backend)
+        if sched is None:
+            limit = backend_limit(backend)
+            sched = _schedulers[backend] = LLMScheduler(backend, limit, LLM_MAX_QUEUE, LLM_QUEUE_AGING)
+    return sched
+
+
+def scheduler_metrics() -> Dict[str, Dict[str, Any]]:
+    """Queue statistics of every backend scheduler."""
+
+    with _schedulers_lock:
+        items = list(_schedulers.items())
+    return {name: sched.stats() for name, sched in items}
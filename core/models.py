@@ -1,5 +1,5 @@
 from __future__ import annotations
-from typing import List, Optional, Dict, Iterator, Literal
+from typing import List, Optional, Dict, Iterator, Literal, Union
 from pydantic import BaseModel, Field
 
 
@@ -25,12 +25,14 @@ class ChatRequest(BaseModel):
     """Parameters controlling a single chat turn."""
 
     user_id: Optional[str] = None
+    session_id: Optional[str] = None
     message: str
     template_id: str = "rag_chat"
     top_k: int = 8
     persona: Optional[str] = None
     stream: bool = True
     inactive_sources: Optional[List[str]] = None
+    llm_context: Optional[Dict[str, str]] = None
 
 
 class ChatChunk(BaseModel):
@@ -39,7 +41,8 @@ class ChatChunk(BaseModel):
     type: Literal["meta", "delta", "done", "error"]
     text: Optional[str] = None
     sources: Optional[List[Source]] = None
-    usage: Optional[Dict[str, int]] = None
+    usage: Optional[Dict[str, Union[int, float]]] = None
+    llm_context: Optional[Dict[str, str]] = None
 
 
 class ChatResponse(BaseModel):
@@ -47,4 +50,5 @@ class ChatResponse(BaseModel):
 
     text: str
     sources: List[Source] = Field(default_factory=list)
-    usage: Dict[str, int] = Field(default_factory=dict)
+    usage: Dict[str, Union[int, float]] = Field(default_factory=dict)
+    llm_context: Optional[Dict[str, str]] = None
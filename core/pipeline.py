@@ -1,10 +1,17 @@
 from __future__ import annotations
-from typing import Iterator, List
+from typing import AsyncIterator, Iterator, List, Optional, Tuple
+import asyncio
+import hashlib
 import json
+import threading
 
+from config import ANSWER_CACHE_ENABLED, CONTEXT_SCORE_CLIFF
+from .llm.context import ConversationState
 from .models import ChatRequest, ChatResponse, ChatChunk, Source
 from .prompts import renderer
+from .prompts.packing import apply_score_cliff
 from .rag import retriever
+from .rag.answer_cache import answer_key
 
 
 def _to_sources(blocks: List[dict]) -> List[Source]:
@@ -24,44 +31,279 @@ def _to_sources(blocks: List[dict]) -> List[Source]:
     return out
 
 
-def chat_once(req: ChatRequest) -> ChatResponse:
-    """Execute a full chat turn and return the complete response."""
+def _retrieve(req: ChatRequest) -> List[dict]:
+    """Fetch context blocks for ``req``, cut at the score cliff."""
 
-    context = retriever.search(
+    blocks = retriever.search(
         req.message,
         top_k=req.top_k,
         exclude_sources=set(req.inactive_sources or []),
     )
-    prompt = renderer.build_prompt(
+    return apply_score_cliff(blocks, CONTEXT_SCORE_CLIFF)
+
+
+def _prefix_key(req: ChatRequest) -> str:
+    """Identify the static prompt prefix (template and persona) of ``req``."""
+
+    raw = f"{req.template_id}\0{req.persona or ''}".encode("utf-8")
+    return hashlib.blake2b(raw, digest_size=8).hexdigest()
+
+
+def _build_prompt(req: ChatRequest, context: List[dict]) -> Tuple[str, List[dict], Optional[List[int]]]:
+    """Render the prompt for ``req`` within the model's token budget.
+
+    Returns the prompt, the context blocks that fit into it and the backend
+    conversation context to continue from.  When ``req.llm_context`` was
+    produced by the same model and prompt prefix and leaves room for the new
+    turn, only the turn itself is rendered and the earlier tokens are reused
+    from the backend's KV cache; otherwise the full prompt is sent and the
+    conversation state starts over.
+    """
+
+    budget, count_tokens = renderer.prompt_budget(req.user_id)
+    state = ConversationState.from_dict(req.llm_context)
+    if (
+        state is not None
+        and state.model == renderer.active_model(req.user_id)
+        and state.prefix == _prefix_key(req)
+    ):
+        remaining = budget - len(state.tokens)
+        if remaining >= budget // 4:
+            packed = renderer.pack_prompt(
+                summary="",
+                history=[],
+                user_message=req.message,
+                context_blocks=context,
+                persona=req.persona,
+                template_id=req.template_id,
+                token_budget=remaining,
+                count_tokens=count_tokens,
+                continuation=True,
+            )
+            if packed.tokens <= remaining:
+                return packed.text, packed.context_blocks, state.tokens
+    packed = renderer.pack_prompt(
         summary="",
         history=[],
         user_message=req.message,
         context_blocks=context,
         persona=req.persona,
         template_id=req.template_id,
+        token_budget=budget,
+        count_tokens=count_tokens,
     )
-    text = renderer.ask_llm(prompt, user_id=req.user_id)
-    return ChatResponse(text=text, sources=_to_sources(context), usage={})
+    return packed.text, packed.context_blocks, None
 
 
-def chat_stream(req: ChatRequest) -> Iterator[ChatChunk]:
-    """Yield chat response chunks as they are produced by the LLM."""
+def _next_state(req: ChatRequest, tokens: Optional[List[int]]) -> Optional[dict]:
+    """Conversation state to store for the next turn, if the backend returned one."""
 
-    context = retriever.search(
-        req.message,
-        top_k=req.top_k,
-        exclude_sources=set(req.inactive_sources or []),
+    if not tokens:
+        return None
+    return ConversationState(renderer.active_model(req.user_id), _prefix_key(req), tokens).to_dict()
+
+
+def _llm_kwargs(req: ChatRequest, tokens: Optional[List[int]], cancel: Optional[threading.Event] = None) -> dict:
+    kwargs: dict = {"context": tokens} if tokens else {}
+    if req.session_id:
+        kwargs["affinity"] = req.session_id
+    if cancel is not None:
+        kwargs["cancel"] = cancel
+    return kwargs
+
+
+_cancel_lock = threading.Lock()
+_cancel_stats = {"streams": 0, "tokens_generated": 0, "tokens_saved": 0}
+
+
+def _record_cancel(req: ChatRequest, generated: int) -> None:
+    """Count a stream aborted after ``generated`` chunks (about one token each).
+
+    The tokens saved are estimated as the rest of the user's answer budget.
+    """
+
+    saved = max(renderer.answer_budget(req.user_id) - generated, 0)
+    with _cancel_lock:
+        _cancel_stats["streams"] += 1
+        _cancel_stats["tokens_generated"] += generated
+        _cancel_stats["tokens_saved"] += saved
+
+
+def cancel_metrics() -> dict:
+    """Streams cancelled by client disconnects and the tokens that saved."""
+
+    with _cancel_lock:
+        return dict(_cancel_stats)
+
+
+def _cancelled(cancel: Optional[threading.Event]) -> bool:
+    return cancel is not None and cancel.is_set()
+
+
+def _lookup_answer(
+    req: ChatRequest, context: List[dict], tokens: Optional[List[int]] = None
+) -> Tuple[Optional[tuple], Optional[tuple]]:
+    """Consult the semantic answer cache for ``req``.
+
+    Returns the cached ``(answer, used blocks)`` (or ``None``) and an opaque
+    handle for :func:`_store_answer`; the handle is ``None`` when caching
+    does not apply.  The key covers the model and generation options serving
+    ``req`` besides its context, template and persona.  Turns continuing an
+    earlier conversation (``tokens`` set) depend on that conversation and
+    are neither looked up nor stored.
+    """
+
+    if not ANSWER_CACHE_ENABLED or not context or tokens is not None:
+        return None, None
+    ids = [c["id"] for c in context if c.get("id")]
+    if len(ids) != len(context):
+        return None, None
+    cache = retriever.get_db().answers
+    embedding = retriever.embed_query(req.message)
+    key = answer_key(
+        ids,
+        req.template_id,
+        req.persona,
+        model=f"{renderer.active_provider(req.user_id)}:{renderer.active_model(req.user_id)}",
+        options=renderer.generation_options(req.user_id).to_dict(),
     )
-    prompt = renderer.build_prompt(
-        summary="",
-        history=[],
-        user_message=req.message,
-        context_blocks=context,
-        persona=req.persona,
-        template_id=req.template_id,
+    return cache.lookup_with_sources(embedding, key), (cache, embedding, key)
+
+
+def _store_answer(
+    req: ChatRequest, context: List[dict], handle: Optional[tuple], text: str, used: List[dict]
+) -> None:
+    if handle is not None:
+        cache, embedding, key = handle
+        cache.store(req.message, embedding, key, text, context, used=used)
+
+
+_CACHE_HIT_USAGE = {"answer_cache_hit": 1}
+
+
+def _usage_of(stream) -> dict:
+    """Usage reported by a finished token stream, if it carries any."""
+
+    usage = getattr(stream, "usage", None)
+    return usage.to_dict() if usage is not None else {}
+
+
+def _meta_chunk(req: ChatRequest) -> ChatChunk:
+    return ChatChunk(type="meta", text=json.dumps({"top_k": req.top_k, "template": req.template_id}))
+
+
+def chat_once(req: ChatRequest) -> ChatResponse:
+    """Execute a full chat turn and return the complete response."""
+
+    context = _retrieve(req)
+    prompt, used, tokens = _build_prompt(req, context)
+    cached, handle = _lookup_answer(req, context, tokens)
+    if cached is not None:
+        return ChatResponse(
+            text=cached[0], sources=_to_sources(cached[1]), usage=dict(_CACHE_HIT_USAGE), llm_context=req.llm_context
+        )
+    gen = renderer.complete(prompt, user_id=req.user_id, **_llm_kwargs(req, tokens))
+    _store_answer(req, context, handle, gen.text, used)
+    return ChatResponse(
+        text=gen.text,
+        sources=_to_sources(used),
+        usage=gen.usage.to_dict(),
+        llm_context=_next_state(req, gen.context),
+    )
+
+
+def chat_stream(req: ChatRequest, cancel: Optional[threading.Event] = None) -> Iterator[ChatChunk]:
+    """Yield chat response chunks as they are produced by the LLM.
+
+    Setting ``cancel`` (e.g. when the client disconnects) aborts the backend
+    generation; the stream then ends without a ``done`` chunk and nothing is
+    cached.
+    """
+
+    context = _retrieve(req)
+    prompt, used, tokens = _build_prompt(req, context)
+    cached, handle = _lookup_answer(req, context, tokens)
+    yield _meta_chunk(req)
+    if cached is not None:
+        yield ChatChunk(type="delta", text=cached[0])
+        yield ChatChunk(
+            type="done", sources=_to_sources(cached[1]), usage=dict(_CACHE_HIT_USAGE), llm_context=req.llm_context
+        )
+        return
+    parts: List[str] = []
+    stream = renderer.stream_llm(prompt, user_id=req.user_id, **_llm_kwargs(req, tokens, cancel))
+    try:
+        for token in stream:
+            if _cancelled(cancel):
+                break
+            parts.append(token)
+            yield ChatChunk(type="delta", text=token)
+    finally:
+        if _cancelled(cancel):
+            stream.close()
+            _record_cancel(req, len(parts))
+    if _cancelled(cancel):
+        return
+    _store_answer(req, context, handle, "".join(parts), used)
+    yield ChatChunk(
+        type="done",
+        sources=_to_sources(used),
+        usage=_usage_of(stream),
+        llm_context=_next_state(req, getattr(stream, "context", None)),
+    )
+
+
+async def achat_once(req: ChatRequest) -> ChatResponse:
+    """Async :func:`chat_once`; retrieval runs in a worker thread."""
+
+    context = await asyncio.to_thread(_retrieve, req)
+    prompt, used, tokens = await asyncio.to_thread(_build_prompt, req, context)
+    cached, handle = await asyncio.to_thread(_lookup_answer, req, context, tokens)
+    if cached is not None:
+        return ChatResponse(
+            text=cached[0], sources=_to_sources(cached[1]), usage=dict(_CACHE_HIT_USAGE), llm_context=req.llm_context
+        )
+    gen = await renderer.acomplete(prompt, user_id=req.user_id, **_llm_kwargs(req, tokens))
+    await asyncio.to_thread(_store_answer, req, context, handle, gen.text, used)
+    return ChatResponse(
+        text=gen.text,
+        sources=_to_sources(used),
+        usage=gen.usage.to_dict(),
+        llm_context=_next_state(req, gen.context),
+    )
+
+
+async def achat_stream(req: ChatRequest, cancel: Optional[threading.Event] = None) -> AsyncIterator[ChatChunk]:
+    """Async :func:`chat_stream` that never blocks the event loop."""
+
+    context = await asyncio.to_thread(_retrieve, req)
+    prompt, used, tokens = await asyncio.to_thread(_build_prompt, req, context)
+    cached, handle = await asyncio.to_thread(_lookup_answer, req, context, tokens)
+    yield _meta_chunk(req)
+    if cached is not None:
+        yield ChatChunk(type="delta", text=cached[0])
+        yield ChatChunk(
+            type="done", sources=_to_sources(cached[1]), usage=dict(_CACHE_HIT_USAGE), llm_context=req.llm_context
+        )
+        return
+    parts: List[str] = []
+    stream = renderer.astream_llm(prompt, user_id=req.user_id, **_llm_kwargs(req, tokens, cancel))
+    try:
+        async for token in stream:
+            if _cancelled(cancel):
+                break
+            parts.append(token)
+            yield ChatChunk(type="delta", text=token)
+    finally:
+        if _cancelled(cancel):
+            await stream.aclose()
+            _record_cancel(req, len(parts))
+    if _cancelled(cancel):
+        return
+    await asyncio.to_thread(_store_answer, req, context, handle, "".join(parts), used)
+    yield ChatChunk(
+        type="done",
+        sources=_to_sources(used),
+        usage=_usage_of(stream),
+        llm_context=_next_state(req, getattr(stream, "context", None)),
     )
-    meta = json.dumps({"top_k": req.top_k, "template": req.template_id})
-    yield ChatChunk(type="meta", text=meta)
-    for token in renderer.stream_llm(prompt, user_id=req.user_id):
-        yield ChatChunk(type="delta", text=token)
-    yield ChatChunk(type="done", sources=_to_sources(context), usage={})
@@ -0,0 +1,69 @@
+"""Pre-compiled template format strings.
+
+Template fields such as ``user_format`` and ``context_item_format`` use
+``str.format`` placeholders plus a ``{name|default}`` form that falls back to
+``default`` when no value is given.  :func:`compile_format` splits such a
+string once into literal and placeholder segments so rendering is a single
+join; substituted values are inserted verbatim, so braces inside a retrieved
+chunk or a user message are never re-interpreted.
+"""
+from __future__ import annotations
+from functools import lru_cache
+from typing import List, Tuple, Union
+import re
+
+# ``{{`` / ``}}`` escapes or ``{name}``, ``{name|default}``, ``{name:spec}``.
+_TOKEN = re.compile(r"\{\{|\}\}|\{([A-Za-z0-9_]+)(?:\|([^{}:]*))?(?::([^{}]*))?\}")
+
+Segment = Union[str, Tuple[str, str, str]]
+
+
+class CompiledFormat:
+    """A format string split into literal text and ``(name, default, spec)`` slots."""
+
+    __slots__ = ("source", "segments", "names")
+
+    def __init__(self, source: str):
+        self.source = source
+        segments: List[Segment] = []
+        text: List[str] = []
+        pos = 0
+        for m in _TOKEN.finditer(source):
+            text.append(source[pos:m.start()])
+            pos = m.end()
+            token = m.group(0)
+            if token in ("{{", "}}"):
+                text.append(token[0])
+                continue
+            if text and "".join(text):
+                segments.append("".join(text))
+            text = []
+            segments.append((m.group(1), m.group(2) or "", m.group(3) or ""))
+        text.append(source[pos:])
+        if "".join(text):
+            segments.append("".join(text))
+        self.segments: Tuple[Segment, ...] = tuple(segments)
+        self.names = frozenset(s[0] for s in segments if not isinstance(s, str))
+
+    def render(self, **values) -> str:
+        """Substitute ``values``; missing names use their default (or ``""``)."""
+
+        out = []
+        for seg in self.segments:
+            if isinstance(seg, str):
+                out.append(seg)
+                continue
+            name, default, spec = seg
+            value = values.get(name, default)
+            out.append(format(value, spec) if spec else str(value))
+        return "".join(out)
+
+    def __repr__(self) -> str:
+        return f"CompiledFormat({self.source!r})"
+
+
+@lru_cache(maxsize=512)
+def compile_format(source: str) -> CompiledFormat:
+    """Compiled form of ``source``, shared by every caller."""
+
+    return CompiledFormat(source)
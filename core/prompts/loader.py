@@ -1,29 +1,62 @@
 from __future__ import annotations
 from pathlib import Path
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple
 import json
+import os
+import threading
 from config import PROMPTS_DIR
 
+# Parsed templates keyed by file path, with the (mtime_ns, size) they were
+# read at.  Callers share the cached dicts and must not modify them.
+_cache: Dict[Path, Tuple[Tuple[int, int], Optional[Dict]]] = {}
+_lock = threading.Lock()
 
-def load_template(tid: str) -> Optional[Dict]:
-    """Load a prompt template by identifier."""
 
-    f = PROMPTS_DIR / f"{tid}.json"
-    if not f.exists():
+def _read(f: Path) -> Optional[Dict]:
+    """Parsed JSON of ``f``, re-read only when its mtime or size changed."""
+
+    try:
+        st = os.stat(f)
+    except OSError:
+        with _lock:
+            _cache.pop(f, None)
         return None
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _lock:
+        hit = _cache.get(f)
+    if hit is not None and hit[0] == stamp:
+        return hit[1]
     try:
-        return json.loads(f.read_text(encoding="utf-8"))
+        data = json.loads(f.read_text(encoding="utf-8"))
     except Exception:
-        return None
+        data = None
+    with _lock:
+        _cache[f] = (stamp, data)
+    return data
+
+
+def invalidate(tid: Optional[str] = None) -> None:
+    """Forget the cached copy of ``tid`` (or of every template)."""
+
+    with _lock:
+        if tid is None:
+            _cache.clear()
+        else:
+            _cache.pop(PROMPTS_DIR / f"{tid}.json", None)
+
+
+def load_template(tid: str) -> Optional[Dict]:
+    """Load a prompt template by identifier."""
+
+    return _read(PROMPTS_DIR / f"{tid}.json")
 
 
 def list_templates() -> List[Dict]:
     """Return all available prompt templates as dictionaries."""
 
     out: List[Dict] = []
-    for f in PROMPTS_DIR.glob("*.json"):
-        try:
-            out.append(json.loads(f.read_text(encoding="utf-8")))
-        except Exception:
-            continue
+    for f in sorted(PROMPTS_DIR.glob("*.json")):
+        data = _read(f)
+        if data is not None:
+            out.append(data)
     return out
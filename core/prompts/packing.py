@@ -0,0 +1,79 @@
+"""Token-budgeted selection of prompt parts.
+
+:func:`pack` fills a token budget in priority order: fixed parts (system
+text, persona, the user's message) always count, then each group's items are
+admitted while they fit.  :func:`apply_score_cliff` drops retrieved blocks
+whose distance falls off sharply relative to the best hit.
+"""
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+TokenCounter = Callable[[str], int]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token)."""
+
+    return (len(text) + 3) // 4 if text else 0
+
+
+@dataclass
+class PackGroup:
+    """Candidate prompt items, most important first.
+
+    ``header`` is charged once when the first item is admitted.  A
+    ``contiguous`` group stops at the first item that does not fit (e.g.
+    history, which must not have gaps); other groups skip it and keep trying
+    smaller items.
+    """
+
+    name: str
+    items: List[str] = field(default_factory=list)
+    header: str = ""
+    contiguous: bool = False
+
+
+def pack(budget: int, count_tokens: TokenCounter, fixed: List[str], groups: List[PackGroup]) -> Dict[str, List[int]]:
+    """Return the indices of the items of each group that fit in ``budget``.
+
+    Groups are filled in the order given; every admitted part also pays one
+    token for its separator.
+    """
+
+    used = sum(count_tokens(f) + 1 for f in fixed if f)
+    chosen: Dict[str, List[int]] = {}
+    for group in groups:
+        picked: List[int] = []
+        for i, item in enumerate(group.items):
+            if not item:
+                continue
+            cost = count_tokens(item) + 1
+            if not picked and group.header:
+                cost += count_tokens(group.header) + 1
+            if used + cost <= budget:
+                picked.append(i)
+                used += cost
+            elif group.contiguous:
+                break
+        chosen[group.name] = picked
+    return chosen
+
+
+def apply_score_cliff(blocks: List[Dict], ratio: Optional[float]) -> List[Dict]:
+    """Keep blocks whose distance is within ``ratio`` times the best one.
+
+    Scores are distances (lower is better).  Blocks without a score, a
+    non-positive best distance or a falsy ``ratio`` disable the cutoff.
+    """
+
+    if not blocks or not ratio:
+        return blocks
+    scores = [b.get("score") for b in blocks]
+    if any(s is None for s in scores):
+        return blocks
+    best = min(scores)
+    if best <= 0:
+        return blocks
+    limit = best * ratio
+    return [b for b in blocks if b["score"] <= limit]
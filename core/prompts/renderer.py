@@ -1,11 +1,18 @@
 from __future__ import annotations
-from typing import List, Dict, Optional, Iterable
-from dataclasses import dataclass
-import json, re
-from config import PROMPTS_DIR
+from typing import List, Dict, Optional, Iterable, Iterator, AsyncIterator, Tuple
+from dataclasses import dataclass, field
+import asyncio, threading
+from config import LLM_CONTEXT_WINDOW, SUMMARY_MAX_TOKENS, TITLE_MAX_TOKENS
 from core.sessions import ChatExchange
-from core.settings import get_prompt_template, load_settings
-from core.llm import make_llm
+from core.settings import load_settings
+from core.llm import DEFAULT_PROVIDER, AsyncTokenStream, Generation, GenerationOptions, TokenStream, Usage, make_llm
+from core.llm.cache import cache_key, get_response_cache
+from core.llm.context import encode_tokens
+from core.llm.routing import resolve_route
+from core.llm.scheduler import Priority, get_scheduler
+from . import loader as prompt_loader
+from .formats import CompiledFormat, compile_format
+from .packing import PackGroup, TokenCounter, estimate_tokens, pack
 
 @dataclass
 class Template:
@@ -19,70 +26,95 @@ class Template:
     persona_format: str = "Persona: {persona}"
     history_separator: str = "\n"
     include_history: bool = True
+    user_plan: CompiledFormat = field(init=False, repr=False, compare=False)
+    context_item_plan: CompiledFormat = field(init=False, repr=False, compare=False)
+    persona_plan: CompiledFormat = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self.user_plan = compile_format(self.user_format)
+        self.context_item_plan = compile_format(self.context_item_format)
+        self.persona_plan = compile_format(self.persona_format)
+
+_DEFAULT_TEMPLATE = {
+    "id": "rag_chat",
+    "name": "RAG Chat (default)",
+    "system": "You are a concise, technical assistant. Answer using only the provided context when possible.",
+    "user_format": "{user}",
+    "context_item_format": "- {chunk} (source: {source})",
+    "context_header": "Context:",
+    "context_join": "\n",
+    "persona_format": "Persona: {persona}",
+    "history_separator": "\n",
+    "include_history": True
+}
+
+# Compiled templates keyed by id, together with the loader's parsed dict they
+# were built from; the loader hands out a new dict whenever the file changes.
+_templates: Dict[str, Tuple[Optional[Dict], Template]] = {}
+_templates_lock = threading.Lock()
+
+def _compile_template(data: Optional[Dict]) -> Template:
+    if not data:
+        return Template(**_DEFAULT_TEMPLATE)
+    return Template(
+        id=data.get("id") or _DEFAULT_TEMPLATE["id"],
+        name=data.get("name") or "",
+        system=data.get("system") or "",
+        user_format=data.get("user_format") or "{user}",
+        context_item_format=data.get("context_item_format") or "- {chunk}",
+        context_header=data.get("context_header") or "Context:",
+        context_join=data.get("context_join") or "\n",
+        persona_format=data.get("persona_format") or "Persona: {persona}",
+        history_separator=data.get("history_separator") or "\n",
+        include_history=bool(data.get("include_history", True)),
+    )
 
 def _load_template(tid: Optional[str]) -> Template:
-    """Resolve ``tid`` to a :class:`Template` instance."""
+    """Resolve ``tid`` to a compiled :class:`Template`.
+
+    The template file is parsed and compiled once; later calls only check
+    its modification time through :mod:`core.prompts.loader`.
+    """
 
     tid = tid or "rag_chat"
-    tmpl = get_prompt_template(tid)
-    if tmpl is None:
-        f = (PROMPTS_DIR / f"{tid}.json")
-        if f.exists():
-            data = json.loads(f.read_text(encoding="utf-8"))
+    data = prompt_loader.load_template(tid)
+    with _templates_lock:
+        hit = _templates.get(tid)
+    if hit is not None and hit[0] is data:
+        return hit[1]
+    t = _compile_template(data)
+    with _templates_lock:
+        _templates[tid] = (data, t)
+    return t
+
+def invalidate_templates(tid: Optional[str] = None) -> None:
+    """Drop cached templates so the next call re-reads them from disk."""
+
+    prompt_loader.invalidate(tid)
+    with _templates_lock:
+        if tid is None:
+            _templates.clear()
         else:
-            data = {
-                "id": "rag_chat",
-                "name": "RAG Chat (default)",
-                "system": "You are a concise, technical assistant. Answer using only the provided context when possible.",
-                "user_format": "{user}",
-                "context_item_format": "- {chunk} (source: {source})",
-                "context_header": "Context:",
-                "context_join": "\n",
-                "persona_format": "Persona: {persona}",
-                "history_separator": "\n",
-                "include_history": True
-            }
-    else:
-        data = {
-            "id": tmpl.id,
-            "name": tmpl.name,
-            "system": getattr(tmpl, "system", "") or "",
-            "user_format": getattr(tmpl, "user_format", "") or "{user}",
-            "context_item_format": getattr(tmpl, "context_item_format", "") or "- {chunk}",
-            "context_header": getattr(tmpl, "context_header", "") or "Context:",
-            "context_join": getattr(tmpl, "context_join", "") or "\n",
-            "persona_format": getattr(tmpl, "persona_format", "") or "Persona: {persona}",
-            "history_separator": getattr(tmpl, "history_separator", "") or "\n",
-            "include_history": bool(getattr(tmpl, "include_history", True)),
-        }
-    return Template(**data)
+            _templates.pop(tid, None)
 
 def _fmt_defaults(s: str, **kwargs) -> str:
     """Format ``s`` replacing ``{name|default}`` tokens with values."""
 
-    def repl(m):
-        name = m.group(1)
-        default = m.group(2) if m.group(2) is not None else ""
-        return str(kwargs.get(name, default))
+    return compile_format(s).render(**kwargs)
 
-    s = re.sub(r"\{([a-zA-Z0-9_]+)\|([^}]+)\}", repl, s)
-    return s.format(**{k: kwargs.get(k, "") for k in kwargs})
+def _render_context_item(t: Template, b: Dict) -> str:
+    return t.context_item_plan.render(
+        chunk=b.get("text", b.get("chunk", "")),
+        source=b.get("source", b.get("doc", "unknown")),
+        score=b.get("score", ""),
+    )
 
 def _render_context(t: Template, context_blocks: List[Dict]) -> str:
     """Render retrieved context blocks using the template's format."""
 
     if not context_blocks:
         return ""
-    lines = []
-    for b in context_blocks:
-        lines.append(
-            _fmt_defaults(
-                t.context_item_format,
-                chunk=b.get("text", b.get("chunk", "")),
-                source=b.get("source", b.get("doc", "unknown")),
-                score=b.get("score", ""),
-            )
-        )
+    lines = [_render_context_item(t, b) for b in context_blocks]
     return t.context_header + "\n" + t.context_join.join(lines)
 
 def _render_history(t: Template, history: List[ChatExchange]) -> str:
@@ -98,33 +130,116 @@ def _render_history(t: Template, history: List[ChatExchange]) -> str:
             lines.append(f"Assistant: {a}")
     return t.history_separator.join(lines)
 
-def build_prompt(
+def _render_exchange(t: Template, h: ChatExchange) -> str:
+    lines = [f"User: {getattr(h, 'user', '')}"]
+    a = getattr(h, "assistant", None) or getattr(h, "llm_response", None) or ""
+    if a:
+        lines.append(f"Assistant: {a}")
+    return t.history_separator.join(lines)
+
+def _assemble(
+    t: Template,
     summary: str,
     history: List[ChatExchange],
     user_message: str,
     context_blocks: List[Dict],
-    persona: Optional[str] = None,
-    template_id: Optional[str] = None,
+    persona: Optional[str],
+    continuation: bool = False,
 ) -> str:
-    """Construct the final prompt string for the LLM."""
+    """Join the prompt parts, most stable first.
+
+    System text and persona come first so they stay byte-identical from turn
+    to turn and the backend can reuse their evaluated prefix; history only
+    grows at its end, while the summary, retrieved context and user message
+    change every turn.  A ``continuation`` prompt carries only the new turn
+    and is sent together with the backend's conversation context.
+    """
 
-    t = _load_template(template_id)
     ctx = _render_context(t, context_blocks)
+    user_str = t.user_plan.render(user=user_message)
+    if continuation:
+        return "\n\n".join([b for b in (ctx, user_str) if b])
     hist = _render_history(t, history)
-    persona_str = _fmt_defaults(t.persona_format, persona=persona) if persona else ""
-    user_str = _fmt_defaults(t.user_format, user=user_message)
-    blocks = [t.system]
-    if persona_str:
-        blocks.append(persona_str)
+    persona_str = t.persona_plan.render(persona=persona) if persona else ""
+    blocks = [t.system, persona_str, hist]
     if summary:
         blocks.append(f"Summary so far: {summary}")
-    if hist:
-        blocks.append(hist)
-    if ctx:
-        blocks.append(ctx)
-    blocks.append(user_str)
+    blocks += [ctx, user_str]
     return "\n\n".join([b for b in blocks if b])
 
+@dataclass
+class PackedPrompt:
+    """A rendered prompt and the context blocks that made it in."""
+
+    text: str
+    context_blocks: List[Dict]
+    tokens: int = 0
+
+def pack_prompt(
+    summary: str,
+    history: List[ChatExchange],
+    user_message: str,
+    context_blocks: List[Dict],
+    persona: Optional[str] = None,
+    template_id: Optional[str] = None,
+    token_budget: Optional[int] = None,
+    count_tokens: Optional[TokenCounter] = None,
+    continuation: bool = False,
+) -> PackedPrompt:
+    """Render the prompt, trimming it to ``token_budget`` tokens if given.
+
+    System text, persona and the user's message always stay.  The budget is
+    then filled with context blocks in retrieval order, the running summary
+    and finally the most recent history exchanges.  With ``continuation``
+    only the context blocks and the user's message are rendered (see
+    :func:`_assemble`).
+    """
+
+    t = _load_template(template_id)
+    count = count_tokens or estimate_tokens
+    if continuation:
+        summary, history = "", []
+    if token_budget is None:
+        text = _assemble(t, summary, history, user_message, context_blocks, persona, continuation)
+        return PackedPrompt(text, list(context_blocks), count(text))
+    fixed = [t.user_plan.render(user=user_message)]
+    if not continuation:
+        fixed += [t.system, t.persona_plan.render(persona=persona) if persona else ""]
+    ctx_items = [_render_context_item(t, b) for b in context_blocks]
+    recent = list(history if t.include_history else [])[::-1]
+    chosen = pack(
+        token_budget,
+        count,
+        fixed,
+        [
+            PackGroup("context", ctx_items, header=t.context_header),
+            PackGroup("summary", [f"Summary so far: {summary}" if summary else ""]),
+            PackGroup("history", [_render_exchange(t, h) for h in recent], contiguous=True),
+        ],
+    )
+    blocks = [context_blocks[i] for i in chosen["context"]]
+    kept_history = recent[:len(chosen["history"])][::-1]
+    text = _assemble(
+        t, summary if chosen["summary"] else "", kept_history, user_message, blocks, persona, continuation
+    )
+    return PackedPrompt(text, blocks, count(text))
+
+def build_prompt(
+    summary: str,
+    history: List[ChatExchange],
+    user_message: str,
+    context_blocks: List[Dict],
+    persona: Optional[str] = None,
+    template_id: Optional[str] = None,
+    token_budget: Optional[int] = None,
+    count_tokens: Optional[TokenCounter] = None,
+) -> str:
+    """Construct the final prompt string for the LLM."""
+
+    return pack_prompt(
+        summary, history, user_message, context_blocks, persona, template_id, token_budget, count_tokens
+    ).text
+
 def _resolve_settings(user_id: Optional[str]):
     """Best-effort lookup of user settings falling back to defaults."""
 
@@ -141,35 +256,288 @@ def _resolve_settings(user_id: Optional[str]):
             pass
     return s
 
-def stream_llm(prompt: str, user_id: Optional[str] = None) -> Iterable[str]:
-    """Stream tokens from the configured LLM provider."""
+def answer_budget(user_id: Optional[str] = None) -> int:
+    """Tokens reserved for the answer (the user's ``max_tokens``)."""
+
+    return int(getattr(_resolve_settings(user_id), "max_tokens", 0) or 0)
+
+def prompt_budget(user_id: Optional[str] = None) -> Tuple[int, TokenCounter]:
+    """Prompt token budget and token counter for the user's model.
+
+    The budget is ``LLM_CONTEXT_WINDOW`` minus the tokens reserved for the
+    answer (the user's ``max_tokens``).
+    """
+
+    reserve = answer_budget(user_id)
+    return max(LLM_CONTEXT_WINDOW - reserve, 256), _llm_for(user_id).count_tokens
+
+def active_model(user_id: Optional[str] = None) -> str:
+    """Name of the model serving ``user_id``."""
+
+    return _llm_for(user_id).model or ""
+
+def active_provider(user_id: Optional[str] = None) -> str:
+    """Name of the provider serving answers for ``user_id``."""
+
+    provider = resolve_route("answer", _resolve_settings(user_id)).provider
+    return "openai" if provider == "openai" else DEFAULT_PROVIDER
+
+def _llm_for(user_id: Optional[str], task: str = "answer"):
+    """Return the cached LLM client serving ``task`` for the user (see :mod:`core.llm.routing`)."""
+
+    route = resolve_route(task, _resolve_settings(user_id))
+    return make_llm(route.provider or "ollama", route.model)
+
+# Output limits of auxiliary tasks; they override the user's settings
+TASK_OPTIONS: Dict[str, GenerationOptions] = {
+    "answer": GenerationOptions(),
+    "title": GenerationOptions(num_predict=TITLE_MAX_TOKENS, stop=["\n"]),
+    "summary": GenerationOptions(num_predict=SUMMARY_MAX_TOKENS),
+}
+
+def generation_options(user_id: Optional[str] = None, task: str = "answer") -> GenerationOptions:
+    """Generation options for ``task`` on behalf of ``user_id``.
+
+    The user's ``temperature``, ``top_p`` and ``max_tokens`` (as
+    ``num_predict``) and ``LLM_CONTEXT_WINDOW`` (as ``num_ctx``) are the
+    base; :data:`TASK_OPTIONS` then bounds auxiliary tasks such as titles.
+    """
 
     s = _resolve_settings(user_id)
-    provider = getattr(s, "llm_provider", "ollama")
-    model = getattr(s, "llm_model", "") or None
-    llm = make_llm(provider, model)
-    return llm.stream_text(prompt)
+    base = GenerationOptions(
+        num_predict=getattr(s, "max_tokens", None) or None,
+        num_ctx=LLM_CONTEXT_WINDOW,
+        temperature=getattr(s, "temperature", None),
+        top_p=getattr(s, "top_p", None),
+    )
+    return base.merged(TASK_OPTIONS.get(task))
+
+def _cached(llm, prompt: str, options: GenerationOptions, context: Optional[List[int]] = None):
+    """Return ``(cache, key, chunks)`` for ``prompt``; ``chunks`` is set on a hit.
+
+    The key covers the generation options and conversation context, so the
+    same prompt under different settings is cached separately.
+    """
+
+    cache = get_response_cache()
+    if cache is None:
+        return None, None, None
+    key_options = options.to_dict()
+    if context:
+        key_options["context"] = encode_tokens(context)
+    key = cache_key(type(llm).__name__, llm.model, getattr(llm, "base_url", ""), key_options or None, prompt)
+    return cache, key, cache.get(key)
+
+def _record(chunks: Iterable[str], cache, key: str, cancel: Optional[threading.Event] = None) -> Iterator[str]:
+    """Pass ``chunks`` through and store them once the stream completes.
+
+    A stream that ended because ``cancel`` was set is not stored.
+    """
+
+    seen: List[str] = []
+    for chunk in chunks:
+        seen.append(chunk)
+        yield chunk
+    if "".join(seen).strip() and not (cancel is not None and cancel.is_set()):
+        cache.put(key, seen)
+
+async def _arecord(
+    chunks: AsyncIterator[str], cache, key: str, cancel: Optional[threading.Event] = None
+) -> AsyncIterator[str]:
+    seen: List[str] = []
+    async for chunk in chunks:
+        seen.append(chunk)
+        yield chunk
+    if "".join(seen).strip() and not (cancel is not None and cancel.is_set()):
+        await asyncio.to_thread(cache.put, key, seen)
+
+async def _areplay(chunks: List[str]) -> AsyncIterator[str]:
+    for chunk in chunks:
+        yield chunk
+
+def _scheduler(llm):
+    return get_scheduler(getattr(llm, "base_url", "") or type(llm).__name__)
+
+def _llm_kwargs(
+    options: GenerationOptions,
+    context: Optional[List[int]],
+    affinity: Optional[str],
+    cancel: Optional[threading.Event] = None,
+) -> Dict:
+    kwargs: Dict = {"options": options}
+    if context:
+        kwargs["context"] = context
+    if affinity:
+        kwargs["affinity"] = affinity
+    if cancel is not None:
+        kwargs["cancel"] = cancel
+    return kwargs
+
+def _scheduled_stream(llm, prompt: str, priority: Priority, owner, kwargs: Dict) -> Iterator[str]:
+    """Stream from ``llm`` while holding a scheduler slot.
+
+    Usage and conversation context of the backend stream are copied to
+    ``owner()`` once it ends.
+    """
 
-def ask_llm(prompt: str, user_id: Optional[str] = None) -> str:
+    with _scheduler(llm).slot(priority) as wait:
+        stream = llm.stream_text(prompt, **kwargs)
+        try:
+            yield from stream
+            owner().context = getattr(stream, "context", None)
+        finally:
+            owner().usage.update(getattr(stream, "usage", None))
+            owner().usage.queue_wait_ms = wait * 1000
+
+async def _ascheduled_stream(llm, prompt: str, priority: Priority, owner, kwargs: Dict) -> AsyncIterator[str]:
+    async with _scheduler(llm).aslot(priority) as wait:
+        stream = llm.astream_text(prompt, **kwargs)
+        try:
+            async for chunk in stream:
+                yield chunk
+            owner().context = getattr(stream, "context", None)
+        finally:
+            await stream.aclose()
+            owner().usage.update(getattr(stream, "usage", None))
+            owner().usage.queue_wait_ms = wait * 1000
+
+def stream_llm(
+    prompt: str,
+    user_id: Optional[str] = None,
+    priority: Priority = Priority.INTERACTIVE_STREAM,
+    context: Optional[List[int]] = None,
+    affinity: Optional[str] = None,
+    cancel: Optional[threading.Event] = None,
+    task: str = "answer",
+) -> TokenStream:
+    """Stream tokens from the configured LLM provider.
+
+    The call waits for a slot of the backend's :class:`~core.llm.scheduler.LLMScheduler`
+    at ``priority``.  With ``LLM_CACHE_ENABLED`` a previously seen prompt is
+    replayed from the response cache chunk by chunk without contacting the
+    backend.  ``context`` continues a conversation from the token state of a
+    previous turn; ``affinity`` (the chat session id) lets an endpoint pool
+    route the turn to the server that served the previous one.  Setting
+    ``cancel`` ends the stream early and aborts the backend generation.  The
+    returned stream's ``usage`` and ``context`` are complete once it is
+    exhausted.  ``task`` selects the per-task generation options (see
+    :func:`generation_options`).
+    """
+
+    llm = _llm_for(user_id, task)
+    options = generation_options(user_id, task)
+    cache, key, hit = _cached(llm, prompt, options, context)
+    if hit is not None:
+        return TokenStream(iter(hit), Usage(cached=True))
+    chunks = _scheduled_stream(llm, prompt, priority, lambda: stream, _llm_kwargs(options, context, affinity, cancel))
+    stream = TokenStream(chunks if cache is None else _record(chunks, cache, key, cancel))
+    return stream
+
+def complete(
+    prompt: str,
+    user_id: Optional[str] = None,
+    priority: Priority = Priority.INTERACTIVE,
+    context: Optional[List[int]] = None,
+    affinity: Optional[str] = None,
+    task: str = "answer",
+) -> Generation:
+    """Return the complete response text and its usage."""
+
+    llm = _llm_for(user_id, task)
+    options = generation_options(user_id, task)
+    cache, key, hit = _cached(llm, prompt, options, context)
+    if hit is not None:
+        return Generation("".join(hit), Usage(cached=True))
+    with _scheduler(llm).slot(priority) as wait:
+        gen = llm.generate(prompt, **_llm_kwargs(options, context, affinity))
+    gen.usage.queue_wait_ms = wait * 1000
+    if cache is not None and (gen.text or "").strip():
+        cache.put(key, [gen.text])
+    return gen
+
+def ask_llm(
+    prompt: str, user_id: Optional[str] = None, priority: Priority = Priority.INTERACTIVE, task: str = "answer"
+) -> str:
     """Return a complete text response from the LLM."""
 
-    s = _resolve_settings(user_id)
-    provider = getattr(s, "llm_provider", "ollama")
-    model = getattr(s, "llm_model", "") or None
-    llm = make_llm(provider, model)
-    return llm.generate_text(prompt)
+    return complete(prompt, user_id=user_id, priority=priority, task=task).text
+
+def astream_llm(
+    prompt: str,
+    user_id: Optional[str] = None,
+    priority: Priority = Priority.INTERACTIVE_STREAM,
+    context: Optional[List[int]] = None,
+    affinity: Optional[str] = None,
+    cancel: Optional[threading.Event] = None,
+    task: str = "answer",
+) -> AsyncTokenStream:
+    """Async variant of :func:`stream_llm`."""
+
+    llm = _llm_for(user_id, task)
+    options = generation_options(user_id, task)
+    cache, key, hit = _cached(llm, prompt, options, context)
+    if hit is not None:
+        return AsyncTokenStream(_areplay(hit), Usage(cached=True))
+    chunks = _ascheduled_stream(llm, prompt, priority, lambda: stream, _llm_kwargs(options, context, affinity, cancel))
+    stream = AsyncTokenStream(chunks if cache is None else _arecord(chunks, cache, key, cancel))
+    return stream
+
+async def acomplete(
+    prompt: str,
+    user_id: Optional[str] = None,
+    priority: Priority = Priority.INTERACTIVE,
+    context: Optional[List[int]] = None,
+    affinity: Optional[str] = None,
+    task: str = "answer",
+) -> Generation:
+    """Async variant of :func:`complete`."""
+
+    llm = _llm_for(user_id, task)
+    options = await asyncio.to_thread(generation_options, user_id, task)
+    cache, key, hit = await asyncio.to_thread(_cached, llm, prompt, options, context)
+    if hit is not None:
+        return Generation("".join(hit), Usage(cached=True))
+    async with _scheduler(llm).aslot(priority) as wait:
+        gen = await llm.agenerate(prompt, **_llm_kwargs(options, context, affinity))
+    gen.usage.queue_wait_ms = wait * 1000
+    if cache is not None and (gen.text or "").strip():
+        await asyncio.to_thread(cache.put, key, [gen.text])
+    return gen
+
+async def aask_llm(
+    prompt: str, user_id: Optional[str] = None, priority: Priority = Priority.INTERACTIVE, task: str = "answer"
+) -> str:
+    """Async variant of :func:`ask_llm`."""
+
+    return (await acomplete(prompt, user_id=user_id, priority=priority, task=task)).text
 
 def update_summary(old_summary: str, last_user: str, last_assistant: str, user_id: Optional[str]=None) -> str:
     """Use the LLM to generate an updated conversation summary."""
 
+    return summarize_exchanges(old_summary, [(last_user, last_assistant)], user_id=user_id)
+
+def summarize_exchanges(
+    old_summary: str, exchanges: List[Tuple[str, str]], user_id: Optional[str]=None
+) -> str:
+    """Fold one or more ``(user, assistant)`` exchanges into ``old_summary``.
+
+    Several exchanges are summarised with a single LLM call, which lets the
+    background summariser coalesce rapid consecutive turns.
+    """
+
+    if len(exchanges) == 1:
+        last_user, last_assistant = exchanges[0]
+        turns = f"Last user: {last_user}\nLast assistant: {last_assistant}\n"
+    else:
+        turns = "".join(f"User: {u}\nAssistant: {a}\n" for u, a in exchanges)
+        turns = f"New exchanges:\n{turns}"
     instr = (
         "Update the running summary of this conversation. Keep it concise and factual.\n"
         f"Old summary: {old_summary}\n"
-        f"Last user: {last_user}\n"
-        f"Last assistant: {last_assistant}\n"
+        f"{turns}"
         "New concise summary:"
     )
-    return ask_llm(instr, user_id=user_id)
+    return ask_llm(instr, user_id=user_id, priority=Priority.BACKGROUND, task="summary")
 
 def generate_title(first_interaction: str, user_id: Optional[str]=None) -> str:
     """Produce a short title summarising the chat session."""
@@ -178,5 +546,5 @@ def generate_title(first_interaction: str, user_id: Optional[str]=None) -> str:
         f"{first_interaction}\n"
         "Given this chat interaction, provide a snappy short title we can use for it."
     )
-    return (ask_llm(prompt, user_id=user_id) or "").strip()[:80]
+    return (ask_llm(prompt, user_id=user_id, priority=Priority.BACKGROUND, task="title") or "").strip()[:80]
 
@@ -0,0 +1,160 @@
+"""Semantic cache of answers to previously asked questions.
+
+Past questions are stored as query embeddings in a small cosine-space Chroma
+collection next to the segment collection.  A new question reuses a stored
+answer only when its embedding is within ``max_distance`` of a past question
+*and* retrieval returned exactly the same segments for the same template,
+persona, model and generation options, so the answer was generated from
+identical context by the same model.  Each entry keeps the segments that were
+packed into its prompt so a hit cites the same sources as the original answer.
+Entries are dropped when any segment they were built from is deleted.
+"""
+from __future__ import annotations
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import hashlib
+import json
+import threading
+import time
+import uuid
+
+_SEP = "\x1f"
+# Block fields kept for the sources of a cached answer.
+_USED_FIELDS = ("id", "source", "page", "score")
+
+
+def answer_key(
+    segment_ids: Iterable[str],
+    template_id: str,
+    persona: str,
+    model: str = "",
+    options: Optional[Dict[str, Any]] = None,
+) -> str:
+    """Digest of everything besides the question that shapes an answer.
+
+    ``model`` names the provider and model generating the answer and
+    ``options`` are its generation options (``GenerationOptions.to_dict()``).
+    """
+
+    payload = json.dumps(
+        [sorted(segment_ids), template_id or "", persona or "", model or "", options or {}],
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class AnswerCache:
+    """Vector index of answered questions.
+
+    Parameters
+    ----------
+    client:
+        Chroma client owning the segment collection.
+    name:
+        Collection name for the cached answers.
+    max_distance:
+        Largest cosine distance between two questions considered the same.
+    max_entries:
+        Oldest answers are evicted beyond this many entries.
+    """
+
+    def __init__(self, client, name: str, max_distance: float = 0.05, max_entries: int = 2000):
+        self.collection = client.get_or_create_collection(name, metadata={"hnsw:space": "cosine"})
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, embedding, key: str) -> Optional[str]:
+        """Return a stored answer for a question close to ``embedding``."""
+
+        hit = self.lookup_with_sources(embedding, key)
+        return hit[0] if hit is not None else None
+
+    def lookup_with_sources(self, embedding, key: str) -> Optional[Tuple[str, List[dict]]]:
+        """Return a stored answer and the context blocks its prompt contained."""
+
+        if self.collection.count() == 0:
+            self.misses += 1
+            return None
+        res = self.collection.query(
+            query_embeddings=[list(embedding)],
+            n_results=1,
+            where={"key": key},
+            include=["documents", "distances", "metadatas"],
+        )
+        docs = res.get("documents", [[]])[0]
+        dists = res.get("distances", [[]])[0]
+        metas = res.get("metadatas", [[]])[0]
+        if docs and dists and dists[0] <= self.max_distance:
+            self.hits += 1
+            meta = (metas[0] if metas else None) or {}
+            return docs[0], json.loads(meta.get("used") or "[]")
+        self.misses += 1
+        return None
+
+    def store(
+        self, question: str, embedding, key: str, answer: str, segments: List[dict], used: Optional[List[dict]] = None
+    ) -> None:
+        """Remember ``answer`` to ``question`` built from ``segments``.
+
+        ``used`` are the blocks actually packed into the prompt (default:
+        all of ``segments``); they are returned as the answer's sources.
+        """
+
+        if not answer.strip():
+            return
+        used = segments if used is None else used
+        meta = {
+            "key": key,
+            "question": question,
+            "segments": _SEP.join(sorted(s["id"] for s in segments if s.get("id"))),
+            "sources": _SEP.join(sorted({s.get("source", "") for s in segments})),
+            "used": json.dumps(
+                [{k: b.get(k) for k in _USED_FIELDS if b.get(k) is not None} for b in used], ensure_ascii=False
+            ),
+            "created": time.time(),
+        }
+        with self._lock:
+            self.collection.add(
+                ids=[str(uuid.uuid4())], embeddings=[list(embedding)], documents=[answer], metadatas=[meta]
+            )
+            over = self.collection.count() - self.max_entries
+            if over > 0:
+                metas = self.collection.get(include=["metadatas"])
+                oldest = sorted(zip(metas["ids"], metas["metadatas"]), key=lambda p: p[1].get("created", 0))
+                self.collection.delete(ids=[i for i, _ in oldest[:over]])
+
+    def _invalidate(self, field: str, values: Iterable[str]) -> int:
+        values = set(values)
+        if not values:
+            return 0
+        with self._lock:
+            data = self.collection.get(include=["metadatas"])
+            stale = [
+                i for i, m in zip(data["ids"], data["metadatas"])
+                if values.intersection((m.get(field) or "").split(_SEP))
+            ]
+            if stale:
+                self.collection.delete(ids=stale)
+        return len(stale)
+
+    def invalidate_segments(self, segment_ids: Iterable[str]) -> int:
+        """Drop answers built from any of ``segment_ids``."""
+
+        return self._invalidate("segments", segment_ids)
+
+    def invalidate_source(self, source: str) -> int:
+        """Drop answers built from segments of ``source``."""
+
+        return self._invalidate("sources", [source])
+
+    def clear(self) -> None:
+        with self._lock:
+            ids = self.collection.get(include=[])["ids"]
+            for i in range(0, len(ids), 500):
+                self.collection.delete(ids=ids[i:i + 500])
+
+    def stats(self) -> dict:
+        return {"entries": self.collection.count(), "hits": self.hits, "misses": self.misses}
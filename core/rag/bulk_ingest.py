@@ -0,0 +1,215 @@
+"""Recursive, resumable bulk ingestion from the command line.
+
+Usage::
+
+    python -m core.rag.bulk_ingest documents/ --include '*.pdf' --exclude '*/drafts/*'
+
+Files are discovered recursively, filtered with include/exclude globs and
+fed through :class:`~core.rag.ingest.IngestPipeline` with PDF parsing in
+worker processes.  Each finished file is appended to a JSONL checkpoint, so
+re-running the same command after an interruption skips everything already
+ingested (unchanged size and mtime) and re-ingests partially written files.
+"""
+from __future__ import annotations
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+from config import ALLOWED_DOCUMENT_EXTENSIONS, CHROMA_DB_DIR, INGEST_DEDUP
+from .ingest import FileResult, IngestConfig, IngestPipeline
+
+DEFAULT_CHECKPOINT = CHROMA_DB_DIR / "ingest_checkpoint.jsonl"
+
+
+def discover_files(
+    roots: Iterable[Path],
+    include: Optional[List[str]] = None,
+    exclude: Optional[List[str]] = None,
+) -> List[Path]:
+    """Return supported files under ``roots`` matching the glob filters.
+
+    Patterns are matched with :func:`fnmatch.fnmatch` against the path
+    relative to its root (``*`` also matches ``/``), so ``*.pdf`` selects PDFs
+    at any depth and ``*/archive/*`` prunes a directory anywhere in the tree.
+    """
+
+    found: List[Path] = []
+    for root in roots:
+        root = Path(root)
+        if root.is_file():
+            found.append(root)
+            continue
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            for name in sorted(filenames):
+                path = Path(dirpath) / name
+                rel = path.relative_to(root).as_posix()
+                if path.suffix.lower() not in ALLOWED_DOCUMENT_EXTENSIONS:
+                    continue
+                if include and not any(fnmatch(rel, p) for p in include):
+                    continue
+                if exclude and any(fnmatch(rel, p) for p in exclude):
+                    continue
+                found.append(path)
+    return found
+
+
+class Checkpoint:
+    """Append-only JSONL record of files already ingested."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.done: Dict[str, Dict] = {}
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.done[rec["path"]] = rec
+
+    @staticmethod
+    def _stamp(path: Path) -> Dict:
+        st = path.stat()
+        return {"size": st.st_size, "mtime": st.st_mtime_ns}
+
+    def is_done(self, path: Path) -> bool:
+        """``True`` if ``path`` was ingested successfully and is unchanged."""
+
+        rec = self.done.get(str(path.resolve()))
+        return bool(rec and rec.get("status") == "ok" and rec.get("stamp") == self._stamp(path))
+
+    def record(self, result: FileResult) -> None:
+        path = Path(result.path)
+        rec = {
+            "path": str(path.resolve()),
+            "source": result.source,
+            "status": "ok" if result.ok else "error",
+            "segments": result.segments,
+            "duplicates": result.duplicates,
+            "error": result.error,
+            "stamp": self._stamp(path) if path.exists() else None,
+            "at": time.time(),
+        }
+        with self._lock:
+            self.done[rec["path"]] = rec
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(rec) + "\n")
+
+
+class Progress:
+    """Print file throughput and an ETA as files complete."""
+
+    def __init__(self, total: int, out=sys.stderr, every: float = 1.0):
+        self.total = total
+        self.out = out
+        self.every = every
+        self.done = 0
+        self.failed = 0
+        self.segments = 0
+        self.start = time.perf_counter()
+        self._last = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self, result: FileResult) -> None:
+        with self._lock:
+            self.done += 1
+            self.segments += result.segments
+            if not result.ok:
+                self.failed += 1
+                print(f"  ! {result.path}: {result.error}", file=self.out)
+            now = time.perf_counter()
+            if now - self._last < self.every and self.done < self.total:
+                return
+            self._last = now
+            elapsed = max(now - self.start, 1e-9)
+            rate = self.done / elapsed
+            eta = (self.total - self.done) / rate if rate else 0.0
+            print(
+                f"[{self.done}/{self.total}] {rate:.2f} files/s, {self.segments / elapsed:.1f} segments/s, "
+                f"{self.failed} failed, ETA {_fmt_duration(eta)}",
+                file=self.out,
+            )
+
+
+def _fmt_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    h, rem = divmod(seconds, 3600)
+    m, s = divmod(rem, 60)
+    return f"{h}h{m:02d}m{s:02d}s" if h else f"{m}m{s:02d}s"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Recursively ingest a document tree into the vector store.")
+    parser.add_argument("roots", nargs="+", type=Path, help="Directories or files to ingest")
+    parser.add_argument("--include", action="append", help="Glob of relative paths to include (repeatable)")
+    parser.add_argument("--exclude", action="append", help="Glob of relative paths to exclude (repeatable)")
+    parser.add_argument("--workers", type=int, default=IngestConfig.parse_workers, help="Parser worker processes")
+    parser.add_argument("--chunk-workers", type=int, default=IngestConfig.chunk_workers, help="Chunking threads")
+    parser.add_argument("--batch", type=int, default=IngestConfig.embed_batch_size, help="Chunks per embedding batch")
+    parser.add_argument("--checkpoint", type=Path, default=DEFAULT_CHECKPOINT, help="Checkpoint file for resuming")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and ingest everything")
+    parser.add_argument("--clear", action="store_true", help="Clear the collection before ingesting")
+    parser.add_argument("--tags", default="embedded", help="Comma separated tags stored with each segment")
+    parser.add_argument("--relative-sources", action="store_true", help="Name sources by path relative to their root")
+    parser.add_argument("--no-filter", action="store_true", help="Keep shouty or visually noisy chunks")
+    parser.add_argument("--dedup", choices=["off", "skip", "link"], default=INGEST_DEDUP, help="Near-duplicate handling")
+    args = parser.parse_args(argv)
+
+    files = discover_files(args.roots, args.include, args.exclude)
+    sources: Dict[Path, str] = {}
+    for root in args.roots:
+        for f in files:
+            if f not in sources and (f == root or root in f.parents):
+                sources[f] = f.relative_to(root).as_posix() if args.relative_sources and root.is_dir() else f.name
+    clashes = len(set(sources.values())) != len(sources)
+    if clashes:
+        print("Several files share a file name; re-run with --relative-sources.", file=sys.stderr)
+        return 2
+
+    from .retriever import get_db
+
+    if args.clear:
+        get_db().clear_collection()
+    if args.restart and args.checkpoint.exists():
+        args.checkpoint.unlink()
+    checkpoint = Checkpoint(args.checkpoint)
+    todo = [f for f in files if not checkpoint.is_done(f)]
+    print(f"{len(files)} files found, {len(files) - len(todo)} already ingested, {len(todo)} to go", file=sys.stderr)
+    if not todo:
+        return 0
+
+    progress = Progress(len(todo))
+
+    def on_file_done(result: FileResult) -> None:
+        checkpoint.record(result)
+        progress(result)
+
+    cfg = IngestConfig(
+        parse_workers=args.workers,
+        chunk_workers=args.chunk_workers,
+        embed_batch_size=args.batch,
+        filter_chunks=not args.no_filter,
+        replace_existing=True,
+        dedup=args.dedup,
+    )
+    report = IngestPipeline(cfg, on_file_done=on_file_done).run(
+        todo,
+        tags=[t.strip() for t in args.tags.split(",") if t.strip()],
+        source_for=lambda p: sources[p],
+    )
+    print(report.summary(), file=sys.stderr)
+    return 1 if progress.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+"""Near-duplicate detection for ingested chunks using SimHash sketches.
+
+Every chunk is reduced to a 64-bit SimHash over word shingles.  Sketches are
+kept in a small SQLite database next to the Chroma collection and indexed by
+bands (LSH): with ``max_distance + 1`` bands, any two sketches within
+``max_distance`` differing bits are guaranteed to share at least one band, so
+lookups only compare against a handful of candidates.
+"""
+from __future__ import annotations
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+import hashlib
+import re
+import sqlite3
+import threading
+
+_WORD = re.compile(r"\w+")
+_MASK = (1 << 64) - 1
+
+
+def simhash(text: str, shingle: int = 3) -> int:
+    """Return the 64-bit SimHash of ``text`` over ``shingle``-word windows."""
+
+    words = _WORD.findall(text.lower())
+    if len(words) > shingle:
+        grams = [" ".join(words[i:i + shingle]) for i in range(len(words) - shingle + 1)]
+    else:
+        grams = [" ".join(words)]
+    weights = [0] * 64
+    for gram in grams:
+        h = int.from_bytes(hashlib.blake2b(gram.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    out = 0
+    for bit, w in enumerate(weights):
+        if w > 0:
+            out |= 1 << bit
+    return out
+
+
+def hamming(a: int, b: int) -> int:
+    """Number of differing bits between two sketches."""
+
+    return bin((a ^ b) & _MASK).count("1")
+
+
+def _signed(h: int) -> int:
+    """Map an unsigned 64-bit value onto SQLite's signed INTEGER range."""
+
+    return h - (1 << 64) if h >= 1 << 63 else h
+
+
+@dataclass
+class Orphan:
+    """A linked duplicate whose canonical segment has been removed."""
+
+    source: str
+    text: str
+
+
+class SketchIndex:
+    """Persistent SimHash index of the segments stored in a collection.
+
+    Parameters
+    ----------
+    path:
+        SQLite database file; created on first use.
+    max_distance:
+        Largest Hamming distance still considered a near duplicate.
+    """
+
+    def __init__(self, path: Path, max_distance: int = 3):
+        self.path = Path(path)
+        self.max_distance = max_distance
+        self.bands = max_distance + 1
+        self.band_bits = 64 // self.bands
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.executescript(
+            """
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS sketches (segment_id TEXT PRIMARY KEY, source TEXT, hash INTEGER);
+            CREATE TABLE IF NOT EXISTS bands (band INTEGER, value INTEGER, segment_id TEXT);
+            CREATE INDEX IF NOT EXISTS bands_lookup ON bands (band, value);
+            CREATE INDEX IF NOT EXISTS sketches_source ON sketches (source);
+            CREATE TABLE IF NOT EXISTS links (source TEXT, canonical_id TEXT, text TEXT);
+            CREATE INDEX IF NOT EXISTS links_canonical ON links (canonical_id);
+            CREATE INDEX IF NOT EXISTS links_source ON links (source);
+            """
+        )
+
+    def _band_values(self, h: int) -> List[int]:
+        mask = (1 << self.band_bits) - 1
+        return [(h >> (i * self.band_bits)) & mask for i in range(self.bands)]
+
+    def _find(self, h: int) -> Optional[str]:
+        seen = set()
+        for band, value in enumerate(self._band_values(h)):
+            rows = self._conn.execute(
+                "SELECT s.segment_id, s.hash FROM bands b JOIN sketches s ON s.segment_id = b.segment_id "
+                "WHERE b.band = ? AND b.value = ?",
+                (band, value),
+            )
+            for seg_id, other in rows:
+                if seg_id in seen:
+                    continue
+                seen.add(seg_id)
+                if hamming(h, other) <= self.max_distance:
+                    return seg_id
+        return None
+
+    def check_and_add(self, text: str, segment_id: str, source: str) -> Optional[str]:
+        """Return the id of a near duplicate of ``text`` or register it.
+
+        The lookup and insert happen under one lock so concurrent chunk
+        workers cannot both register the same content.
+        """
+
+        h = simhash(text)
+        with self._lock:
+            existing = self._find(h)
+            if existing is not None:
+                return existing
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sketches VALUES (?, ?, ?)", (segment_id, source, _signed(h))
+            )
+            self._conn.executemany(
+                "INSERT INTO bands VALUES (?, ?, ?)",
+                [(i, v, segment_id) for i, v in enumerate(self._band_values(h))],
+            )
+            self._conn.execute("COMMIT")
+        return None
+
+    def link(self, source: str, canonical_id: str, text: str) -> int:
+        """Record that ``source`` contains ``text`` stored as ``canonical_id``.
+
+        Returns the link's row id for :meth:`remove_links`.
+        """
+
+        with self._lock:
+            cur = self._conn.execute("INSERT INTO links VALUES (?, ?, ?)", (source, canonical_id, text))
+            return cur.lastrowid
+
+    def remove_links(self, link_ids: List[int]) -> None:
+        """Drop links by the row ids :meth:`link` returned."""
+
+        with self._lock:
+            for i in range(0, len(link_ids), 500):
+                batch = list(link_ids[i:i + 500])
+                self._conn.execute(f"DELETE FROM links WHERE rowid IN ({','.join('?' * len(batch))})", batch)
+
+    def linked_count(self, source: str) -> int:
+        """Number of duplicate chunks of ``source`` resolved to other segments."""
+
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM links WHERE source = ?", (source,)).fetchone()[0]
+
+    def _remove(self, where: str, args: tuple) -> List[Orphan]:
+        with self._lock:
+            self._conn.execute("BEGIN")
+            ids = [r[0] for r in self._conn.execute(f"SELECT segment_id FROM sketches WHERE {where}", args)]
+            orphans: List[Orphan] = []
+            for i in range(0, len(ids), 500):
+                batch = ids[i:i + 500]
+                marks = ",".join("?" * len(batch))
+                orphans.extend(
+                    Orphan(source=s, text=t)
+                    for s, t in self._conn.execute(
+                        f"SELECT source, text FROM links WHERE canonical_id IN ({marks})", batch
+                    )
+                )
+                self._conn.execute(f"DELETE FROM links WHERE canonical_id IN ({marks})", batch)
+                self._conn.execute(f"DELETE FROM bands WHERE segment_id IN ({marks})", batch)
+                self._conn.execute(f"DELETE FROM sketches WHERE segment_id IN ({marks})", batch)
+            self._conn.execute("COMMIT")
+        return orphans
+
+    def remove_source(self, source: str) -> List[Orphan]:
+        """Forget ``source`` and return duplicates elsewhere that pointed at it."""
+
+        with self._lock:
+            self._conn.execute("DELETE FROM links WHERE source = ?", (source,))
+        return [o for o in self._remove("source = ?", (source,)) if o.source != source]
+
+    def remove_ids(self, segment_ids: List[str]) -> List[Orphan]:
+        """Forget individual segments, returning orphaned duplicates."""
+
+        orphans: List[Orphan] = []
+        for i in range(0, len(segment_ids), 500):
+            batch = list(segment_ids[i:i + 500])
+            orphans.extend(self._remove(f"segment_id IN ({','.join('?' * len(batch))})", tuple(batch)))
+        return orphans
+
+    def clear(self) -> None:
+        """Drop every sketch and link."""
+
+        with self._lock:
+            self._conn.executescript("DELETE FROM links; DELETE FROM bands; DELETE FROM sketches;")
@@ -0,0 +1,267 @@
+"""Streaming text extractors for plaintext, Markdown and HTML documents.
+
+Each extractor is a generator yielding ``{"page": n, "text": ...}`` dictionaries,
+the same shape :func:`core.rag.chunking.parse_pdf` returns.  Files are read
+through a read-only memory map in bounded windows, so memory use depends on
+``page_chars`` rather than on the size of the file and the chunker can start
+on the first page before the rest of the file has been read.
+"""
+from __future__ import annotations
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+import mmap
+import os
+import re
+
+from config import EXTRACT_PAGE_CHARS
+
+Page = Dict[str, object]
+
+_MD_HEADING = re.compile(r"^\s{0,3}(#{1,6})\s+(.*?)\s*#*\s*$")
+_MD_FENCE = re.compile(r"^\s{0,3}(```|~~~)")
+_MD_IMAGE = re.compile(r"!\[([^\]]*)\]\([^)]*\)")
+_MD_LINK = re.compile(r"\[([^\]]+)\]\([^)]*\)")
+_MD_REF_DEF = re.compile(r"^\s{0,3}\[[^\]]+\]:\s+\S+")
+_MD_EMPHASIS = re.compile(r"(\*\*|\*|~~)(?=\S)(.+?)(?<=\S)\1")
+# Underscore emphasis only counts at word boundaries, so snake_case is left
+# alone; ``__name__`` is kept as well since it is far more often a dunder
+_MD_UNDERSCORE = re.compile(r"(?<!\w)(__?)(?=\S)(.+?)(?<=\S)\1(?!\w)")
+_IDENTIFIER = re.compile(r"\w+")
+_MD_CODE = re.compile(r"`([^`]*)`")
+_MD_LIST = re.compile(r"^\s*(?:[-*+]|\d+[.)])\s+")
+_MD_QUOTE = re.compile(r"^\s*>+\s?")
+_MD_RULE = re.compile(r"^\s{0,3}([-*_])(\s*\1){2,}\s*$")
+_MD_TABLE_RULE = re.compile(r"^\s*\|?\s*:?-{3,}:?\s*(\|\s*:?-{3,}:?\s*)*\|?\s*$")
+_INLINE_TAG = re.compile(r"</?[A-Za-z][^>]*>")
+_BLANK_RUNS = re.compile(r"\n{3,}")
+_TRAILING_WS = re.compile(r"[ \t]+\n")
+
+
+def _iter_blocks(path: Path, block_bytes: int) -> Iterator[str]:
+    """Yield decoded slices of ``path`` of at most ``block_bytes`` bytes.
+
+    Slices end on a blank line where possible, then on a newline, and only
+    split inside a line (on a UTF-8 character boundary) when a single line is
+    longer than ``block_bytes``.
+    """
+
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pos = 0
+            while pos < size:
+                end = min(pos + block_bytes, size)
+                if end < size:
+                    cut = mm.rfind(b"\n\n", pos, end)
+                    if cut <= pos:
+                        cut = mm.rfind(b"\n", pos, end)
+                    if cut > pos:
+                        end = cut + 1
+                    else:
+                        while end > pos + 1 and mm[end] & 0xC0 == 0x80:
+                            end -= 1
+                yield mm[pos:end].decode("utf-8", errors="replace")
+                pos = end
+
+
+class _PageBuffer:
+    """Accumulate text and cut it into numbered pages near ``page_chars``."""
+
+    def __init__(self, page_chars: int):
+        self.page_chars = page_chars
+        self.parts: List[str] = []
+        self.size = 0
+        self.page = 0
+
+    def add(self, text: str) -> None:
+        self.parts.append(text)
+        self.size += len(text)
+
+    @property
+    def full(self) -> bool:
+        return self.size >= self.page_chars
+
+    def flush(self) -> Optional[Page]:
+        text = _TRAILING_WS.sub("\n", "".join(self.parts))
+        text = _BLANK_RUNS.sub("\n\n", text).strip()
+        self.parts = []
+        self.size = 0
+        if not text:
+            return None
+        self.page += 1
+        return {"page": self.page, "text": text}
+
+
+def iter_text_pages(path: Path, page_chars: int = EXTRACT_PAGE_CHARS) -> Iterator[Page]:
+    """Yield paragraph-aligned pages of roughly ``page_chars`` from a text file."""
+
+    buf = _PageBuffer(page_chars)
+    for block in _iter_blocks(Path(path), page_chars):
+        buf.add(block)
+        page = buf.flush()
+        if page:
+            yield page
+
+
+def _underscore_emphasis(m: re.Match) -> str:
+    if m.group(1) == "__" and _IDENTIFIER.fullmatch(m.group(2)):
+        return m.group(0)
+    return m.group(2)
+
+
+def _strip_markdown_line(line: str) -> str:
+    """Remove inline Markdown syntax from a single line."""
+
+    if _MD_RULE.match(line) or _MD_TABLE_RULE.match(line) or _MD_REF_DEF.match(line):
+        return ""
+    line = _MD_QUOTE.sub("", line)
+    line = _MD_LIST.sub("", line)
+    line = _MD_IMAGE.sub(r"\1", line)
+    line = _MD_LINK.sub(r"\1", line)
+    # Odd parts are code span contents, which are kept verbatim
+    parts = _MD_CODE.split(line)
+    for i in range(0, len(parts), 2):
+        text = _MD_EMPHASIS.sub(r"\2", parts[i])
+        text = _MD_UNDERSCORE.sub(_underscore_emphasis, text)
+        parts[i] = _INLINE_TAG.sub("", text)
+    line = "".join(parts)
+    if "|" in line:
+        line = " ".join(cell.strip() for cell in line.strip().strip("|").split("|"))
+    return line.rstrip()
+
+
+def iter_markdown_pages(path: Path, page_chars: int = EXTRACT_PAGE_CHARS) -> Iterator[Page]:
+    """Yield section-aligned, markup-free pages from a Markdown file.
+
+    A new page starts at every heading; sections longer than ``page_chars``
+    are split further at paragraph boundaries.
+    """
+
+    buf = _PageBuffer(page_chars)
+    in_fence = False
+    pending = ""
+    for block in _iter_blocks(Path(path), page_chars):
+        lines = (pending + block).split("\n")
+        pending = lines.pop()
+        if len(pending) >= page_chars:
+            lines.append(pending)
+            pending = ""
+        for raw in lines:
+            if _MD_FENCE.match(raw):
+                in_fence = not in_fence
+                continue
+            if in_fence:
+                buf.add(raw + "\n")
+                continue
+            heading = _MD_HEADING.match(raw)
+            if heading:
+                page = buf.flush()
+                if page:
+                    yield page
+                buf.add(_strip_markdown_line(heading.group(2)) + "\n")
+                continue
+            line = _strip_markdown_line(raw)
+            buf.add(line + "\n")
+            if not line and buf.full:
+                page = buf.flush()
+                if page:
+                    yield page
+        if buf.size >= 2 * page_chars:
+            page = buf.flush()
+            if page:
+                yield page
+    if pending:
+        buf.add(_strip_markdown_line(pending))
+    page = buf.flush()
+    if page:
+        yield page
+
+
+class _HTMLTextParser(HTMLParser):
+    """Incremental HTML → text converter that records section boundaries."""
+
+    BLOCK_TAGS = {
+        "p", "div", "br", "li", "ul", "ol", "tr", "table", "section", "article",
+        "header", "footer", "blockquote", "pre", "dd", "dt", "hr", "main", "aside",
+    }
+    SECTION_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+    SKIP_TAGS = {"script", "style", "noscript", "template", "head", "svg"}
+
+    def __init__(self, buf: _PageBuffer):
+        super().__init__(convert_charrefs=True)
+        self.buf = buf
+        self.pages: List[Page] = []
+        self._skip = 0
+
+    def _flush(self) -> None:
+        page = self.buf.flush()
+        if page:
+            self.pages.append(page)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip += 1
+        elif tag in self.SECTION_TAGS:
+            self._flush()
+        elif tag in self.BLOCK_TAGS:
+            self.buf.add("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self._skip = max(0, self._skip - 1)
+        elif tag in self.SECTION_TAGS:
+            self.buf.add("\n\n")
+        elif tag in self.BLOCK_TAGS:
+            self.buf.add("\n")
+            if self.buf.full:
+                self._flush()
+
+    def handle_data(self, data):
+        if self._skip:
+            return
+        text = " ".join(data.split())
+        if text:
+            self.buf.add(text + " ")
+        if self.buf.size >= 2 * self.buf.page_chars:
+            self._flush()
+
+
+def iter_html_pages(path: Path, page_chars: int = EXTRACT_PAGE_CHARS) -> Iterator[Page]:
+    """Yield section-aligned text pages from an HTML file.
+
+    Headings (``h1``–``h6``) start a new page and ``script``/``style`` content
+    is dropped.  The parser is fed one bounded block at a time.
+    """
+
+    buf = _PageBuffer(page_chars)
+    parser = _HTMLTextParser(buf)
+    for block in _iter_blocks(Path(path), page_chars):
+        parser.feed(block)
+        while parser.pages:
+            yield parser.pages.pop(0)
+    parser.close()
+    parser._flush()
+    yield from parser.pages
+
+
+EXTRACTORS = {
+    ".txt": iter_text_pages,
+    ".md": iter_markdown_pages,
+    ".markdown": iter_markdown_pages,
+    ".html": iter_html_pages,
+    ".htm": iter_html_pages,
+}
+
+
+def parse_pdf_pages(path: str) -> List[Page]:
+    """Parse a PDF into page dictionaries; importable by worker processes."""
+
+    from .chunking import parse_pdf
+
+    parsed = parse_pdf(path)
+    if isinstance(parsed, str):
+        return [{"page": 1, "text": parsed}]
+    return list(parsed)
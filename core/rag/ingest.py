@@ -0,0 +1,505 @@
+"""Concurrent, staged ingestion pipeline.
+
+Files flow through four stages connected by bounded queues::
+
+    parse ──► chunk ──► embed (batched) ──► write (single writer)
+
+PDF parsing runs in worker processes, streamed text formats are parsed in
+the parse threads themselves, chunking and embedding share the loaded
+sentence-transformer and a single writer owns all ChromaDB writes.  A full
+queue blocks the stage feeding it, so a slow embedder throttles parsing
+instead of letting pages pile up in memory.
+"""
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+import uuid
+
+from config import (
+    INGEST_PARSE_WORKERS,
+    INGEST_CHUNK_WORKERS,
+    INGEST_EMBED_BATCH,
+    INGEST_QUEUE_SIZE,
+    INGEST_DEDUP,
+)
+from .extractors import parse_pdf_pages
+from . import retriever
+
+log = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+@dataclass
+class IngestConfig:
+    """Parallelism, batching and backpressure settings for a pipeline run."""
+
+    parse_workers: int = INGEST_PARSE_WORKERS
+    chunk_workers: int = INGEST_CHUNK_WORKERS
+    embed_batch_size: int = INGEST_EMBED_BATCH
+    queue_size: int = INGEST_QUEUE_SIZE
+    parse_processes: bool = True
+    filter_chunks: bool = True
+    min_words: int = 5
+    replace_existing: bool = False
+    dedup: str = INGEST_DEDUP
+
+
+@dataclass
+class StageStats:
+    """Work counters for one pipeline stage."""
+
+    name: str
+    workers: int
+    items: int = 0
+    busy: float = 0.0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, items: int, seconds: float) -> None:
+        with self._lock:
+            self.items += items
+            self.busy += seconds
+
+    def to_dict(self, elapsed: float) -> Dict[str, Any]:
+        """Return counters plus wall-clock throughput and utilisation."""
+
+        elapsed = max(elapsed, 1e-9)
+        return {
+            "workers": self.workers,
+            "items": self.items,
+            "busy_s": round(self.busy, 3),
+            "items_per_s": round(self.items / elapsed, 2),
+            "utilization": round(self.busy / (elapsed * self.workers), 3),
+        }
+
+
+@dataclass
+class FileResult:
+    """Outcome of ingesting a single file."""
+
+    path: str
+    source: str
+    pages: int = 0
+    segments: int = 0
+    duplicates: int = 0
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class IngestReport:
+    """Per-file results and per-stage throughput for a pipeline run."""
+
+    files: List[FileResult]
+    stages: Dict[str, StageStats]
+    elapsed: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "elapsed_s": round(self.elapsed, 3),
+            "files": [vars(f) for f in self.files],
+            "stages": {n: s.to_dict(self.elapsed) for n, s in self.stages.items()},
+        }
+
+    def summary(self) -> str:
+        """Human readable one-line-per-stage summary."""
+
+        failed = [f for f in self.files if not f.ok]
+        lines = [
+            f"{len(self.files) - len(failed)}/{len(self.files)} files, "
+            f"{sum(f.segments for f in self.files)} segments "
+            f"({sum(f.duplicates for f in self.files)} near-duplicates skipped) in {self.elapsed:.1f}s"
+        ]
+        for name, stats in self.stages.items():
+            d = stats.to_dict(self.elapsed)
+            lines.append(
+                f"  {name:<6} x{d['workers']}: {d['items']} items, "
+                f"{d['items_per_s']}/s, {d['utilization']:.0%} busy"
+            )
+        for f in failed:
+            lines.append(f"  failed {f.path}: {f.error}")
+        return "\n".join(lines)
+
+
+class _Job:
+    """Book-keeping for one file as its pages and chunks move through stages."""
+
+    def __init__(self, path: Path, source: str, tags: List[str]):
+        self.path = path
+        self.source = source
+        self.tags = tags
+        self.result = FileResult(path=str(path), source=source)
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.parsed = False
+        self.pages_chunked = 0
+        self.chunks_emitted = 0
+        self.chunks_settled = 0
+        self.written = 0
+        self.finished = False
+        # What this run added, so a failure removes exactly that
+        self.segment_ids: List[str] = []
+        self.sketch_ids: List[str] = []
+        self.link_ids: List[int] = []
+
+    @property
+    def failed(self) -> bool:
+        return self.result.error is not None
+
+    def fail(self, exc: BaseException) -> None:
+        with self.lock:
+            if self.result.error is None:
+                self.result.error = f"{type(exc).__name__}: {exc}"
+
+    def next_index(self) -> int:
+        with self.lock:
+            idx = self.chunks_emitted
+            self.chunks_emitted += 1
+            return idx
+
+    def complete(self) -> bool:
+        """Return ``True`` exactly once, when every stage is done with the file."""
+
+        with self.lock:
+            if self.finished or not self.parsed:
+                return False
+            if self.pages_chunked < self.result.pages or self.chunks_settled < self.chunks_emitted:
+                return False
+            self.finished = True
+            self.result.seconds = time.perf_counter() - self.started
+            return True
+
+
+class IngestPipeline:
+    """Run files through the parse → chunk → embed → write stages.
+
+    Parameters
+    ----------
+    config:
+        Stage parallelism and queue bounds; defaults come from ``config.py``.
+    db:
+        Object exposing ``embed``, ``build_entry``, ``collection`` and
+        ``delete_by_source``; ``sketches``, ``delete_segments`` and
+        ``refresh_document_vector`` are used when present.  Defaults to :func:`retriever.get_db`.
+    chunker:
+        Callable turning page text into ``(chunk, meta)`` pairs.  Defaults to
+        :func:`retriever.chunk_text`.
+    on_file_done:
+        Optional callback invoked with each :class:`FileResult` as soon as the
+        file has been fully written (or has failed).
+    """
+
+    def __init__(
+        self,
+        config: Optional[IngestConfig] = None,
+        db=None,
+        chunker: Optional[Callable[[str], List[Any]]] = None,
+        on_file_done: Optional[Callable[[FileResult], None]] = None,
+    ):
+        self.config = config or IngestConfig()
+        self.db = db
+        self.chunker = chunker
+        self.on_file_done = on_file_done
+
+    # --- stage helpers ---
+
+    def _finish(self, job: _Job) -> None:
+        if not job.complete():
+            return
+        if job.failed:
+            try:
+                self._rollback(job)
+            except Exception as e:
+                log.exception("rolling back %s failed", job.source)
+                with job.lock:
+                    job.result.error += f"; rollback failed: {type(e).__name__}: {e}"
+        elif job.written and hasattr(self.db, "refresh_document_vector"):
+            try:
+                # From all stored segments: a run may append to an existing source
+                self.db.refresh_document_vector(job.source)
+            except Exception as e:
+                job.fail(e)
+        with self._results_lock:
+            self._results.append(job.result)
+        if self.on_file_done:
+            self.on_file_done(job.result)
+
+    def _rollback(self, job: _Job) -> None:
+        """Remove the segments, sketches and links a failed ``job`` added.
+
+        Segments stored for the source by earlier runs are left alone.
+        """
+
+        # Links first: the job's own duplicates must not be restored as
+        # orphans of the segments deleted below
+        if job.link_ids and self._sketches is not None:
+            self._sketches.remove_links(job.link_ids)
+        ids = list(dict.fromkeys(job.segment_ids + job.sketch_ids))
+        if ids and hasattr(self.db, "delete_segments"):
+            # Also forgets the sketches and re-stores duplicates linked to them
+            self.db.delete_segments(ids)
+        else:
+            if job.segment_ids:
+                self.db.collection.delete(ids=job.segment_ids)
+            if job.sketch_ids and self._sketches is not None:
+                self._sketches.remove_ids(job.sketch_ids)
+
+    def _close_stage(self, name: str, out_q: queue.Queue, consumers: int) -> None:
+        """Signal downstream once the last worker of stage ``name`` exits."""
+
+        with self._live_lock:
+            self._live[name] -= 1
+            last = self._live[name] == 0
+        if last:
+            for _ in range(consumers):
+                out_q.put(_DONE)
+
+    def _pages(self, job: _Job):
+        if job.path.suffix.lower() == ".pdf" and self._pool is not None:
+            return self._pool.submit(parse_pdf_pages, str(job.path)).result()
+        return retriever.iter_text(job.path)
+
+    def _parse_worker(self) -> None:
+        cfg = self.config
+        while True:
+            job = self._file_q.get()
+            if job is _DONE:
+                break
+            try:
+                if not job.path.exists():
+                    raise FileNotFoundError(f"File not found: {job.path}")
+                if cfg.replace_existing:
+                    self.db.delete_by_source(job.source)
+                t0 = time.perf_counter()
+                for page in self._pages(job):
+                    with job.lock:
+                        job.result.pages += 1
+                    self._stats["parse"].record(1, time.perf_counter() - t0)
+                    self._page_q.put((job, page))
+                    t0 = time.perf_counter()
+            except Exception as e:
+                job.fail(e)
+            with job.lock:
+                job.parsed = True
+            self._finish(job)
+        self._close_stage("parse", self._page_q, cfg.chunk_workers)
+
+    def _keep_chunk(self, chunk: str) -> bool:
+        if len(chunk.split()) < self.config.min_words:
+            return False
+        if self.config.filter_chunks:
+            return not retriever.is_all_caps(chunk) and not retriever.has_repeated_substring(chunk)
+        return True
+
+    def _is_duplicate(self, job: _Job, chunk: str, meta: Dict[str, Any]) -> bool:
+        """Check ``chunk`` against the sketch index, registering it if new."""
+
+        segment_id = str(uuid.uuid4())
+        canonical = self._sketches.check_and_add(chunk, segment_id, job.source)
+        if canonical is None:
+            meta["segment_id"] = segment_id
+            with job.lock:
+                job.sketch_ids.append(segment_id)
+            return False
+        with job.lock:
+            job.result.duplicates += 1
+        if self.config.dedup == "link":
+            link_id = self._sketches.link(job.source, canonical, chunk)
+            with job.lock:
+                job.link_ids.append(link_id)
+        return True
+
+    def _chunk_worker(self) -> None:
+        while True:
+            item = self._page_q.get()
+            if item is _DONE:
+                break
+            job, page = item
+            t0 = time.perf_counter()
+            try:
+                if not job.failed:
+                    page_num = page.get("page") or 1
+                    for chunk, meta in self.chunker(page.get("text", "")):
+                        if not self._keep_chunk(chunk):
+                            continue
+                        if self._sketches is not None and self._is_duplicate(job, chunk, meta):
+                            continue
+                        meta["page"] = page_num
+                        meta["segment_index"] = job.next_index()
+                        self._chunk_q.put((job, chunk, meta))
+            except Exception as e:
+                job.fail(e)
+            with job.lock:
+                job.pages_chunked += 1
+            self._stats["chunk"].record(1, time.perf_counter() - t0)
+            self._finish(job)
+        self._close_stage("chunk", self._chunk_q, 1)
+
+    def _settle(self, rows: List[tuple], written: bool) -> None:
+        jobs: Dict[int, _Job] = {}
+        for job, _, _ in rows:
+            with job.lock:
+                job.chunks_settled += 1
+                if written:
+                    job.written += 1
+                    job.result.segments += 1
+            jobs[id(job)] = job
+        for job in jobs.values():
+            self._finish(job)
+
+    def _embed_batch(self, rows: List[tuple]) -> None:
+        dropped = [r for r in rows if r[0].failed]
+        if dropped:
+            self._settle(dropped, written=False)
+            rows = [r for r in rows if not r[0].failed]
+            if not rows:
+                return
+        t0 = time.perf_counter()
+        try:
+            vectors = self.db.embed([chunk for _, chunk, _ in rows])
+        except Exception as e:
+            for job, _, _ in rows:
+                job.fail(e)
+            self._settle(rows, written=False)
+            return
+        self._stats["embed"].record(len(rows), time.perf_counter() - t0)
+        self._write_q.put((rows, vectors))
+
+    def _embed_worker(self) -> None:
+        batch: List[tuple] = []
+        while True:
+            try:
+                item = self._chunk_q.get(timeout=0.2)
+            except queue.Empty:
+                item = None
+            if item is _DONE:
+                break
+            if item is not None:
+                if item[0].failed:
+                    self._settle([item], written=False)
+                else:
+                    batch.append(item)
+            if batch and (item is None or len(batch) >= self.config.embed_batch_size):
+                self._embed_batch(batch)
+                batch = []
+        if batch:
+            self._embed_batch(batch)
+        self._write_q.put(_DONE)
+
+    def _write_worker(self) -> None:
+        while True:
+            item = self._write_q.get()
+            if item is _DONE:
+                break
+            rows, vectors = item
+            t0 = time.perf_counter()
+            keep = [(r, v) for r, v in zip(rows, vectors) if not r[0].failed]
+            dropped = [r for r in rows if r[0].failed]
+            try:
+                if keep:
+                    ids, docs, metas, embs = [], [], [], []
+                    for (job, chunk, meta), vec in keep:
+                        start, end = meta.get("char_range") or (-1, -1)
+                        _id, doc, m = self.db.build_entry(
+                            chunk, meta["segment_index"], job.source, job.tags, start, end,
+                            segment_id=meta.get("segment_id"),
+                        )
+                        m["page"] = meta["page"]
+                        ids.append(_id)
+                        docs.append(doc)
+                        metas.append(m)
+                        embs.append(vec)
+                    self.db.collection.add(ids=ids, documents=docs, metadatas=metas, embeddings=embs)
+                    for ((job, _, _), _), _id in zip(keep, ids):
+                        with job.lock:
+                            job.segment_ids.append(_id)
+                self._stats["write"].record(len(keep), time.perf_counter() - t0)
+                self._settle([r for r, _ in keep], written=True)
+            except Exception as e:
+                for (job, _, _), _ in keep:
+                    job.fail(e)
+                self._settle([r for r, _ in keep], written=False)
+            if dropped:
+                self._settle(dropped, written=False)
+
+    # --- public API ---
+
+    def run(
+        self,
+        paths: Iterable[Path],
+        tags: Optional[List[str]] = None,
+        source_for: Optional[Callable[[Path], str]] = None,
+    ) -> IngestReport:
+        """Ingest ``paths`` and return an :class:`IngestReport`.
+
+        Failures are recorded per file and never stop the run; the segments
+        a failed file added in this run are removed again, while those stored
+        by earlier runs are kept.  Unless
+        ``config.dedup`` is ``"off"``, chunks that are near duplicates of
+        already stored segments are dropped before embedding.
+        """
+
+        cfg = self.config
+        if cfg.parse_workers < 1 or cfg.chunk_workers < 1:
+            raise ValueError("parse_workers and chunk_workers must be at least 1")
+        self.db = self.db or retriever.get_db()
+        self.chunker = self.chunker or retriever.chunk_text
+        tags = tags or ["embedded"]
+        source_for = source_for or (lambda p: p.name)
+
+        self._results: List[FileResult] = []
+        self._results_lock = threading.Lock()
+        self._file_q: queue.Queue = queue.Queue(maxsize=cfg.queue_size)
+        self._page_q: queue.Queue = queue.Queue(maxsize=cfg.queue_size)
+        self._chunk_q: queue.Queue = queue.Queue(maxsize=cfg.queue_size * cfg.embed_batch_size)
+        self._write_q: queue.Queue = queue.Queue(maxsize=max(2, cfg.queue_size // 4))
+        self._live = {"parse": cfg.parse_workers, "chunk": cfg.chunk_workers}
+        self._live_lock = threading.Lock()
+        self._stats = {
+            "parse": StageStats("parse", cfg.parse_workers),
+            "chunk": StageStats("chunk", cfg.chunk_workers),
+            "embed": StageStats("embed", 1),
+            "write": StageStats("write", 1),
+        }
+        self._sketches = getattr(self.db, "sketches", None) if cfg.dedup != "off" else None
+        self._pool = None
+        if cfg.parse_processes and cfg.parse_workers > 0:
+            self._pool = ProcessPoolExecutor(
+                max_workers=cfg.parse_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+
+        threads = (
+            [threading.Thread(target=self._parse_worker, daemon=True) for _ in range(cfg.parse_workers)]
+            + [threading.Thread(target=self._chunk_worker, daemon=True) for _ in range(cfg.chunk_workers)]
+            + [
+                threading.Thread(target=self._embed_worker, daemon=True),
+                threading.Thread(target=self._write_worker, daemon=True),
+            ]
+        )
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        try:
+            for path in paths:
+                path = Path(path)
+                self._file_q.put(_Job(path, source_for(path), list(tags)))
+            for _ in range(cfg.parse_workers):
+                self._file_q.put(_DONE)
+            for t in threads:
+                t.join()
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+        return IngestReport(files=self._results, stages=self._stats, elapsed=time.perf_counter() - start)
@@ -1,16 +1,32 @@
 from __future__ import annotations
 from pathlib import Path
-from typing import List, Dict, Optional, Any
-import inspect, re
-
-from config import CHROMA_DB_DIR, COLLECTION_NAME
+from functools import lru_cache
+from typing import List, Dict, Optional, Any, Iterator
+import re
+import threading
+
+from config import (
+    CHROMA_DB_DIR,
+    COLLECTION_NAME,
+    ALLOWED_DOCUMENT_EXTENSIONS,
+    DEDUP_MAX_DISTANCE,
+    RETRIEVAL_COARSE_DOCS,
+    RETRIEVAL_COARSE_MIN_DOCS,
+    ANSWER_CACHE_MAX_DISTANCE,
+    ANSWER_CACHE_MAX_ENTRIES,
+    QUERY_EMBED_CACHE_SIZE,
+)
 from .embeddings import load_embedding_model
+from .dedup import SketchIndex, Orphan
+from .answer_cache import AnswerCache
 from .chunking import pagerank_chunk_text
 from .chunking import parse_pdf
+from .extractors import EXTRACTORS
 
 # --- DB Manager (lightweight wrapper around ChromaDB) ---
 import chromadb
 from chromadb.config import Settings
+import numpy as np
 import uuid
 
 class DBManager:
@@ -19,7 +35,15 @@ class DBManager:
     def __init__(self, persist_dir: str, collection_name: str, model=None):
         self.client = chromadb.PersistentClient(path=str(persist_dir), settings=Settings(anonymized_telemetry=False))
         self.collection = self.client.get_or_create_collection(collection_name)
+        self.doc_collection = self.client.get_or_create_collection(f"{collection_name}_documents")
         self.model = model or load_embedding_model()
+        self.sketches = SketchIndex(Path(persist_dir) / f"{collection_name}.sketches.sqlite3", DEDUP_MAX_DISTANCE)
+        self.answers = AnswerCache(
+            self.client, f"{collection_name}_answers", ANSWER_CACHE_MAX_DISTANCE, ANSWER_CACHE_MAX_ENTRIES
+        )
+        self._doc_vectors_ready = False
+        self._doc_vectors_lock = threading.Lock()
+        self._backfill: Optional[threading.Thread] = None
 
     def clear_collection(self, batch_size: int = 500) -> None:
         """Remove all records from the collection in batches."""
@@ -29,6 +53,11 @@ class DBManager:
         for i in range(0, total, batch_size):
             batch = all_ids[i:i + batch_size]
             self.collection.delete(ids=batch)
+        doc_ids = self.doc_collection.get()["ids"]
+        for i in range(0, len(doc_ids), batch_size):
+            self.doc_collection.delete(ids=doc_ids[i:i + batch_size])
+        self.sketches.clear()
+        self.answers.clear()
 
     def embed(self, docs: List[str], max_batch_tokens: int = 5120):
         """Embed ``docs`` using the stored sentence-transformer model."""
@@ -55,10 +84,10 @@ class DBManager:
             embeddings.extend(self.model.encode(current_batch))
         return embeddings
 
-    def build_entry(self, segment_text: str, segment_index: int, source: str, tags: Optional[List[str]] = None, start: Optional[int] = None, end: Optional[int] = None):
+    def build_entry(self, segment_text: str, segment_index: int, source: str, tags: Optional[List[str]] = None, start: Optional[int] = None, end: Optional[int] = None, segment_id: Optional[str] = None):
         """Build the ID, document and metadata tuple for a segment."""
 
-        segment_uuid = str(uuid.uuid4())
+        segment_uuid = segment_id or str(uuid.uuid4())
         metadata = {
             "uuid": segment_uuid,
             "source": source,
@@ -93,26 +122,129 @@ class DBManager:
             batch_metas = metas[i:i + batch_size]
             batch_embeddings = self.embed(batch_docs)
             self.collection.add(ids=batch_ids, documents=batch_docs, metadatas=batch_metas, embeddings=batch_embeddings)
+        self.refresh_document_vector(source)
+
+    def set_document_vector(self, source: str, vector, segments: int) -> None:
+        """Store the document-level summary ``vector`` for ``source``."""
+
+        self.doc_collection.upsert(
+            ids=[source],
+            embeddings=[np.asarray(vector, dtype=float).tolist()],
+            metadatas=[{"source": source, "segments": segments}],
+        )
+
+    def refresh_document_vector(self, source: str) -> None:
+        """Recompute the summary vector of ``source`` from its stored segments."""
+
+        data = self.collection.get(where={"source": source}, include=["embeddings"])
+        vectors = data.get("embeddings")
+        if vectors is None or len(vectors) == 0:
+            self.doc_collection.delete(ids=[source])
+            return
+        self.set_document_vector(source, np.mean(np.asarray(vectors), axis=0), len(vectors))
+
+    def rebuild_document_vectors(self) -> int:
+        """Recompute every document vector; returns the number of documents."""
+
+        sources = {m.get("source") for m in self.collection.get(include=["metadatas"])["metadatas"]}
+        for source in sources:
+            if source:
+                self.refresh_document_vector(source)
+        return len(sources)
+
+    def ensure_document_vectors(self) -> int:
+        """Build the document vectors missing for stored sources.
+
+        Libraries ingested before document vectors existed have none; until
+        they are back-filled the coarse search stage stays off.  Returns the
+        number of vectors built.
+        """
+
+        with self._doc_vectors_lock:
+            if self._doc_vectors_ready:
+                return 0
+            metas = self.collection.get(include=["metadatas"])["metadatas"]
+            sources = {m.get("source") for m in metas if m.get("source")}
+            missing = sources - set(self.doc_collection.get(include=[])["ids"])
+            for source in missing:
+                self.refresh_document_vector(source)
+            self._doc_vectors_ready = True
+        return len(missing)
+
+    def document_vectors_ready(self) -> bool:
+        """``True`` once every source has a document vector.
+
+        The first call starts :meth:`ensure_document_vectors` in a background
+        thread if the startup warm-up has not run it yet.
+        """
+
+        if self._doc_vectors_ready:
+            return True
+        if self._backfill is None:
+            self._backfill = threading.Thread(target=self.ensure_document_vectors, name="doc-vectors", daemon=True)
+            self._backfill.start()
+        return False
 
     def delete_by_source(self, source_name: str, batch_size: int = 500) -> None:
         """Remove all segments originating from ``source_name``."""
 
-        all_data = self.collection.get(include=["metadatas"])
-        to_delete = [id_ for id_, meta in zip(all_data["ids"], all_data["metadatas"]) if meta.get("source") == source_name]
+        to_delete = self.collection.get(where={"source": source_name}, include=[])["ids"]
         for i in range(0, len(to_delete), batch_size):
             batch = to_delete[i:i + batch_size]
             self.collection.delete(ids=batch)
+        self.doc_collection.delete(ids=[source_name])
+        self.answers.invalidate_source(source_name)
+        self._restore_orphans(self.sketches.remove_source(source_name))
+
+    def delete_segments(self, ids: List[str]) -> None:
+        """Remove individual segments by identifier."""
+
+        found = self.collection.get(ids=ids, include=["metadatas"])
+        sources = {m.get("source") for m in found.get("metadatas") or [] if m and m.get("source")}
+        self.collection.delete(ids=ids)
+        self.answers.invalidate_segments(ids)
+        self._restore_orphans(self.sketches.remove_ids(ids))
+        for source in sources:
+            self.refresh_document_vector(source)
+
+    def _restore_orphans(self, orphans: List[Orphan]) -> None:
+        """Store linked duplicates whose canonical segment was just deleted."""
+
+        rows = []
+        for orphan in orphans:
+            _id, doc, meta = self.build_entry(orphan.text, -1, orphan.source, ["relinked"])
+            canonical = self.sketches.check_and_add(orphan.text, _id, orphan.source)
+            if canonical is not None:
+                self.sketches.link(orphan.source, canonical, orphan.text)
+                continue
+            rows.append((_id, doc, meta))
+        if rows:
+            self.collection.add(
+                ids=[r[0] for r in rows],
+                documents=[r[1] for r in rows],
+                metadatas=[r[2] for r in rows],
+                embeddings=self.embed([r[1] for r in rows]),
+            )
+            for source in {r[2]["source"] for r in rows}:
+                self.refresh_document_vector(source)
 
 # --- Lazy loader ---
 _db: Optional[DBManager] = None
+_db_lock = threading.Lock()
 
 def get_db() -> DBManager:
-    """Return a singleton instance of :class:`DBManager`."""
+    """Return a singleton instance of :class:`DBManager`.
+
+    Construction is serialised so a startup warm-up and an early request do
+    not both load the embedding model.
+    """
 
     global _db
     if _db is None:
-        model = load_embedding_model()
-        _db = DBManager(persist_dir=CHROMA_DB_DIR, collection_name=COLLECTION_NAME, model=model)
+        with _db_lock:
+            if _db is None:
+                model = load_embedding_model()
+                _db = DBManager(persist_dir=CHROMA_DB_DIR, collection_name=COLLECTION_NAME, model=model)
     return _db
 
 class LazyDB:
@@ -146,107 +278,120 @@ def has_repeated_substring(text: str, patterns: Optional[List[str]] = None) -> b
     patterns = patterns or [r'\.{3,}', r'-{3,}', r'_{3,}']
     return any(re.search(p, chars) for p in patterns)
 
-def extract_text(file_path: Path) -> List[Dict[str, Any]]:
-    """Extract raw text and page numbers from ``file_path``."""
+def iter_text(file_path: Path) -> Iterator[Dict[str, Any]]:
+    """Lazily yield page dictionaries extracted from ``file_path``.
+
+    PDFs are parsed up front by :func:`parse_pdf`; text, Markdown and HTML
+    files are streamed page by page through :mod:`core.rag.extractors`.
+    """
 
     suffix = file_path.suffix.lower()
     if suffix == ".pdf":
         parsed = parse_pdf(str(file_path))
         if isinstance(parsed, list):
-            return parsed
+            yield from parsed
         elif isinstance(parsed, str):
-            return [{"page": 1, "text": parsed}]
+            yield {"page": 1, "text": parsed}
         else:
             raise TypeError(f"parse_pdf returned unexpected type: {type(parsed)}")
-    if suffix == ".txt":
-        text = file_path.read_text(encoding="utf-8")
-        return [{"page": 1, "text": text}]
-    raise ValueError(f"Unsupported file type: {file_path.suffix}")
-
-def _db_add_segments_compat(db_obj: DBManager, segments: List[str], source: str, tags: List[str], positions: List[Any], pages: List[Optional[int]], metadata: List[Dict[str, Any]]):
-    """Invoke ``db_obj.add_segments`` handling legacy signatures."""
-
-    sig = inspect.signature(db_obj.add_segments)
-    params = sig.parameters
-    kwargs = dict(segments=segments, source=source, tags=tags)
-    if "metadata" in params:
-        kwargs["metadata"] = metadata
-    else:
-        if "positions" in params:
-            kwargs["positions"] = positions
-        if "page" in params:
-            kwargs["page"] = pages
-        elif "pages" in params:
-            kwargs["pages"] = pages
-    return db_obj.add_segments(**kwargs)
+        return
+    extractor = EXTRACTORS.get(suffix)
+    if extractor is None:
+        raise ValueError(f"Unsupported file type: {file_path.suffix}")
+    yield from extractor(file_path)
+
+def extract_text(file_path: Path) -> List[Dict[str, Any]]:
+    """Extract raw text and page numbers from ``file_path``."""
+
+    return list(iter_text(file_path))
 
 def embed_file(file_path: Path, source_name: Optional[str] = None, tags: Optional[List[str]] = None, filter_chunks: bool = True) -> None:
-    """Embed a single file into the vector store."""
+    """Embed a single file into the vector store.
+
+    The file still flows through the staged :class:`~core.rag.ingest.IngestPipeline`
+    (in-process parsing) so chunking, embedding and writing overlap.
+    """
+
+    from .ingest import IngestConfig, IngestPipeline
 
     if not file_path.exists():
         raise FileNotFoundError(f"File not found: {file_path}")
-    pages_dicts = extract_text(file_path)
-    all_chunks: List[Any] = []
-    for page in pages_dicts:
-        page_num = page.get("page") or 1
-        page_text = page.get("text", "")
-        chunks_with_meta = chunk_text(page_text)
-        for chunk_text_, meta in chunks_with_meta:
-            meta["page"] = page_num
-            all_chunks.append((chunk_text_, meta))
-    if filter_chunks:
-        all_chunks = [
-            (chunk, meta) for chunk, meta in all_chunks
-            if not is_all_caps(chunk) and not has_repeated_substring(chunk)
-        ]
-    all_chunks = [
-        (chunk, meta) for chunk, meta in all_chunks if len(chunk.split()) >= 5
-    ]
-    segments = [chunk for chunk, _ in all_chunks]
-    positions = [meta.get("char_range", (None, None)) for _, meta in all_chunks]
-    pages = [meta.get("page") for _, meta in all_chunks]
-    metadata = [
-        {"char_range": meta.get("char_range"), "page": meta.get("page")}
-        for _, meta in all_chunks
-    ]
-    _db_add_segments_compat(
-        db_obj=get_db(),
-        segments=segments,
-        source=source_name or file_path.name,
-        tags=tags or ["embedded"],
-        positions=positions,
-        pages=pages,
-        metadata=metadata,
-    )
+    pipeline = IngestPipeline(IngestConfig(parse_workers=1, parse_processes=False, filter_chunks=filter_chunks))
+    report = pipeline.run([file_path], tags=tags or ["embedded"], source_for=lambda p: source_name or p.name)
+    for result in report.files:
+        if not result.ok:
+            raise RuntimeError(f"Failed to embed {file_path.name}: {result.error}")
 
-def embed_directory(data_dir: str, clear_collection: bool = False, default_tags: Optional[List[str]] = None, filter_chunks: bool = False) -> None:
-    """Embed all supported files under ``data_dir``."""
+def embed_directory(data_dir: str, clear_collection: bool = False, default_tags: Optional[List[str]] = None, filter_chunks: bool = False):
+    """Embed all supported files under ``data_dir`` and return the ingest report."""
+
+    from .ingest import IngestConfig, IngestPipeline
 
     data_path = Path(data_dir)
     if not data_path.exists():
         raise FileNotFoundError(f"Data directory not found: {data_dir}")
     if clear_collection:
         get_db().clear_collection()
-    for file_path in data_path.iterdir():
-        if file_path.suffix.lower() not in {".txt", ".pdf"}:
-            continue
-        embed_file(file_path=file_path, source_name=file_path.name, tags=default_tags or ["embedded"], filter_chunks=filter_chunks)
+    files = sorted(p for p in data_path.iterdir() if p.suffix.lower() in ALLOWED_DOCUMENT_EXTENSIONS)
+    pipeline = IngestPipeline(IngestConfig(filter_chunks=filter_chunks))
+    return pipeline.run(files, tags=default_tags or ["embedded"])
+
+def _coarse_sources(db: DBManager, embedding, exclude_sources: Optional[set] = None) -> Optional[List[str]]:
+    """Pick the documents most similar to ``embedding`` from the document collection.
+
+    Returns ``None`` when the library is small enough that a flat segment
+    query is cheaper, or while some sources still lack a document vector
+    (which would drop them from every result).
+    """
+
+    n_docs = db.doc_collection.count()
+    if n_docs < max(RETRIEVAL_COARSE_MIN_DOCS, 1) or n_docs <= RETRIEVAL_COARSE_DOCS:
+        return None
+    if not db.document_vectors_ready():
+        return None
+    where = {"source": {"$nin": sorted(exclude_sources)}} if exclude_sources else None
+    res = db.doc_collection.query(
+        query_embeddings=[embedding], n_results=RETRIEVAL_COARSE_DOCS, where=where, include=["metadatas"]
+    )
+    sources = [m.get("source") for m in res.get("metadatas", [[]])[0] if m.get("source")]
+    return sources or None
+
+@lru_cache(maxsize=QUERY_EMBED_CACHE_SIZE)
+def _embed_query(query: str) -> tuple:
+    return tuple(float(x) for x in get_db().embed([query])[0])
+
+def embed_query(query: str) -> List[float]:
+    """Embed a search query, reusing recent embeddings of identical queries."""
+
+    return list(_embed_query(query))
 
 def search(query: str, top_k: int = 5, exclude_sources: Optional[set] = None) -> List[Dict]:
-    """Perform a vector similarity search over embedded segments."""
+    """Perform a vector similarity search over embedded segments.
+
+    Large libraries are searched coarse-to-fine: the query is first matched
+    against per-document summary vectors and the segment query is restricted
+    to the best :data:`RETRIEVAL_COARSE_DOCS` documents.
+    """
 
     if top_k <= 0:
         return []
-    embedding = get_db().embed([query])[0]
-    results = get_db().collection.query(query_embeddings=[embedding], n_results=top_k)
+    db = get_db()
+    embedding = embed_query(query)
+    sources = _coarse_sources(db, embedding, exclude_sources)
+    where = None
+    if sources:
+        where = {"source": {"$in": sources}} if len(sources) > 1 else {"source": sources[0]}
+    results = db.collection.query(query_embeddings=[embedding], n_results=top_k, where=where)
     documents = results.get("documents", [[]])[0]
     metadatas = results.get("metadatas", [[]])[0]
     scores = results.get("distances", [[]])[0]
+    ids = results.get("ids", [[]])[0]
     out = []
-    for doc, meta, score in zip(documents, metadatas, scores):
+    for i, (doc, meta, score) in enumerate(zip(documents, metadatas, scores)):
         if exclude_sources and meta.get("source", "unknown") in exclude_sources:
             continue
         out.append({
+            "id": ids[i] if i < len(ids) else meta.get("uuid"),
             "text": doc.strip().replace("\n", " "),
             "source": meta.get("source", "unknown"),
             "score": score,
@@ -1,11 +1,32 @@
 """Chat session models and persistence."""
 from __future__ import annotations
+from collections import OrderedDict
 from dataclasses import dataclass, field
-from typing import List, Optional, Dict
-import uuid
+from typing import Any, Callable, List, Optional, Dict
 import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
 from pathlib import Path
 
+import markdown2
+
+from config import (
+    SESSION_BACKEND,
+    SESSION_CACHE_SIZE,
+    SESSION_DB_PATH,
+    SESSION_DIR,
+    SESSION_DIRTY_LIMIT,
+    SESSION_FLUSH_INTERVAL,
+    SESSION_PRUNE_INTERVAL,
+    SESSION_PRUNE_MIN_AGE,
+)
+
+log = logging.getLogger(__name__)
+
 # --- Chat history models ---
 
 @dataclass
@@ -16,17 +37,31 @@ class ChatExchange:
     context_used: List[Dict]
     rag_prompt: str
     assistant: str
-    html_response: str
+    html_response: str = ""
+    usage: Dict = field(default_factory=dict)
+    # Row id in a store that saves exchanges individually; ``None`` until saved
+    seq: Optional[int] = field(default=None, compare=False, repr=False)
+
+    @property
+    def html(self) -> str:
+        """The answer rendered as HTML, computed on first use."""
+
+        if not self.html_response and self.assistant:
+            self.html_response = markdown2.markdown(self.assistant)
+        return self.html_response
 
     def to_dict(self) -> Dict:
-        """Serialise the exchange to a dictionary."""
+        """Serialise the exchange to a dictionary.
+
+        The HTML rendering is not stored; :attr:`html` rebuilds it.
+        """
 
         return {
             "user": self.user,
             "context_used": self.context_used,
             "rag_prompt": self.rag_prompt,
             "assistant": self.assistant,
-            "html_response": self.html_response,
+            "usage": self.usage,
         }
 
     @classmethod
@@ -39,6 +74,7 @@ class ChatExchange:
             rag_prompt=data.get("rag_prompt", ""),
             assistant=data.get("assistant") or data.get("llm_response", ""),
             html_response=data.get("html_response", ""),
+            usage=data.get("usage") or {},
         )
 
 @dataclass
@@ -52,6 +88,7 @@ class ChatSession:
     title: str = ""
     inactive_sources: List[str] = field(default_factory=list)
     persona: Optional[str] = None
+    llm_context: Dict[str, str] = field(default_factory=dict)
 
     @classmethod
     def new(cls, session_id: Optional[str] = None, user_id: str = "default") -> "ChatSession":
@@ -59,10 +96,12 @@ class ChatSession:
 
         return cls(session_id=session_id or str(uuid.uuid4()), user_id=user_id)
 
-    def add_exchange(self, user: str, context_used: List[Dict], rag_prompt: str, assistant: str, html_response: str) -> None:
-        """Append a chat exchange to the history."""
+    def add_exchange(self, user: str, context_used: List[Dict], rag_prompt: str, assistant: str, html_response: str = "", usage: Optional[Dict] = None) -> ChatExchange:
+        """Append a chat exchange to the history and return it."""
 
-        self.history.append(ChatExchange(user, context_used, rag_prompt, assistant, html_response))
+        exchange = ChatExchange(user, context_used, rag_prompt, assistant, html_response, usage or {})
+        self.history.append(exchange)
+        return exchange
 
     def trim_history(self, max_length: int) -> None:
         """Limit history length to ``max_length`` items."""
@@ -81,6 +120,7 @@ class ChatSession:
             "history": [h.to_dict() for h in self.history],
             "inactive_sources": self.inactive_sources,
             "persona": self.persona,
+            "llm_context": self.llm_context,
         }
 
     @classmethod
@@ -94,20 +134,201 @@ class ChatSession:
             title=data.get("title", ""),
             inactive_sources=data.get("inactive_sources", []),
             persona=data.get("persona"),
+            llm_context=data.get("llm_context") or {},
         )
         session.history = [ChatExchange.from_dict(e) for e in data.get("history", [])]
         return session
 
-# --- Session store ---
+# --- Session stores ---
+
+SESSION_DIR.mkdir(parents=True, exist_ok=True)
+
+# Per-session locks, striped so their number stays fixed however many
+# sessions there are.  Reentrant because a store may save while holding one.
+_LOCK_STRIPES = [threading.RLock() for _ in range(64)]
+
+class BaseSessionStore:
+    """Interface of the chat session backends."""
+
+    def lock(self, session_id: str) -> threading.RLock:
+        """Lock to hold while changing or writing ``session_id``."""
+
+        return _LOCK_STRIPES[hash(session_id) % len(_LOCK_STRIPES)]
+
+    def reindex(self) -> None:
+        """Resynchronise any metadata index with the stored sessions."""
+
+    def close(self) -> None:
+        """Write out anything pending and release resources."""
+
+    def save(self, session: ChatSession) -> None:
+        raise NotImplementedError
+
+    def load(self, session_id: str) -> Optional[ChatSession]:
+        raise NotImplementedError
+
+    def list_sessions(self) -> List[Dict]:
+        """Return ``id``, ``path`` and ``modified`` of every stored session."""
+
+        raise NotImplementedError
+
+    def delete(self, session_id: str) -> None:
+        raise NotImplementedError
+
+    def exists(self, session_id: str) -> bool:
+        return self.load(session_id) is not None
+
+    def update(
+        self, session_id: str, change: Callable[[ChatSession], None], create: bool = False
+    ) -> Optional[ChatSession]:
+        """Apply ``change`` to the stored copy of ``session_id`` and save it.
+
+        The load, change and save happen under :meth:`lock`, so updates made
+        through this method by concurrent turns and the summary worker never
+        overwrite each other.  A missing session is created when ``create``
+        is set, otherwise ``None`` is returned.
+        """
+
+        with self.lock(session_id):
+            session = self.load(session_id)
+            if session is None:
+                if not create:
+                    return None
+                session = ChatSession.new(session_id=session_id)
+            change(session)
+            self.save(session)
+        return session
+
+    def modified(self, session_id: str) -> Optional[float]:
+        """Time of the last save of ``session_id``, or ``None``."""
+
+        for entry in self.list_sessions():
+            if entry["id"] == session_id:
+                return entry["modified"]
+        return None
 
-SESSION_DIR = Path("sessions")
-SESSION_DIR.mkdir(exist_ok=True)
+    def list_meta(
+        self, limit: Optional[int] = None, offset: int = 0, user_id: Optional[str] = None, include_empty: bool = False
+    ) -> List[Dict]:
+        """Metadata of stored sessions, most recently modified first.
 
-class SessionStore:
-    """Simple file-based persistence for :class:`ChatSession` objects."""
+        Each entry has ``id``, ``title``, ``user_id``, ``created``,
+        ``modified`` and ``exchanges``.  Sessions without history are left
+        out unless ``include_empty`` is set.
+        """
+
+        out = []
+        for entry in self.list_sessions():
+            session = self.load(entry["id"])
+            if session is None or (user_id is not None and session.user_id != user_id):
+                continue
+            if session.history or include_empty:
+                out.append(_meta(session, entry["modified"], entry["modified"]))
+        out.sort(key=lambda m: m["modified"], reverse=True)
+        return out[offset:offset + limit if limit is not None else None]
+
+    def prune_empty(self, min_age: float = 0.0) -> int:
+        """Delete sessions without history last saved over ``min_age`` seconds ago."""
+
+        cutoff = time.time() - min_age
+        removed = 0
+        for entry in list(self.list_sessions()):
+            if entry["modified"] > cutoff:
+                continue
+            session = self.load(entry["id"])
+            if session and not session.history:
+                self.delete(entry["id"])
+                removed += 1
+        return removed
+
+def _meta(session: ChatSession, created: float, modified: float) -> Dict:
+    return {
+        "id": session.session_id,
+        "title": session.title,
+        "user_id": session.user_id,
+        "created": created,
+        "modified": modified,
+        "exchanges": len(session.history),
+    }
+
+class SessionIndex:
+    """SQLite table of session metadata kept next to the JSON files.
+
+    :class:`SessionStore` updates it on every save and delete, so listings
+    and pruning never have to open the session files themselves.
+    """
+
+    COLUMNS = ("id", "title", "user_id", "created", "modified", "exchanges")
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.executescript(
+            """
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            PRAGMA busy_timeout=5000;
+            CREATE TABLE IF NOT EXISTS meta (
+                id TEXT PRIMARY KEY, title TEXT, user_id TEXT, created REAL, modified REAL, exchanges INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS meta_modified ON meta (modified);
+            """
+        )
+
+    def put(self, session: ChatSession, modified: float, created: Optional[float] = None) -> None:
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO meta VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET title = excluded.title, user_id = excluded.user_id,
+                    modified = excluded.modified, exchanges = excluded.exchanges
+                """,
+                (session.session_id, session.title, session.user_id, created or modified, modified, len(session.history)),
+            )
+
+    def remove(self, session_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM meta WHERE id = ?", (session_id,))
+
+    def ids(self) -> List[str]:
+        with self._lock:
+            return [r[0] for r in self._conn.execute("SELECT id FROM meta")]
+
+    def list(
+        self, limit: Optional[int] = None, offset: int = 0, user_id: Optional[str] = None, include_empty: bool = False
+    ) -> List[Dict]:
+        sql = "SELECT id, title, user_id, created, modified, exchanges FROM meta WHERE 1 = 1"
+        args: List[Any] = []
+        if not include_empty:
+            sql += " AND exchanges > 0"
+        if user_id is not None:
+            sql += " AND user_id = ?"
+            args.append(user_id)
+        sql += " ORDER BY modified DESC LIMIT ? OFFSET ?"
+        args += [-1 if limit is None else limit, offset]
+        with self._lock:
+            rows = self._conn.execute(sql, args).fetchall()
+        return [dict(zip(self.COLUMNS, row)) for row in rows]
+
+    def empty_before(self, cutoff: float) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT id FROM meta WHERE exchanges = 0 AND modified <= ?", (cutoff,))
+            return [r[0] for r in rows]
+
+class SessionStore(BaseSessionStore):
+    """File-based persistence, one compact JSON file per session.
+
+    Files are written to a temporary name and renamed into place, so a crash
+    or a concurrent save never leaves a truncated file behind.
+    """
 
     def __init__(self, storage_path: Path = SESSION_DIR):
         self.storage_path = storage_path
+        Path(storage_path).mkdir(parents=True, exist_ok=True)
+        self.index = SessionIndex(Path(storage_path) / "index.sqlite3")
+        if not self.index.ids():
+            self.reindex()
 
     def _session_path(self, session_id: str) -> Path:
         """Return the filesystem path for ``session_id``."""
@@ -117,8 +338,12 @@ class SessionStore:
     def save(self, session: ChatSession) -> None:
         """Persist ``session`` to disk."""
 
-        with open(self._session_path(session.session_id), "w", encoding="utf-8") as f:
-            json.dump(session.to_dict(), f, indent=2)
+        path = self._session_path(session.session_id)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(session.to_dict(), f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, path)
+        self.index.put(session, time.time())
 
     def load(self, session_id: str) -> Optional[ChatSession]:
         """Load a session from disk or return ``None`` if missing."""
@@ -132,6 +357,7 @@ class SessionStore:
             return ChatSession.from_dict(data)
         except json.JSONDecodeError:
             path.unlink()
+            self.index.remove(session_id)
             return None
 
     def list_sessions(self) -> List[Dict]:
@@ -154,16 +380,473 @@ class SessionStore:
         p = self._session_path(session_id)
         if p.exists():
             p.unlink()
+        self.index.remove(session_id)
 
     def exists(self, session_id: str) -> bool:
         """Return ``True`` if a session file exists."""
 
         return self._session_path(session_id).exists()
 
-    def prune_empty(self) -> None:
-        """Delete any session files that contain no history."""
+    def modified(self, session_id: str) -> Optional[float]:
+        try:
+            return self._session_path(session_id).stat().st_mtime
+        except OSError:
+            return None
 
-        for entry in list(self.list_sessions()):
-            session = self.load(entry["id"])
-            if session and not session.history:
-                self.delete(entry["id"])
+    def reindex(self) -> None:
+        """Bring the index in line with the files on disk.
+
+        Files missing from the index are read once; index entries whose file
+        is gone are dropped.  Used on first start and by the periodic sweep,
+        which also catches files written or removed by other means.
+        """
+
+        files = {f.stem: f for f in self.storage_path.glob("*.json")}
+        indexed = set(self.index.ids())
+        for sid in indexed - files.keys():
+            self.index.remove(sid)
+        for sid in files.keys() - indexed:
+            session = self.load(sid)
+            if session is not None:
+                mtime = files[sid].stat().st_mtime
+                self.index.put(session, mtime, mtime)
+
+    def list_meta(
+        self, limit: Optional[int] = None, offset: int = 0, user_id: Optional[str] = None, include_empty: bool = False
+    ) -> List[Dict]:
+        return self.index.list(limit, offset, user_id, include_empty)
+
+    def prune_empty(self, min_age: float = 0.0) -> int:
+        removed = self.index.empty_before(time.time() - min_age)
+        for sid in removed:
+            self.delete(sid)
+        return len(removed)
+
+class SQLiteSessionStore(BaseSessionStore):
+    """All sessions in one SQLite database in WAL mode.
+
+    Exchanges are rows of their own: a save inserts only the exchanges added
+    since the session was loaded (those without a ``seq``) and deletes the
+    rows dropped by :meth:`ChatSession.trim_history`, so its cost does not
+    grow with the length of the history.  Exchanges are treated as
+    immutable once saved.
+    """
+
+    def __init__(self, path: Path = SESSION_DB_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.executescript(
+            """
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            PRAGMA busy_timeout=5000;
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY, user_id TEXT, title TEXT, summary TEXT,
+                state TEXT, created REAL, modified REAL
+            );
+            CREATE TABLE IF NOT EXISTS exchanges (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS exchanges_session ON exchanges (session_id, seq);
+            CREATE INDEX IF NOT EXISTS sessions_modified ON sessions (modified);
+            """
+        )
+
+    @staticmethod
+    def _state(session: ChatSession) -> str:
+        return json.dumps(
+            {
+                "inactive_sources": session.inactive_sources,
+                "persona": session.persona,
+                "llm_context": session.llm_context,
+            },
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+
+    def save(self, session: ChatSession) -> None:
+        """Write the session row and any exchanges not stored yet."""
+
+        now = time.time()
+        sid = session.session_id
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    """
+                    INSERT INTO sessions VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (session_id) DO UPDATE SET user_id = excluded.user_id,
+                        title = excluded.title, summary = excluded.summary,
+                        state = excluded.state, modified = excluded.modified
+                    """,
+                    (sid, session.user_id, session.title, session.summary, self._state(session), now, now),
+                )
+                kept = [h.seq for h in session.history if h.seq is not None]
+                if kept:
+                    self._conn.execute("DELETE FROM exchanges WHERE session_id = ? AND seq < ?", (sid, min(kept)))
+                else:
+                    self._conn.execute("DELETE FROM exchanges WHERE session_id = ?", (sid,))
+                for h in session.history:
+                    if h.seq is None:
+                        cur = self._conn.execute(
+                            "INSERT INTO exchanges (session_id, data) VALUES (?, ?)",
+                            (sid, json.dumps(h.to_dict(), ensure_ascii=False, separators=(",", ":"))),
+                        )
+                        h.seq = cur.lastrowid
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def load(self, session_id: str) -> Optional[ChatSession]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT user_id, title, summary, state FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            rows = self._conn.execute(
+                "SELECT seq, data FROM exchanges WHERE session_id = ? ORDER BY seq", (session_id,)
+            ).fetchall()
+        data: Dict[str, Any] = json.loads(row[3] or "{}")
+        data.update(session_id=session_id, user_id=row[0], title=row[1] or "", summary=row[2] or "")
+        session = ChatSession.from_dict(data)
+        for seq, raw in rows:
+            exchange = ChatExchange.from_dict(json.loads(raw))
+            exchange.seq = seq
+            session.history.append(exchange)
+        return session
+
+    def list_sessions(self) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute("SELECT session_id, modified FROM sessions").fetchall()
+        return [{"id": sid, "path": str(self.path), "modified": modified} for sid, modified in rows]
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute("DELETE FROM exchanges WHERE session_id = ?", (session_id,))
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._conn.execute("COMMIT")
+
+    def exists(self, session_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return row is not None
+
+    def modified(self, session_id: str) -> Optional[float]:
+        with self._lock:
+            row = self._conn.execute("SELECT modified FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return row[0] if row else None
+
+    def list_meta(
+        self, limit: Optional[int] = None, offset: int = 0, user_id: Optional[str] = None, include_empty: bool = False
+    ) -> List[Dict]:
+        sql = (
+            "SELECT s.session_id, s.title, s.user_id, s.created, s.modified,"
+            " (SELECT COUNT(*) FROM exchanges e WHERE e.session_id = s.session_id) AS n"
+            " FROM sessions s WHERE 1 = 1"
+        )
+        args: List[Any] = []
+        if not include_empty:
+            sql += " AND EXISTS (SELECT 1 FROM exchanges e WHERE e.session_id = s.session_id)"
+        if user_id is not None:
+            sql += " AND s.user_id = ?"
+            args.append(user_id)
+        sql += " ORDER BY s.modified DESC LIMIT ? OFFSET ?"
+        args += [-1 if limit is None else limit, offset]
+        with self._lock:
+            rows = self._conn.execute(sql, args).fetchall()
+        return [dict(zip(SessionIndex.COLUMNS, row)) for row in rows]
+
+    def prune_empty(self, min_age: float = 0.0) -> int:
+        with self._lock:
+            cur = self._conn.execute(
+                "DELETE FROM sessions WHERE modified <= ? AND NOT EXISTS"
+                " (SELECT 1 FROM exchanges e WHERE e.session_id = sessions.session_id)",
+                (time.time() - min_age,),
+            )
+        return cur.rowcount
+
+class SessionCache(BaseSessionStore):
+    """LRU cache of live :class:`ChatSession` objects in front of ``backend``.
+
+    :meth:`load` hands out the cached object, so every request working on a
+    session sees the same instance; changes to it should go through
+    :meth:`update` or be made while holding :meth:`lock`.  :meth:`save` only marks the session dirty; a
+    background thread writes dirty sessions every ``flush_interval`` seconds,
+    or sooner once ``dirty_limit`` are waiting, and :meth:`close` writes the
+    rest on shutdown.  ``flush_interval <= 0`` writes through instead.
+    Dirty sessions are never evicted, so the cache can briefly exceed
+    ``size`` until the next flush.  A flush copies each session while
+    holding its lock and writes the copy after releasing it, so a slow
+    backend never blocks requests working on the session.
+
+    The cache assumes each session is served by a single process; run
+    several workers with sticky sessions or ``SESSION_CACHE_SIZE=0``.
+    """
+
+    def __init__(
+        self,
+        backend: BaseSessionStore,
+        size: int = SESSION_CACHE_SIZE,
+        flush_interval: float = SESSION_FLUSH_INTERVAL,
+        dirty_limit: int = SESSION_DIRTY_LIMIT,
+    ):
+        self.backend = backend
+        self.size = size
+        self.flush_interval = flush_interval
+        self.dirty_limit = dirty_limit
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        # Dirty session ids with the number of the save that dirtied them; an
+        # id stays dirty (and cached) until that save has been written
+        self._dirty: Dict[str, int] = {}
+        self._saves = 0
+        self._lock = threading.Lock()
+        # Serialises flushes so copies of a session are written in order;
+        # never acquired while holding a session lock
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _remember(self, session: ChatSession, dirty: bool) -> None:
+        with self._lock:
+            sid = session.session_id
+            self._sessions[sid] = session
+            self._sessions.move_to_end(sid)
+            if dirty:
+                self._saves += 1
+                self._dirty[sid] = self._saves
+            self._evict()
+            waiting = len(self._dirty)
+        if dirty and waiting >= self.dirty_limit:
+            self._wake.set()
+
+    def _evict(self) -> None:
+        """Drop least recently used clean sessions beyond ``size``; needs ``_lock``."""
+
+        over = len(self._sessions) - self.size
+        for sid in list(self._sessions):
+            if over <= 0:
+                break
+            if sid not in self._dirty:
+                del self._sessions[sid]
+                over -= 1
+
+    def _write(self, session: ChatSession) -> None:
+        """Write a copy of ``session`` taken under its lock; needs ``_flush_lock``."""
+
+        with self.lock(session.session_id):
+            live = list(session.history)
+            copy = ChatSession.from_dict(session.to_dict())
+            for c, h in zip(copy.history, live):
+                c.seq = h.seq
+        self.backend.save(copy)
+        # Hand row ids assigned by the backend back to the live exchanges
+        with self.lock(session.session_id):
+            for c, h in zip(copy.history, live):
+                if h.seq is None:
+                    h.seq = c.seq
+        self.writes += 1
+
+    def _ensure_flusher(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="session-flusher", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self) -> int:
+        """Write every dirty session now; returns how many were written."""
+
+        with self._flush_lock:
+            with self._lock:
+                batch = [(sid, gen, self._sessions[sid]) for sid, gen in self._dirty.items()]
+            written = 0
+            for sid, gen, session in batch:
+                try:
+                    self._write(session)
+                except Exception:
+                    log.exception("writing session %s failed", sid)
+                    continue
+                written += 1
+                with self._lock:
+                    if self._dirty.get(sid) == gen:
+                        del self._dirty[sid]
+            with self._lock:
+                self._evict()
+        return written
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Stop the flusher thread and write what is still dirty."""
+
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+        self.backend.close()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "cached": len(self._sessions),
+                "dirty": len(self._dirty),
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+            }
+
+    # --- BaseSessionStore ---
+
+    def save(self, session: ChatSession) -> None:
+        if self.flush_interval <= 0:
+            with self.lock(session.session_id):
+                self.backend.save(session)
+            self.writes += 1
+            self._remember(session, dirty=False)
+            return
+        self._remember(session, dirty=True)
+        self._ensure_flusher()
+
+    def load(self, session_id: str) -> Optional[ChatSession]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+                self.hits += 1
+                return session
+        with self.lock(session_id):
+            with self._lock:
+                session = self._sessions.get(session_id)
+            if session is None:
+                self.misses += 1
+                session = self.backend.load(session_id)
+                if session is None:
+                    return None
+                self._remember(session, dirty=False)
+        return session
+
+    def delete(self, session_id: str) -> None:
+        # Wait for a running flush so it cannot write the session back
+        with self._flush_lock, self.lock(session_id):
+            with self._lock:
+                self._sessions.pop(session_id, None)
+                self._dirty.pop(session_id, None)
+            self.backend.delete(session_id)
+
+    def exists(self, session_id: str) -> bool:
+        with self._lock:
+            if session_id in self._sessions:
+                return True
+        return self.backend.exists(session_id)
+
+    def modified(self, session_id: str) -> Optional[float]:
+        return self.backend.modified(session_id)
+
+    def list_sessions(self) -> List[Dict]:
+        self.flush()
+        return self.backend.list_sessions()
+
+    def list_meta(
+        self, limit: Optional[int] = None, offset: int = 0, user_id: Optional[str] = None, include_empty: bool = False
+    ) -> List[Dict]:
+        self.flush()
+        return self.backend.list_meta(limit, offset, user_id, include_empty)
+
+    def reindex(self) -> None:
+        self.backend.reindex()
+
+    def prune_empty(self, min_age: float = 0.0) -> int:
+        self.flush()
+        removed = self.backend.prune_empty(min_age)
+        with self._lock:
+            for sid in [sid for sid, s in self._sessions.items() if not s.history and sid not in self._dirty]:
+                del self._sessions[sid]
+        return removed
+
+class SessionSweeper:
+    """Background thread deleting sessions that stayed empty.
+
+    Every ``interval`` seconds sessions without history whose last save is
+    more than ``min_age`` seconds old are removed; younger ones are kept so
+    a freshly opened chat is not deleted before its first turn.
+    """
+
+    def __init__(self, store: BaseSessionStore, interval: float = SESSION_PRUNE_INTERVAL, min_age: float = SESSION_PRUNE_MIN_AGE):
+        self.store = store
+        self.interval = interval
+        self.min_age = min_age
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self.interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="session-sweeper", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while True:
+            self.sweep()
+            if self._stop.wait(self.interval):
+                return
+
+    def sweep(self) -> int:
+        """Prune empty sessions once; returns how many were deleted."""
+
+        try:
+            self.store.reindex()
+            return self.store.prune_empty(self.min_age)
+        except Exception:
+            log.exception("session sweep failed")
+            return 0
+
+_store: Optional[BaseSessionStore] = None
+_sweeper: Optional[SessionSweeper] = None
+_store_lock = threading.Lock()
+
+def get_session_store() -> BaseSessionStore:
+    """Return the process-wide store selected by ``SESSION_BACKEND``.
+
+    Unless ``SESSION_CACHE_SIZE`` is ``0`` it is wrapped in a
+    :class:`SessionCache`.
+    """
+
+    global _store
+    with _store_lock:
+        if _store is None:
+            if SESSION_BACKEND == "sqlite":
+                backend: BaseSessionStore = SQLiteSessionStore(SESSION_DB_PATH)
+            else:
+                backend = SessionStore()
+            _store = SessionCache(backend) if SESSION_CACHE_SIZE > 0 else backend
+    return _store
+
+def get_session_sweeper() -> SessionSweeper:
+    """Return the :class:`SessionSweeper` of the shared store."""
+
+    global _sweeper
+    store = get_session_store()
+    with _store_lock:
+        if _sweeper is None:
+            _sweeper = SessionSweeper(store)
+    return _sweeper
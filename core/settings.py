@@ -1,7 +1,9 @@
 from __future__ import annotations
 from pathlib import Path
-from typing import Optional, Dict, Any, List, Literal
+from typing import Optional, Dict, Any, List, Literal, Tuple, Union
 import json
+import os
+import threading
 from pydantic import BaseModel, Field, ConfigDict
 
 from .prompts import loader as prompt_loader
@@ -17,28 +19,58 @@ class UserSettings(BaseModel):
     temperature: float = 0.2
     top_p: float = 0.95
     max_tokens: int = 512
+    # Per-task model overrides, e.g. {"title": "qwen2.5:0.5b"}; see core.llm.routing
+    task_models: Dict[str, Union[str, Dict[str, str]]] = Field(default_factory=dict)
 
 def _user_path(user_id: str) -> Path:
     """Location of the settings file for ``user_id``."""
 
     return USERS_DIR / f"{user_id}.json"
 
+# Settings by user id, with the (mtime_ns, size) of the file they were read
+# from or ``None`` for defaults that were never saved.  The file is stat'ed on
+# every lookup so changes made by other workers are picked up.
+_cache: Dict[str, Tuple[Optional[Tuple[int, int]], UserSettings]] = {}
+_cache_lock = threading.Lock()
+
+def _stamp(p: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(p)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
 def load_settings(user_id: str) -> UserSettings:
-    """Load settings for ``user_id`` creating defaults if necessary."""
+    """Load settings for ``user_id``, falling back to defaults.
+
+    Results are cached per process and re-read only when the file changes.
+    Defaults are not written to disk; :func:`save_settings` persists them.
+    The returned object is shared, so use ``model_copy`` to change it.
+    """
 
     p = _user_path(user_id)
-    if not p.exists():
+    stamp = _stamp(p)
+    with _cache_lock:
+        hit = _cache.get(user_id)
+    if hit is not None and hit[0] == stamp:
+        return hit[1]
+    if stamp is None:
         s = UserSettings(user_id=user_id)
-        save_settings(s)
-        return s
-    data = json.loads(p.read_text(encoding="utf-8"))
-    return UserSettings(**data)
+    else:
+        s = UserSettings(**json.loads(p.read_text(encoding="utf-8")))
+    with _cache_lock:
+        _cache[user_id] = (stamp, s)
+    return s
 
 def save_settings(s: UserSettings) -> None:
-    """Persist ``s`` to its JSON file."""
+    """Persist ``s`` to its JSON file and update the cache."""
 
     p = _user_path(s.user_id)
-    p.write_text(s.model_dump_json(indent=2), encoding="utf-8")
+    tmp = p.with_suffix(".json.tmp")
+    tmp.write_text(s.model_dump_json(indent=2), encoding="utf-8")
+    tmp.replace(p)
+    with _cache_lock:
+        _cache[s.user_id] = (_stamp(p), s)
 
 def update_settings(user_id: str, patch: Dict[str, Any]) -> UserSettings:
     """Apply ``patch`` to a user's settings and persist the result."""
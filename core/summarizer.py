@@ -0,0 +1,130 @@
+"""Background title and summary generation for chat sessions.
+
+Chat routes hand finished exchanges to :class:`SummaryWorker` instead of
+calling the LLM before responding.  Exchanges for the same session that
+arrive within ``delay`` seconds of each other are coalesced into a single
+summary update, after which the session is reloaded, updated and saved.
+"""
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+import logging
+import threading
+import time
+
+from config import SUMMARY_DELAY_SECONDS
+from .sessions import BaseSessionStore, ChatSession, get_session_store
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class _Pending:
+    user_id: Optional[str]
+    due: float
+    exchanges: List[Tuple[str, str]] = field(default_factory=list)
+
+
+class SummaryWorker:
+    """Single background thread that maintains session titles and summaries."""
+
+    def __init__(self, store: BaseSessionStore, delay: float = SUMMARY_DELAY_SECONDS):
+        self.store = store
+        self.delay = delay
+        self._pending: Dict[str, _Pending] = {}
+        self._active: Set[str] = set()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+    def submit(self, session_id: str, user: str, assistant: str, user_id: Optional[str] = None) -> None:
+        """Queue an exchange; rapid consecutive turns are merged into one update."""
+
+        with self._cond:
+            job = self._pending.get(session_id)
+            if job is None:
+                job = self._pending[session_id] = _Pending(user_id=user_id, due=0.0)
+            job.exchanges.append((user, assistant))
+            job.due = time.monotonic() + self.delay
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name="summary-worker", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def is_pending(self, session_id: str) -> bool:
+        """``True`` while an update for ``session_id`` is queued or running."""
+
+        with self._cond:
+            return session_id in self._pending or session_id in self._active
+
+    def stop(self, timeout: float = 30.0) -> None:
+        """Process everything still queued, then stop the worker thread."""
+
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _next_job(self) -> Optional[Tuple[str, _Pending]]:
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                ready = [sid for sid, job in self._pending.items() if self._stopping or job.due <= now]
+                if ready:
+                    sid = min(ready, key=lambda s: self._pending[s].due)
+                    self._active.add(sid)
+                    return sid, self._pending.pop(sid)
+                if self._stopping:
+                    return None
+                timeout = min((j.due for j in self._pending.values()), default=now + 60) - now
+                self._cond.wait(max(timeout, 0.01))
+
+    def _run(self) -> None:
+        while True:
+            item = self._next_job()
+            if item is None:
+                return
+            sid, job = item
+            try:
+                self._process(sid, job)
+            except Exception:
+                log.exception("Summary update failed for session %s", sid)
+            finally:
+                with self._cond:
+                    self._active.discard(sid)
+
+    def _process(self, session_id: str, job: _Pending) -> None:
+        from .prompts import renderer
+
+        session = self.store.load(session_id)
+        if session is None:
+            return
+        title = session.title
+        if not title:
+            user, assistant = job.exchanges[0]
+            title = renderer.generate_title(f"User: {user}\nAssistant: {assistant}", user_id=job.user_id)
+        summary = renderer.summarize_exchanges(session.summary, job.exchanges, user_id=job.user_id)
+
+        def apply(current: ChatSession) -> None:
+            if not current.title:
+                current.title = title
+            current.summary = summary
+
+        # Applied to the stored copy so turns saved while the LLM was running
+        # are kept, and turns saved later keep the new summary.
+        self.store.update(session_id, apply)
+
+
+_worker: Optional[SummaryWorker] = None
+
+
+def get_summary_worker() -> SummaryWorker:
+    """Return the process-wide :class:`SummaryWorker`."""
+
+    global _worker
+    if _worker is None:
+        _worker = SummaryWorker(get_session_store())
+    return _worker
@@ -0,0 +1,227 @@
+"""Startup warm-up and keep-alive of the models behind a chat turn.
+
+Without it the first request after a deploy or an idle period loads the
+embedding model, opens the Chroma client and waits for Ollama to load the
+LLM, which can take half a minute.  :class:`Warmer` does that work in a
+background thread when the app starts and then pings every configured
+Ollama model with an empty prompt each ``interval`` seconds during working
+``hours`` so the server does not evict it.  :meth:`Warmer.status` reports
+what is currently warm.
+"""
+from __future__ import annotations
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+import threading
+import time
+
+from config import (
+    KEEPALIVE_HOURS,
+    KEEPALIVE_INTERVAL,
+    LLM_CONTEXT_WINDOW,
+    OLLAMA_BASE_URLS,
+    OLLAMA_WARM_MODELS,
+)
+from .llm import GenerationOptions, make_llm
+from .llm.routing import routed_models
+from .llm.scheduler import Priority, get_scheduler
+
+log = logging.getLogger(__name__)
+
+
+def parse_hours(spec: str) -> Optional[Tuple[int, int]]:
+    """Parse ``"start-end"`` local hours; ``None`` (always) when empty."""
+
+    if not spec or not spec.strip():
+        return None
+    start, end = spec.split("-", 1)
+    return int(start) % 24, int(end) % 24
+
+
+def in_hours(hours: Optional[Tuple[int, int]], now: Optional[datetime] = None) -> bool:
+    """``True`` if ``now`` falls in ``hours``; ranges may wrap midnight."""
+
+    if hours is None:
+        return True
+    start, end = hours
+    hour = (now or datetime.now()).hour
+    if start <= end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+
+def _is_loaded(model: str, running: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Entry of ``/api/ps`` for ``model``; an untagged name matches ``:latest``."""
+
+    names = {model} if ":" in model else {model, f"{model}:latest"}
+    for entry in running:
+        if entry.get("name") in names or entry.get("model") in names:
+            return entry
+    return None
+
+
+@dataclass
+class _Component:
+    state: str = "cold"
+    warmed_at: Optional[float] = None
+    load_ms: float = 0.0
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "warmed_at": self.warmed_at,
+            "load_ms": round(self.load_ms, 1),
+            "error": self.error,
+        }
+
+
+@dataclass
+class _Pinged:
+    model: str
+    base_url: str
+    component: _Component = field(default_factory=_Component)
+
+
+class Warmer:
+    """Preloads the embedding model and Ollama models, then keeps them loaded.
+
+    Parameters
+    ----------
+    models:
+        ``(model, base_url)`` pairs of the Ollama models to keep warm.
+    interval:
+        Seconds between keep-alive pings; ``0`` disables them.
+    hours:
+        Local ``(start, end)`` hours in which pings are sent, or ``None``.
+    embeddings:
+        Also load the embedding model and vector store.
+    """
+
+    def __init__(
+        self,
+        models: List[Tuple[str, str]],
+        interval: float = KEEPALIVE_INTERVAL,
+        hours: Optional[Tuple[int, int]] = None,
+        embeddings: bool = True,
+    ):
+        self.models = [_Pinged(m, u) for m, u in models]
+        self.interval = interval
+        self.hours = hours
+        self.embeddings = _Component() if embeddings else None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Warm up in a background thread and keep pinging until :meth:`stop`."""
+
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="warmer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self) -> None:
+        self.warm_embeddings()
+        self.warm_models()
+        while self.interval > 0 and not self._stop.wait(self.interval):
+            if in_hours(self.hours):
+                self.warm_models()
+
+    def warm_embeddings(self) -> None:
+        """Build the vector store client and run one embedding."""
+
+        if self.embeddings is None:
+            return
+        from .rag.retriever import get_db
+
+        start = time.monotonic()
+        try:
+            db = get_db()
+            db.embed(["warm-up"])
+            db.ensure_document_vectors()
+        except Exception as exc:
+            log.warning("embedding warm-up failed: %s", exc)
+            self.embeddings.state, self.embeddings.error = "error", str(exc)
+            return
+        self.embeddings.state, self.embeddings.error = "warm", None
+        self.embeddings.load_ms = (time.monotonic() - start) * 1000
+        self.embeddings.warmed_at = time.time()
+
+    def warm_models(self) -> None:
+        """Load (or refresh the keep-alive of) every configured model."""
+
+        for target in self.models:
+            llm = make_llm("ollama", target.model, target.base_url)
+            comp = target.component
+            try:
+                with get_scheduler(llm.base_url).slot(Priority.BACKGROUND):
+                    usage = llm.load(GenerationOptions(num_ctx=LLM_CONTEXT_WINDOW))
+            except Exception as exc:
+                log.warning("warm-up of %s failed: %s", target.model, exc)
+                comp.state, comp.error = "error", str(exc)
+                continue
+            comp.state, comp.error = "warm", None
+            comp.load_ms = usage.load_ms
+            comp.warmed_at = time.time()
+
+    def status(self) -> Dict[str, Any]:
+        """Warm/cold state of each component, checked against ``/api/ps``."""
+
+        embeddings = None
+        if self.embeddings is not None:
+            from .rag import retriever
+
+            embeddings = self.embeddings.to_dict()
+            if retriever._db is not None:
+                embeddings["state"] = "warm"
+        running: Dict[str, Any] = {}
+        models = []
+        for target in self.models:
+            llm = make_llm("ollama", target.model, target.base_url)
+            info = target.component.to_dict()
+            info.update(model=target.model, base_url=llm.base_url)
+            if llm.base_url not in running:
+                try:
+                    running[llm.base_url] = llm.running_models()
+                except Exception as exc:
+                    running[llm.base_url] = exc
+            loaded = running[llm.base_url]
+            if isinstance(loaded, Exception):
+                info.update(state="unknown", error=str(loaded))
+            else:
+                entry = _is_loaded(target.model, loaded)
+                info["state"] = "warm" if entry else "cold"
+                info["expires_at"] = entry.get("expires_at") if entry else None
+            models.append(info)
+        return {
+            "embeddings": embeddings,
+            "models": models,
+            "keepalive": {
+                "interval": self.interval,
+                "hours": "%d-%d" % self.hours if self.hours else "",
+                "active": self.interval > 0 and in_hours(self.hours),
+            },
+        }
+
+
+_warmer: Optional[Warmer] = None
+_warmer_lock = threading.Lock()
+
+
+def get_warmer() -> Warmer:
+    """Return the process-wide :class:`Warmer` for the configured models."""
+
+    global _warmer
+    with _warmer_lock:
+        if _warmer is None:
+            names = list(dict.fromkeys(OLLAMA_WARM_MODELS + routed_models("ollama")))
+            models = [(m, url) for m in names for url in OLLAMA_BASE_URLS]
+            _warmer = Warmer(models, KEEPALIVE_INTERVAL, parse_hours(KEEPALIVE_HOURS))
+    return _warmer
@@ -0,0 +1,29 @@
+import os
+import tempfile
+
+import pytest
+
+# Sessions written through the app's shared store go to a scratch directory
+# instead of the repository; set before any test module imports ``config``.
+os.environ.setdefault("SESSION_DIR", tempfile.mkdtemp(prefix="test-sessions-"))
+
+
+class FakeWorker:
+    """Summary worker stand-in recording submitted turns."""
+
+    def __init__(self, submitted):
+        self.submitted = submitted
+
+    def submit(self, session_id, user, assistant, user_id=None):
+        self.submitted.append((session_id, user, assistant))
+
+
+@pytest.fixture
+def submitted(monkeypatch):
+    """Turns the chat router queues for summarising during the test."""
+
+    import api.routers.chat as chat_router
+
+    turns = []
+    monkeypatch.setattr(chat_router, "get_summary_worker", lambda: FakeWorker(turns))
+    return turns
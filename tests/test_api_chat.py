@@ -4,21 +4,19 @@ sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
 from fastapi.testclient import TestClient
 from core.models import ChatChunk
 from core import pipeline
-from core.prompts import renderer
+import api.routers.chat as chat_router
 import app.main as main
 
 client = TestClient(main.app)
 
 
-def test_sse_stream(monkeypatch):
-    def fake_stream(req):
+def test_sse_stream(monkeypatch, submitted):
+    async def fake_stream(req, cancel=None):
         yield ChatChunk(type="meta", text="{}")
         yield ChatChunk(type="delta", text="hi")
         yield ChatChunk(type="done", sources=[], usage={})
 
-    monkeypatch.setattr(pipeline, "chat_stream", fake_stream)
-    monkeypatch.setattr(renderer, "generate_title", lambda s: "title")
-    monkeypatch.setattr(renderer, "update_summary", lambda old, u, a: "summary")
+    monkeypatch.setattr(pipeline, "achat_stream", fake_stream)
 
     with client.stream(
         "POST",
@@ -32,3 +30,86 @@ def test_sse_stream(monkeypatch):
     assert "event: meta" in body
     assert "event: delta" in body
     assert "event: done" in body
+    assert '"summary_pending": true' in body
+    assert [(u, a) for _, u, a in submitted] == [("hi", "hi")]
+
+
+def test_sse_disconnect_cancels_generation(monkeypatch, submitted):
+    import asyncio
+
+    state = {}
+
+    async def fake_stream(req, cancel=None):
+        yield ChatChunk(type="meta", text="{}")
+        try:
+            await asyncio.sleep(30)
+        finally:
+            state["cancelled"] = cancel.is_set()
+        yield ChatChunk(type="done", sources=[], usage={})
+
+    class GoneRequest:
+        polls = 0
+
+        async def is_disconnected(self):
+            self.polls += 1
+            return self.polls > 1
+
+    monkeypatch.setattr(pipeline, "achat_stream", fake_stream)
+    monkeypatch.setattr(chat_router, "SSE_DISCONNECT_POLL", 0.01)
+
+    async def run():
+        resp = await chat_router.chat(
+            request=GoneRequest(),
+            message="hi",
+            session_id="12345678-1234-1234-1234-123456789099",
+            persona="",
+            inactive=None,
+            template_id="rag_chat",
+            top_k=8,
+            flush_ms=None,
+            flush_bytes=None,
+            stream=True,
+        )
+        return [part async for part in resp.body_iterator]
+
+    body = asyncio.run(asyncio.wait_for(run(), 5))
+    assert state["cancelled"]
+    assert not any("event: done" in part for part in body)
+    assert submitted == []
+
+
+def test_coalesce_deltas_batches_after_first_token():
+    import asyncio
+    from api.sse import coalesce_deltas
+
+    def delta(t):
+        return ChatChunk(type="delta", text=t)
+
+    async def run():
+        q = asyncio.Queue()
+        for t in ("a", "b", "c"):
+            q.put_nowait(delta(t))
+        q.put_nowait(ChatChunk(type="done"))
+        q.put_nowait(None)
+        merged = [c async for c in coalesce_deltas(q, 1000, 512)]
+
+        q = asyncio.Queue()
+        out = coalesce_deltas(q, 20, 512)
+        q.put_nowait(delta("x"))
+        first = await out.__anext__()
+        q.put_nowait(delta("y"))
+        timed = await asyncio.wait_for(out.__anext__(), 1)
+        sized = [c async for c in coalesce_deltas(_filled([delta("a"), delta("bc"), delta("de"), None]), 1000, 3)]
+        return merged, first, timed, sized
+
+    def _filled(items):
+        q = asyncio.Queue()
+        for i in items:
+            q.put_nowait(i)
+        return q
+
+    merged, first, timed, sized = asyncio.run(run())
+    assert [(c.type, c.text) for c in merged[:-1]] == [("delta", "a"), ("delta", "bc"), ("done", None)]
+    assert merged[-1] is None
+    assert first.text == "x" and timed.text == "y"
+    assert [c.text for c in sized[:-1]] == ["a", "bcde"]
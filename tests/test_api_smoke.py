@@ -6,7 +6,6 @@ from fastapi.testclient import TestClient
 import app.main as main
 from core import pipeline
 from core.models import ChatResponse, Source
-from core.prompts import renderer
 from core.rag import retriever
 from app.auth.session import SessionValidationMiddleware
 
@@ -20,12 +19,10 @@ SessionValidationMiddleware.dispatch = _bypass
 client = TestClient(main.app)
 
 
-def test_chat_endpoint(monkeypatch):
-    def fake_chat_once(req):
+def test_chat_endpoint(monkeypatch, submitted):
+    async def fake_chat_once(req):
         return ChatResponse(text="hi", sources=[Source(id="1")], usage={})
-    monkeypatch.setattr(pipeline, "chat_once", fake_chat_once)
-    monkeypatch.setattr(renderer, "generate_title", lambda s: "title")
-    monkeypatch.setattr(renderer, "update_summary", lambda old, u, a: "summary")
+    monkeypatch.setattr(pipeline, "achat_once", fake_chat_once)
     res = client.post(
         "/chat",
         data={"message": "hi", "session_id": "12345678-1234-1234-1234-123456789012"},
@@ -34,6 +31,7 @@ def test_chat_endpoint(monkeypatch):
     assert res.status_code == 200
     data = res.json()
     assert data["response"]
+    assert data["summary_pending"] and len(submitted) == 1
 
 
 def test_search_endpoint(monkeypatch):
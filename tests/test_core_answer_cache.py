@@ -0,0 +1,63 @@
+import sys, pathlib
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+from core.models import ChatRequest
+from core import pipeline
+from core.llm import Generation
+
+
+def test_answer_cache_matches_close_questions_with_same_segments():
+    import chromadb
+    from core.rag.answer_cache import AnswerCache, answer_key
+
+    cache = AnswerCache(chromadb.EphemeralClient(), "answers_test", max_distance=0.05)
+    cache.clear()
+    segments = [{"id": "s1", "source": "a.pdf"}, {"id": "s2", "source": "b.pdf"}]
+    key = answer_key(["s2", "s1"], "rag_chat", "")
+    cache.store("how do I reset?", [1.0, 0.0, 0.0], key, "Hold the button.", segments)
+    assert cache.lookup([0.99, 0.05, 0.0], key) == "Hold the button."
+    assert cache.lookup([0.0, 1.0, 0.0], key) is None
+    assert cache.lookup([1.0, 0.0, 0.0], answer_key(["s1"], "rag_chat", "")) is None
+    assert cache.lookup([1.0, 0.0, 0.0], answer_key(["s2", "s1"], "rag_chat", "", model="ollama:other")) is None
+    assert cache.lookup([1.0, 0.0, 0.0], answer_key(["s2", "s1"], "rag_chat", "", options={"temperature": 1})) is None
+
+    cache.store("what is the warranty?", [0.0, 0.0, 1.0], key, "Two years.", segments, used=segments[1:])
+    assert cache.lookup_with_sources([0.0, 0.0, 1.0], key) == ("Two years.", [{"id": "s2", "source": "b.pdf"}])
+    assert cache.invalidate_segments(["s2"]) == 2
+    assert cache.lookup([1.0, 0.0, 0.0], key) is None
+
+
+def test_chat_once_reuses_semantic_answer(monkeypatch):
+    import chromadb
+    from types import SimpleNamespace
+    from core.rag.answer_cache import AnswerCache
+
+    calls = []
+    monkeypatch.setattr(pipeline, "ANSWER_CACHE_ENABLED", True)
+    monkeypatch.setattr(
+        pipeline.renderer, "complete",
+        lambda prompt, user_id=None, context=None: calls.append(prompt) or Generation("ok"),
+    )
+    monkeypatch.setattr(
+        pipeline.retriever, "search",
+        lambda q, top_k=8, exclude_sources=None: [{"id": "s1", "source": "a.pdf", "text": "t"}],
+    )
+    vectors = {"How do I reset it?": [1.0, 0.0], "how do i reset it": [0.999, 0.01]}
+    monkeypatch.setattr(pipeline.retriever, "embed_query", lambda q: vectors[q])
+    db = SimpleNamespace(answers=AnswerCache(chromadb.EphemeralClient(), "answers_smoke"))
+    db.answers.clear()
+    monkeypatch.setattr(pipeline.retriever, "get_db", lambda: db)
+
+    from core.llm.context import ConversationState
+
+    stale = ConversationState("other-model", "p", [1, 2]).to_dict()
+    first = pipeline.chat_once(ChatRequest(message="How do I reset it?"))
+    second = pipeline.chat_once(ChatRequest(message="how do i reset it", llm_context=stale))
+    assert first.text == second.text == "ok"
+    assert len(calls) == 1 and second.usage == {"answer_cache_hit": 1}
+    assert second.llm_context == stale and [s.title for s in second.sources] == ["a.pdf"]
+
+    req = ChatRequest(message="how do i reset it")
+    live = ConversationState(pipeline.renderer.active_model(), pipeline._prefix_key(req), [1, 2]).to_dict()
+    third = pipeline.chat_once(req.model_copy(update={"llm_context": live}))
+    assert len(calls) == 2 and "answer_cache_hit" not in third.usage
@@ -0,0 +1,55 @@
+import sys, pathlib
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+from core.rag.extractors import iter_text_pages, iter_markdown_pages, iter_html_pages
+
+
+def test_text_pages_are_bounded_and_paragraph_aligned(tmp_path):
+    para = "word " * 40
+    f = tmp_path / "big.txt"
+    f.write_text("\n\n".join(f"{i} {para}" for i in range(50)), encoding="utf-8")
+    pages = list(iter_text_pages(f, page_chars=1000))
+    assert len(pages) > 1
+    assert [p["page"] for p in pages] == list(range(1, len(pages) + 1))
+    assert all(len(p["text"]) <= 1000 for p in pages)
+    assert pages[1]["text"].split()[0].isdigit()
+
+
+def test_text_pages_split_single_long_line(tmp_path):
+    f = tmp_path / "log.txt"
+    f.write_text("é" * 3000, encoding="utf-8")
+    pages = list(iter_text_pages(f, page_chars=1000))
+    assert "".join(p["text"] for p in pages) == "é" * 3000
+
+
+def test_markdown_sections_and_stripping(tmp_path):
+    f = tmp_path / "doc.md"
+    f.write_text(
+        "# Intro\n\nSome **bold** and [a link](http://x).\n\n"
+        "## Setup\n\n- install `tool`\n\n```\n# not a heading\n```\n",
+        encoding="utf-8",
+    )
+    pages = list(iter_markdown_pages(f))
+    assert len(pages) == 2
+    assert pages[0]["text"] == "Intro\n\nSome bold and a link."
+    assert "install tool" in pages[1]["text"]
+    assert "# not a heading" in pages[1]["text"]
+
+
+def test_markdown_keeps_snake_case_identifiers(tmp_path):
+    f = tmp_path / "doc.md"
+    f.write_text("call foo_bar_baz and __init__, `my_func_name` or _this_ and __that one__\n", encoding="utf-8")
+    text = list(iter_markdown_pages(f))[0]["text"]
+    assert text == "call foo_bar_baz and __init__, my_func_name or this and that one"
+
+
+def test_html_sections_skip_scripts(tmp_path):
+    f = tmp_path / "doc.html"
+    f.write_text(
+        "<html><head><title>t</title><style>p{}</style></head><body>"
+        "<h1>One</h1><p>First &amp; foremost</p><script>var x;</script>"
+        "<h2>Two</h2><p>Second</p></body></html>",
+        encoding="utf-8",
+    )
+    pages = list(iter_html_pages(f))
+    assert [p["text"] for p in pages] == ["One\n\nFirst & foremost", "Two\n\nSecond"]
@@ -0,0 +1,177 @@
+import sys, pathlib
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+from core.rag.ingest import IngestConfig, IngestPipeline
+from core.rag.dedup import SketchIndex, simhash, hamming
+
+
+class FakeCollection:
+    def __init__(self):
+        self.rows = {}
+
+    def add(self, ids, documents, metadatas, embeddings):
+        for i, d, m in zip(ids, documents, metadatas):
+            self.rows[i] = (d, m)
+
+    def delete(self, ids):
+        for i in ids:
+            self.rows.pop(i, None)
+
+
+class FakeDB:
+    def __init__(self):
+        self.collection = FakeCollection()
+        self.deleted = []
+
+    def embed(self, docs):
+        return [[float(len(d))] for d in docs]
+
+    def build_entry(self, text, idx, source, tags=None, start=None, end=None, segment_id=None):
+        _id = segment_id or f"{source}:{idx}"
+        return _id, text, {"source": source, "segment_index": idx}
+
+    def delete_by_source(self, source):
+        self.deleted.append(source)
+        self.collection.rows = {k: v for k, v in self.collection.rows.items() if v[1]["source"] != source}
+
+
+def fake_chunker(text):
+    return [(p, {"char_range": (0, len(p))}) for p in text.split("\n\n") if p.strip()]
+
+
+def test_pipeline_ingests_files_and_reports(tmp_path):
+    for i in range(3):
+        (tmp_path / f"doc{i}.txt").write_text(
+            "\n\n".join(f"paragraph {j} of document number {i}" for j in range(4)), encoding="utf-8"
+        )
+    db = FakeDB()
+    done = []
+    cfg = IngestConfig(parse_workers=2, chunk_workers=2, embed_batch_size=3, queue_size=2, parse_processes=False)
+    report = IngestPipeline(cfg, db=db, chunker=fake_chunker, on_file_done=done.append).run(
+        sorted(tmp_path.glob("*.txt"))
+    )
+    assert len(db.collection.rows) == 12
+    assert sorted(f.source for f in done) == ["doc0.txt", "doc1.txt", "doc2.txt"]
+    assert all(f.ok and f.segments == 4 for f in report.files)
+    stats = report.to_dict()["stages"]
+    assert stats["embed"]["items"] == 12 and stats["write"]["items"] == 12
+
+
+def test_pipeline_isolates_failures(tmp_path):
+    (tmp_path / "good.txt").write_text("a perfectly good paragraph of text", encoding="utf-8")
+    (tmp_path / "bad.txt").write_text("this paragraph will explode the chunker", encoding="utf-8")
+
+    def chunker(text):
+        if "explode" in text:
+            raise RuntimeError("boom")
+        return fake_chunker(text)
+
+    db = FakeDB()
+    cfg = IngestConfig(parse_workers=1, chunk_workers=1, parse_processes=False)
+    report = IngestPipeline(cfg, db=db, chunker=chunker).run(
+        [tmp_path / "bad.txt", tmp_path / "missing.txt", tmp_path / "good.txt"]
+    )
+    results = {f.source: f for f in report.files}
+    assert results["good.txt"].ok
+    assert "boom" in results["bad.txt"].error
+    assert "FileNotFoundError" in results["missing.txt"].error
+    assert [d for d, _ in db.collection.rows.values()] == ["a perfectly good paragraph of text"]
+
+
+def test_simhash_near_duplicates_are_close():
+    a = "The quick brown fox jumps over the lazy dog near the quiet river bank today"
+    b = "The quick brown fox jumps over the lazy dog near the quiet river bank today!"
+    c = "Completely unrelated sentence about configuring vector databases offline"
+    assert hamming(simhash(a), simhash(b)) == 0
+    assert hamming(simhash(a), simhash(c)) > 3
+
+
+def test_pipeline_skips_and_links_duplicates(tmp_path):
+    boiler = "\n\n".join(f"standard licence clause number {j} applies to this manual" for j in range(3))
+    (tmp_path / "v1.txt").write_text(boiler + "\n\nversion one specific release notes here", encoding="utf-8")
+    (tmp_path / "v2.txt").write_text(boiler + "\n\nversion two specific release notes here", encoding="utf-8")
+    db = FakeDB()
+    db.sketches = SketchIndex(tmp_path / "sketches.sqlite3")
+    cfg = IngestConfig(parse_workers=1, chunk_workers=1, parse_processes=False, dedup="link")
+    pipeline = IngestPipeline(cfg, db=db, chunker=fake_chunker)
+    first = pipeline.run([tmp_path / "v1.txt"])
+    second = pipeline.run([tmp_path / "v2.txt"])
+    assert first.files[0].duplicates == 0 and first.files[0].segments == 4
+    assert second.files[0].duplicates == 3 and second.files[0].segments == 1
+    assert db.sketches.linked_count("v2.txt") == 3
+    orphans = db.sketches.remove_source("v1.txt")
+    assert sorted(o.source for o in orphans) == ["v2.txt"] * 3
+
+
+def test_bulk_ingest_discovery_and_checkpoint(tmp_path):
+    from core.rag.bulk_ingest import Checkpoint, discover_files
+    from core.rag.ingest import FileResult
+
+    (tmp_path / "a").mkdir()
+    (tmp_path / "a" / "drafts").mkdir()
+    (tmp_path / "a" / "one.txt").write_text("one", encoding="utf-8")
+    (tmp_path / "a" / "drafts" / "two.md").write_text("two", encoding="utf-8")
+    (tmp_path / "three.pdf").write_bytes(b"%PDF")
+    (tmp_path / "ignored.bin").write_bytes(b"x")
+    rel = lambda files: [f.relative_to(tmp_path).as_posix() for f in files]
+    assert rel(discover_files([tmp_path])) == ["three.pdf", "a/one.txt", "a/drafts/two.md"]
+    assert rel(discover_files([tmp_path], include=["*.txt", "*.md"], exclude=["*/drafts/*"])) == ["a/one.txt"]
+
+    ckpt_path = tmp_path / "ckpt.jsonl"
+    ckpt = Checkpoint(ckpt_path)
+    one = tmp_path / "a" / "one.txt"
+    ckpt.record(FileResult(path=str(one), source="one.txt", segments=1))
+    ckpt.record(FileResult(path=str(tmp_path / "three.pdf"), source="three.pdf", error="boom"))
+    resumed = Checkpoint(ckpt_path)
+    assert resumed.is_done(one)
+    assert not resumed.is_done(tmp_path / "three.pdf")
+    one.write_text("one, edited", encoding="utf-8")
+    assert not resumed.is_done(one)
+
+
+def test_failed_rerun_keeps_earlier_segments(tmp_path):
+    f = tmp_path / "doc.txt"
+    f.write_text("first paragraph of the manual text\n\nsecond paragraph of the manual text", encoding="utf-8")
+    db = FakeDB()
+    db.sketches = SketchIndex(tmp_path / "sketches.sqlite3")
+    cfg = IngestConfig(parse_workers=1, chunk_workers=1, parse_processes=False, dedup="link")
+    IngestPipeline(cfg, db=db, chunker=fake_chunker).run([f])
+    before = dict(db.collection.rows)
+
+    f.write_text("first paragraph of the manual text\n\na brand new third paragraph here", encoding="utf-8")
+
+    def embed(docs):
+        raise RuntimeError("embedding server down")
+
+    db.embed = embed
+    report = IngestPipeline(cfg, db=db, chunker=fake_chunker).run([f])
+    assert "embedding server down" in report.files[0].error
+    assert db.collection.rows == before and db.deleted == []
+    assert db.sketches.linked_count("doc.txt") == 0
+    assert db.sketches.check_and_add("a brand new third paragraph here", "x", "doc.txt") is None
+
+
+def test_failed_run_against_dbmanager_restores_no_own_duplicates(tmp_path):
+    from core.rag import retriever
+
+    f = tmp_path / "doc.txt"
+    f.write_text(
+        "a repeated paragraph of the manual text\n\nanother paragraph entirely\n\n"
+        "a repeated paragraph of the manual text",
+        encoding="utf-8",
+    )
+    db = retriever.DBManager(tmp_path / "chroma", "docs", model=object())
+    calls = []
+
+    def embed(docs):
+        calls.append(docs)
+        if len(calls) == 1:
+            raise RuntimeError("embedding server down")
+        return [[float(len(d)), 1.0] for d in docs]
+
+    db.embed = embed
+    cfg = IngestConfig(parse_workers=1, chunk_workers=1, embed_batch_size=2, parse_processes=False, dedup="link")
+    report = IngestPipeline(cfg, db=db, chunker=fake_chunker).run([f])
+    assert "embedding server down" in report.files[0].error
+    assert db.collection.count() == 0
+    assert db.sketches.linked_count("doc.txt") == 0
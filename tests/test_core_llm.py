@@ -0,0 +1,353 @@
+import sys, pathlib
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from core.llm import make_llm, OllamaLLM
+
+
+class StubOllama(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        data = json.dumps({"models": [{"name": "m:latest", "expires_at": "2030-01-01T00:00:00Z"}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append(body)
+        if body.get("stream"):
+            lines = [{"response": t, "done": False} for t in ("Hel", "lo")]
+            lines.append({
+                "response": "", "done": True, "prompt_eval_count": 7, "eval_count": 2,
+                "eval_duration": 500_000_000, "load_duration": 20_000_000, "prompt_eval_duration": 30_000_000,
+                "context": [1, 2, 3],
+            })
+            data = "".join(json.dumps(l) + "\n" for l in lines).encode()
+        else:
+            data = json.dumps({"response": "hello", "done": True}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def _serve_stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOllama)
+    server.requests = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+@pytest.fixture
+def stub_ollama():
+    server, url = _serve_stub()
+    yield server, url
+    server.shutdown()
+    server.server_close()
+
+
+def test_ollama_reuses_pooled_connection(stub_ollama):
+    server, url = stub_ollama
+    llm = OllamaLLM(model="m", base_url=url)
+    assert llm.generate_text("a") == "hello"
+    assert "".join(llm.stream_text("b")) == "Hello"
+    assert llm.generate_text("c") == "hello"
+    assert llm.pool_stats() == {"requests": 3, "connections": 1, "reused": 2, "async_requests": 0}
+
+
+def test_make_llm_caches_clients():
+    assert make_llm("ollama", "x", "http://h:1") is make_llm("ollama", "x", "http://h:1")
+    assert make_llm("ollama", "x", "http://h:1") is not make_llm("ollama", "y", "http://h:1")
+
+
+def test_ollama_async_generation(stub_ollama):
+    import asyncio
+
+    server, url = stub_ollama
+    llm = OllamaLLM(model="m", base_url=url)
+
+    async def run():
+        text = await llm.agenerate_text("a")
+        tokens = [t async for t in llm.astream_text("b")]
+        return text, tokens
+
+    assert asyncio.run(run()) == ("hello", ["Hel", "lo"])
+    assert [r["stream"] for r in server.requests] == [False, True]
+
+
+def test_response_cache_ttl_and_lru(tmp_path):
+    from core.llm.cache import ResponseCache
+
+    cache = ResponseCache(tmp_path / "c.sqlite3", ttl=60, max_entries=2, max_bytes=1 << 20)
+    cache.put("a", ["x"])
+    cache.put("b", ["y"])
+    assert cache.get("a") == ["x"]
+    cache.put("c", ["z"])
+    assert cache.get("b") is None
+    assert cache.get("a") == ["x"] and cache.get("c") == ["z"]
+    cache.ttl = -1
+    cache.put("d", ["w"])
+    assert cache.get("d") is None
+
+
+def test_renderer_replays_cached_stream(stub_ollama, tmp_path, monkeypatch):
+    from core.llm.cache import ResponseCache
+    from core.prompts import renderer
+
+    server, url = stub_ollama
+    llm = OllamaLLM(model="m", base_url=url)
+    cache = ResponseCache(tmp_path / "c.sqlite3", ttl=60, max_entries=10, max_bytes=1 << 20)
+    monkeypatch.setattr(renderer, "_llm_for", lambda user_id, task="answer": llm)
+    monkeypatch.setattr(renderer, "get_response_cache", lambda: cache)
+
+    assert list(renderer.stream_llm("q")) == ["Hel", "lo"]
+    assert list(renderer.stream_llm("q")) == ["Hel", "lo"]
+    assert renderer.ask_llm("other") == "hello"
+    assert renderer.ask_llm("other") == "hello"
+    assert len(server.requests) == 2
+    assert cache.stats()["hits"] == 2
+
+
+def test_scheduler_serves_by_priority_with_aging():
+    import time
+    from core.llm.scheduler import LLMScheduler, Priority, SchedulerBusy
+
+    sched = LLMScheduler("test", max_concurrency=1, max_queue=3, aging=30)
+    order = []
+    sched.acquire(Priority.INTERACTIVE)
+
+    def worker(priority, name):
+        with sched.slot(priority):
+            order.append(name)
+
+    threads = []
+    for priority, name in [
+        (Priority.BACKGROUND, "summary"),
+        (Priority.INTERACTIVE, "blocking"),
+        (Priority.INTERACTIVE_STREAM, "stream"),
+    ]:
+        t = threading.Thread(target=worker, args=(priority, name))
+        t.start()
+        threads.append(t)
+        time.sleep(0.05)
+    with pytest.raises(SchedulerBusy):
+        sched.acquire(Priority.BACKGROUND)
+    sched.release()
+    for t in threads:
+        t.join(2)
+    assert order == ["stream", "blocking", "summary"]
+    stats = sched.stats()
+    assert stats["active"] == 0 and stats["rejected"] == 1
+    assert stats["by_priority"]["background"]["max_wait_ms"] > 0
+
+    # after waiting long enough a background request outranks a fresh stream
+    sched = LLMScheduler("aged", max_concurrency=1, aging=0.01)
+    sched.acquire()
+    order.clear()
+    first = threading.Thread(target=worker, args=(Priority.BACKGROUND, "old summary"))
+    first.start()
+    time.sleep(0.1)
+    second = threading.Thread(target=worker, args=(Priority.INTERACTIVE_STREAM, "new stream"))
+    second.start()
+    time.sleep(0.05)
+    sched.release()
+    first.join(2)
+    second.join(2)
+    assert order == ["old summary", "new stream"]
+
+
+def test_scheduler_async_waiters_and_cancellation():
+    import asyncio
+    from core.llm.scheduler import LLMScheduler, Priority
+
+    sched = LLMScheduler("async", max_concurrency=1)
+
+    async def run():
+        order = []
+        await sched.aacquire()
+        loser = asyncio.create_task(sched.aacquire(Priority.INTERACTIVE_STREAM))
+
+        async def waiter(name, priority):
+            async with sched.aslot(priority):
+                order.append(name)
+
+        bg = asyncio.create_task(waiter("summary", Priority.BACKGROUND))
+        fg = asyncio.create_task(waiter("chat", Priority.INTERACTIVE))
+        await asyncio.sleep(0.05)
+        loser.cancel()
+        await asyncio.sleep(0)
+        sched.release()
+        await asyncio.wait_for(asyncio.gather(bg, fg), 2)
+        return order
+
+    assert asyncio.run(run()) == ["chat", "summary"]
+    assert sched.stats()["active"] == 0
+
+
+def test_ollama_stream_reports_usage(stub_ollama, monkeypatch):
+    import asyncio
+    from core.prompts import renderer
+
+    server, url = stub_ollama
+    llm = OllamaLLM(model="m", base_url=url)
+    monkeypatch.setattr(renderer, "_llm_for", lambda user_id, task="answer": llm)
+    monkeypatch.setattr(renderer, "get_response_cache", lambda: None)
+
+    stream = renderer.stream_llm("q")
+    assert "".join(stream) == "Hello"
+    usage = stream.usage.to_dict()
+    assert usage["prompt_tokens"] == 7 and usage["completion_tokens"] == 2
+    assert usage["tokens_per_second"] == 4.0
+    assert usage["load_ms"] == 20.0 and usage["ttft_ms"] == 50.0
+
+    async def run():
+        astream = renderer.astream_llm("q")
+        text = "".join([t async for t in astream])
+        return text, astream.usage.completion_tokens
+
+    assert asyncio.run(run()) == ("Hello", 2)
+
+
+def test_ollama_context_round_trip(stub_ollama, monkeypatch):
+    import asyncio
+    from core.llm.context import ConversationState, decode_tokens, encode_tokens
+    from core.prompts import renderer
+
+    assert decode_tokens(encode_tokens([0, 7, 2**32 - 1])) == [0, 7, 2**32 - 1]
+    assert ConversationState.from_dict({"tokens": "not base64!"}) is None
+
+    server, url = stub_ollama
+    llm = OllamaLLM(model="m", base_url=url)
+    monkeypatch.setattr(renderer, "_llm_for", lambda user_id, task="answer": llm)
+    monkeypatch.setattr(renderer, "get_response_cache", lambda: None)
+
+    stream = renderer.stream_llm("first")
+    "".join(stream)
+    assert stream.context == [1, 2, 3]
+    assert "context" not in server.requests[-1]
+
+    async def run():
+        astream = renderer.astream_llm("second", context=stream.context)
+        "".join([t async for t in astream])
+        return astream.context
+
+    assert asyncio.run(run()) == [1, 2, 3]
+    assert server.requests[-1]["context"] == [1, 2, 3]
+
+
+def test_warmer_loads_models_and_reports_state(stub_ollama):
+    from datetime import datetime
+    from core.warmup import Warmer, in_hours, parse_hours
+
+    server, url = stub_ollama
+    warmer = Warmer([("m", url), ("other", url)], interval=0, embeddings=False)
+    warmer.warm_models()
+    assert server.requests[-1] == {
+        "model": "other", "prompt": "", "stream": False, "keep_alive": "30m", "options": {"num_ctx": 4096},
+    }
+    states = {m["model"]: m["state"] for m in warmer.status()["models"]}
+    assert states == {"m": "warm", "other": "cold"}
+
+    assert in_hours(parse_hours("8-18"), datetime(2024, 1, 1, 9))
+    assert not in_hours(parse_hours("8-18"), datetime(2024, 1, 1, 18))
+    assert in_hours(parse_hours("22-6"), datetime(2024, 1, 1, 2))
+    assert in_hours(parse_hours(""), datetime(2024, 1, 1, 3))
+
+
+def test_pool_balances_sticks_and_fails_over(stub_ollama):
+    import socket
+    from core.llm.pool import HealthChecker, OllamaPool, get_endpoint
+
+    server_a, url_a = stub_ollama
+    server_b, url_b = _serve_stub()
+    try:
+        pool = OllamaPool("m", [url_a, url_b])
+        for _ in range(4):
+            assert pool.generate("q").text == "hello"
+        assert len(server_a.requests) == len(server_b.requests) == 2
+
+        first = "".join(pool.stream_text("q", affinity="s1"))
+        sticky = server_a if server_a.requests[-1]["stream"] else server_b
+        before = len(sticky.requests)
+        for _ in range(3):
+            pool.generate("q", affinity="s1")
+        assert first == "Hello" and len(sticky.requests) == before + 3
+        assert all("affinity" not in r for r in sticky.requests)
+
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            dead = f"http://127.0.0.1:{sock.getsockname()[1]}"
+        failover = OllamaPool("m", [dead, url_b])
+        stream = failover.stream_text("q")
+        assert "".join(stream) == "Hello" and stream.context == [1, 2, 3]
+        assert not get_endpoint(dead).healthy
+
+        checker = HealthChecker(interval=0, timeout=1)
+        assert not checker.check(get_endpoint(dead))
+        assert checker.check(get_endpoint(url_b))
+        assert get_endpoint(url_b).serves("m") and not get_endpoint(url_b).serves("other")
+    finally:
+        server_b.shutdown()
+        server_b.server_close()
+
+
+def test_ollama_stream_stops_when_cancelled(stub_ollama):
+    import threading
+
+    server, url = stub_ollama
+    llm = OllamaLLM(model="m", base_url=url)
+    cancel = threading.Event()
+    seen = []
+    for chunk in llm.stream_text("q", cancel=cancel):
+        seen.append(chunk)
+        cancel.set()
+    assert seen == ["Hel"] and "cancel" not in server.requests[-1]
+
+
+def test_generation_options_reach_ollama(stub_ollama, monkeypatch):
+    from core.prompts import renderer
+    from core.settings import UserSettings
+
+    server, url = stub_ollama
+    llm = OllamaLLM(model="m", base_url=url)
+    monkeypatch.setattr(renderer, "_llm_for", lambda user_id, task="answer": llm)
+    monkeypatch.setattr(renderer, "get_response_cache", lambda: None)
+    monkeypatch.setattr(
+        renderer, "_resolve_settings", lambda user_id: UserSettings(user_id="u", temperature=0.7, max_tokens=300)
+    )
+
+    renderer.ask_llm("q")
+    assert server.requests[-1]["options"] == {"num_predict": 300, "num_ctx": 4096, "temperature": 0.7, "top_p": 0.95}
+    renderer.generate_title("User: hi\nAssistant: hello")
+    title = server.requests[-1]["options"]
+    assert title["num_predict"] == 24 and title["stop"] == ["\n"] and title["temperature"] == 0.7
+    renderer.summarize_exchanges("", [("a", "b")])
+    assert server.requests[-1]["options"]["num_predict"] == 256
+
+
+def test_task_routes_prefer_user_then_deployment(monkeypatch):
+    from core.llm import routing
+    from core.settings import UserSettings
+
+    monkeypatch.setattr(
+        routing, "_deployment_routes", routing.parse_routes({"title": "tiny", "summary": {"provider": "openai"}})
+    )
+    user = UserSettings(user_id="u", llm_model="big", task_models={"summary": "small"})
+    assert routing.resolve_route("answer", user) == routing.Route("ollama", "big")
+    assert routing.resolve_route("title", user) == routing.Route("ollama", "tiny")
+    assert routing.resolve_route("summary", user) == routing.Route("ollama", "small")
+    assert routing.resolve_route("summary", UserSettings(user_id="v")) == routing.Route("openai", None)
+    assert routing.routed_models("ollama") == ["tiny"]
@@ -3,10 +3,11 @@ sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
 
 from core.models import ChatRequest
 from core import pipeline
+from core.llm import Generation
 
 
 def test_chat_once_returns_sources(monkeypatch):
-    monkeypatch.setattr(pipeline.renderer, "ask_llm", lambda prompt, user_id=None: "answer")
+    monkeypatch.setattr(pipeline.renderer, "complete", lambda prompt, user_id=None: Generation("answer"))
     monkeypatch.setattr(
         pipeline.retriever,
         "search",
@@ -16,3 +17,23 @@ def test_chat_once_returns_sources(monkeypatch):
     resp = pipeline.chat_once(req)
     assert resp.text == "answer"
     assert resp.sources and resp.sources[0].title == "doc"
+
+
+def test_chat_continues_from_llm_context(monkeypatch):
+    calls = []
+
+    def fake_complete(prompt, user_id=None, context=None):
+        calls.append((prompt, context))
+        return Generation("answer", context=[4, 5, 6])
+
+    monkeypatch.setattr(pipeline.renderer, "complete", fake_complete)
+    monkeypatch.setattr(pipeline.renderer, "active_model", lambda user_id=None: "m")
+    monkeypatch.setattr(pipeline.retriever, "search", lambda q, top_k=8, exclude_sources=None: [])
+    first = pipeline.chat_once(ChatRequest(message="hi", persona="pirate"))
+    second = pipeline.chat_once(ChatRequest(message="again", persona="pirate", llm_context=first.llm_context))
+    pipeline.chat_once(ChatRequest(message="again", persona="clerk", llm_context=first.llm_context))
+
+    assert calls[0][1] is None and "pirate" in calls[0][0]
+    assert calls[1][1] == [4, 5, 6] and "pirate" not in calls[1][0] and "again" in calls[1][0]
+    assert calls[2][1] is None and "clerk" in calls[2][0]
+    assert second.llm_context["model"] == "m"
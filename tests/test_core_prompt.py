@@ -28,3 +28,49 @@ def test_prompt_template_contains_extra_fields():
     tmpl = get_prompt_template("rag_chat")
     data = tmpl.model_dump()
     assert "context_item_format" in data
+
+
+def test_pack_prompt_fills_budget_in_priority_order():
+    history = [
+        ChatExchange(user=f"old question {i}", context_used=[], rag_prompt="", assistant="x" * 200, html_response="")
+        for i in range(3)
+    ]
+    context = [
+        {"text": "best " * 20, "source": "a"},
+        {"text": "huge " * 400, "source": "b"},
+        {"text": "third " * 20, "source": "c"},
+    ]
+    full = renderer.pack_prompt("sum", history, "question", context, template_id="rag_chat")
+    packed = renderer.pack_prompt(
+        "sum", history, "question", context, template_id="rag_chat", token_budget=200
+    )
+    assert [b["source"] for b in packed.context_blocks] == ["a", "c"]
+    assert "huge" not in packed.text and "question" in packed.text
+    assert packed.tokens <= 200 < full.tokens
+    assert "old question 0" not in packed.text
+
+
+def test_score_cliff_drops_weak_hits():
+    from core.prompts.packing import apply_score_cliff
+
+    blocks = [{"score": 0.4}, {"score": 0.5}, {"score": 0.58}, {"score": 1.3}]
+    assert apply_score_cliff(blocks, 1.5) == blocks[:3]
+    assert apply_score_cliff(blocks, 0) == blocks
+
+
+def test_compiled_templates_are_cached_and_brace_safe(tmp_path, monkeypatch):
+    import json
+    from core.prompts import loader
+
+    monkeypatch.setattr(loader, "PROMPTS_DIR", tmp_path)
+    f = tmp_path / "t.json"
+    f.write_text(json.dumps({"id": "t", "name": "T", "system": "s", "user_format": "Q: {user}",
+                             "context_item_format": "{chunk} [{source|unknown}] {{x}}"}))
+    t = renderer._load_template("t")
+    assert renderer._load_template("t") is t
+    prompt = renderer.build_prompt("", [], "a {b}", [{"text": "f(x) = {x}"}], template_id="t")
+    assert "f(x) = {x} [unknown] {x}" in prompt and "Q: a {b}" in prompt
+
+    f.write_text(json.dumps({"id": "t", "name": "T", "system": "s", "user_format": "Question: {user}"}))
+    renderer.invalidate_templates("t")
+    assert renderer._load_template("t").user_format == "Question: {user}"
@@ -0,0 +1,83 @@
+import sys, pathlib
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+from core.rag import retriever
+
+
+class FakeCollection:
+    def __init__(self, n, rows):
+        self.n = n
+        self.rows = rows
+        self.wheres = []
+
+    def count(self):
+        return self.n
+
+    def query(self, query_embeddings, n_results, where=None, include=None):
+        self.wheres.append(where)
+        rows = self.rows[:n_results]
+        return {
+            "documents": [[r.get("text", "") for r in rows]],
+            "metadatas": [[{"source": r["source"]} for r in rows]],
+            "distances": [[0.1 for _ in rows]],
+        }
+
+
+class FakeDB:
+    def __init__(self, n_docs, ready=True):
+        self.doc_collection = FakeCollection(n_docs, [{"source": "a.pdf"}, {"source": "b.pdf"}])
+        self.collection = FakeCollection(1000, [{"text": "seg", "source": "a.pdf"}])
+        self.ready = ready
+
+    def document_vectors_ready(self):
+        return self.ready
+
+    def embed(self, docs):
+        return [[0.0, 1.0] for _ in docs]
+
+
+def test_search_restricts_segments_to_top_documents(monkeypatch):
+    db = FakeDB(n_docs=500)
+    monkeypatch.setattr(retriever, "get_db", lambda: db)
+    monkeypatch.setattr(retriever, "RETRIEVAL_COARSE_DOCS", 2)
+    monkeypatch.setattr(retriever, "RETRIEVAL_COARSE_MIN_DOCS", 10)
+    out = retriever.search("q", top_k=3, exclude_sources={"c.pdf"})
+    assert out[0]["source"] == "a.pdf"
+    assert db.doc_collection.wheres == [{"source": {"$nin": ["c.pdf"]}}]
+    assert db.collection.wheres == [{"source": {"$in": ["a.pdf", "b.pdf"]}}]
+
+
+def test_search_is_flat_for_small_libraries(monkeypatch):
+    db = FakeDB(n_docs=3)
+    monkeypatch.setattr(retriever, "get_db", lambda: db)
+    retriever.search("q", top_k=3)
+    assert db.doc_collection.wheres == []
+    assert db.collection.wheres == [None]
+
+
+def test_search_is_flat_until_document_vectors_cover_every_source(monkeypatch):
+    db = FakeDB(n_docs=500, ready=False)
+    monkeypatch.setattr(retriever, "get_db", lambda: db)
+    monkeypatch.setattr(retriever, "RETRIEVAL_COARSE_DOCS", 2)
+    monkeypatch.setattr(retriever, "RETRIEVAL_COARSE_MIN_DOCS", 10)
+    retriever.search("q", top_k=3)
+    assert db.doc_collection.wheres == [] and db.collection.wheres == [None]
+
+
+def test_document_vectors_follow_segment_changes(tmp_path):
+    db = retriever.DBManager(tmp_path, "docs", model=object())
+    db.collection.add(
+        ids=["old1", "old2"],
+        documents=["aa", "bbbb"],
+        metadatas=[{"source": "legacy.txt"}, {"source": "legacy.txt"}],
+        embeddings=[[2.0, 1.0], [4.0, 1.0]],
+    )
+    assert not db.document_vectors_ready()
+    db._backfill.join()
+    assert db.document_vectors_ready()
+    vec = db.doc_collection.get(ids=["legacy.txt"], include=["embeddings"])["embeddings"][0]
+    assert list(vec) == [3.0, 1.0]
+
+    db.delete_segments(["old2"])
+    vec = db.doc_collection.get(ids=["legacy.txt"], include=["embeddings"])["embeddings"][0]
+    assert list(vec) == [2.0, 1.0]
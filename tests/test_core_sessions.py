@@ -0,0 +1,153 @@
+import sys, pathlib
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+import json
+
+from core.sessions import ChatSession, SessionStore, SQLiteSessionStore
+
+
+def _session(turns):
+    session = ChatSession.new(user_id="u")
+    for i in range(turns):
+        session.add_exchange(f"q{i}", [{"source": "a"}], "", f"**a{i}**", usage={"n": i})
+    return session
+
+
+def test_json_store_writes_compact_files_without_html(tmp_path):
+    store = SessionStore(tmp_path)
+    session = _session(2)
+    store.save(session)
+
+    raw = (tmp_path / f"{session.session_id}.json").read_text()
+    assert "html_response" not in raw and "\n" not in raw
+    loaded = store.load(session.session_id)
+    assert loaded.history == session.history
+    assert loaded.history[1].html == "<p><strong>a1</strong></p>\n"
+    assert [f.name for f in tmp_path.iterdir() if not f.name.startswith("index.")] == [f"{session.session_id}.json"]
+
+
+def test_sqlite_store_inserts_only_new_exchanges(tmp_path):
+    store = SQLiteSessionStore(tmp_path / "sessions.sqlite3")
+    session = _session(3)
+    store.save(session)
+    first_rows = [h.seq for h in session.history]
+
+    session = store.load(session.session_id)
+    session.add_exchange("q3", [], "", "a3")
+    session.trim_history(2)
+    session.title, session.llm_context = "title", {"model": "m"}
+    store.save(session)
+
+    rows = store._conn.execute("SELECT seq, data FROM exchanges ORDER BY seq").fetchall()
+    assert [seq for seq, _ in rows] == first_rows[2:] + [session.history[-1].seq]
+    assert json.loads(rows[0][1])["user"] == "q2"
+    loaded = store.load(session.session_id)
+    assert [h.user for h in loaded.history] == ["q2", "q3"]
+    assert (loaded.title, loaded.llm_context, loaded.user_id) == ("title", {"model": "m"}, "u")
+
+    empty = ChatSession.new()
+    store.save(empty)
+    store.prune_empty()
+    assert not store.exists(empty.session_id) and store.exists(session.session_id)
+    store.delete(session.session_id)
+    assert store.load(session.session_id) is None
+
+
+def test_session_index_lists_pages_and_prunes(tmp_path):
+    import os
+    import time
+
+    for store in (SessionStore(tmp_path / "json"), SQLiteSessionStore(tmp_path / "db.sqlite3")):
+        full = [_session(n) for n in (1, 2, 3)]
+        for s in full:
+            store.save(s)
+            time.sleep(0.01)
+        fresh, stale = ChatSession.new(), ChatSession.new()
+        store.save(fresh)
+        store.save(stale)
+
+        page = store.list_meta(limit=2, offset=0)
+        assert [m["id"] for m in page] == [full[2].session_id, full[1].session_id]
+        assert [m["exchanges"] for m in store.list_meta(offset=2)] == [1]
+
+        if isinstance(store, SessionStore):
+            path = store._session_path(stale.session_id)
+            os.utime(path, (0, 0))
+            store.index.remove(stale.session_id)
+            store.reindex()
+        else:
+            store._conn.execute("UPDATE sessions SET modified = 0 WHERE session_id = ?", (stale.session_id,))
+        assert store.prune_empty(min_age=60) == 1
+        assert store.exists(fresh.session_id) and not store.exists(stale.session_id)
+        assert len(store.list_meta(include_empty=True)) == 4
+
+
+def test_session_cache_writes_behind_and_flushes_on_close(tmp_path):
+    from core.sessions import SessionCache
+
+    backend = SessionStore(tmp_path)
+    cache = SessionCache(backend, size=2, flush_interval=60, dirty_limit=100)
+    sessions = [_session(1) for _ in range(3)]
+    for s in sessions:
+        cache.save(s)
+    assert backend.list_sessions() == [] and cache.stats()["cached"] == 3
+
+    assert cache.load(sessions[0].session_id) is sessions[0]
+    with cache.lock(sessions[0].session_id):
+        sessions[0].add_exchange("again", [], "", "ok")
+    cache.save(sessions[0])
+
+    cache.close()
+    assert cache.stats()["dirty"] == 0 and cache.writes == 3
+    assert [h.user for h in backend.load(sessions[0].session_id).history] == ["q0", "again"]
+
+    cache.load(sessions[1].session_id)
+    assert cache.stats()["cached"] <= 2
+    fresh = SessionCache(backend, size=2)
+    assert fresh.load(sessions[2].session_id).history == sessions[2].history
+    assert fresh.stats()["misses"] == 1
+
+
+def test_update_applies_changes_to_the_stored_copy(tmp_path):
+    store = SessionStore(tmp_path)
+    stale = _session(1)
+    store.save(stale)
+
+    def summarise(current):
+        current.title, current.summary = "Title", "summary"
+
+    store.update(stale.session_id, summarise)
+    store.update(stale.session_id, lambda s: s.add_exchange("q1", [], "", "a1"))
+    saved = store.load(stale.session_id)
+    assert (saved.title, saved.summary) == ("Title", "summary")
+    assert [h.user for h in saved.history] == ["q0", "q1"]
+    assert store.update("missing", summarise) is None and not store.exists("missing")
+
+
+def test_session_cache_writes_copies_outside_the_session_lock(tmp_path):
+    import threading
+    from core.sessions import SessionCache
+
+    class SlowBackend(SQLiteSessionStore):
+        def save(self, session):
+            writing.set()
+            blocked.wait(5)
+            super().save(session)
+
+    writing, blocked = threading.Event(), threading.Event()
+    cache = SessionCache(SlowBackend(tmp_path / "s.sqlite3"), size=4, flush_interval=60)
+    session = _session(2)
+    cache.save(session)
+    flusher = threading.Thread(target=cache.flush)
+    flusher.start()
+    assert writing.wait(5)
+    assert cache.lock(session.session_id).acquire(timeout=1)
+    cache.lock(session.session_id).release()
+    cache.update(session.session_id, lambda s: s.add_exchange("q2", [], "", "a2"))
+    blocked.set()
+    flusher.join()
+    cache.flush()
+    cache.flush()
+
+    assert all(h.seq is not None for h in session.history)
+    assert [h.user for h in cache.backend.load(session.session_id).history] == ["q0", "q1", "q2"]
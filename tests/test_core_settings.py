@@ -0,0 +1,18 @@
+import sys, pathlib
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+
+def test_settings_cache_writes_through_and_sees_file_changes(tmp_path, monkeypatch):
+    from core import settings
+
+    monkeypatch.setattr(settings, "USERS_DIR", tmp_path)
+    s = settings.load_settings("cached")
+    assert not (tmp_path / "cached.json").exists()
+    assert settings.load_settings("cached") is s
+
+    updated = settings.update_settings("cached", {"max_tokens": 64})
+    assert settings.load_settings("cached") is updated
+    assert '"max_tokens": 64' in (tmp_path / "cached.json").read_text()
+
+    (tmp_path / "cached.json").write_text('{"user_id": "cached", "max_tokens": 1024}')
+    assert settings.load_settings("cached").max_tokens == 1024
@@ -3,18 +3,20 @@ sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
 
 from core.models import ChatRequest
 from core import pipeline
+from core.llm import Generation, Usage
 
 
 def test_chat_once(monkeypatch):
-    def fake_ask(prompt, user_id=None):
-        return "ok"
-    monkeypatch.setattr(pipeline.renderer, "ask_llm", fake_ask)
+    def fake_complete(prompt, user_id=None):
+        return Generation("ok", Usage(prompt_tokens=3, completion_tokens=1))
+    monkeypatch.setattr(pipeline.renderer, "complete", fake_complete)
     monkeypatch.setattr(
         pipeline.retriever, "search", lambda q, top_k=8, exclude_sources=None: []
     )
     req = ChatRequest(message="hi", top_k=0)
     resp = pipeline.chat_once(req)
     assert resp.text == "ok"
+    assert resp.usage["prompt_tokens"] == 3 and resp.usage["completion_tokens"] == 1
 
 
 def test_chat_stream(monkeypatch):
@@ -30,3 +32,55 @@ def test_chat_stream(monkeypatch):
     assert chunks[0].type == "meta"
     assert any(c.type == "delta" for c in chunks)
     assert chunks[-1].type == "done"
+
+
+def test_achat_stream(monkeypatch):
+    import asyncio
+
+    async def fake_astream(prompt, user_id=None):
+        for t in ("a", "b"):
+            yield t
+    monkeypatch.setattr(pipeline.renderer, "astream_llm", fake_astream)
+    monkeypatch.setattr(
+        pipeline.retriever, "search", lambda q, top_k=8, exclude_sources=None: []
+    )
+
+    async def collect():
+        return [c async for c in pipeline.achat_stream(ChatRequest(message="hi", top_k=0))]
+
+    chunks = asyncio.run(collect())
+    assert [c.type for c in chunks] == ["meta", "delta", "delta", "done"]
+
+
+def test_achat_stream_cancel_stops_generation(monkeypatch):
+    import asyncio
+    import threading
+
+    cancel = threading.Event()
+    closed = []
+
+    async def fake_astream(prompt, user_id=None, cancel=None):
+        try:
+            for t in ("a", "b", "c"):
+                yield t
+        finally:
+            closed.append(True)
+
+    monkeypatch.setattr(pipeline.renderer, "astream_llm", fake_astream)
+    monkeypatch.setattr(pipeline.renderer, "answer_budget", lambda user_id=None: 100)
+    monkeypatch.setattr(pipeline.retriever, "search", lambda q, top_k=8, exclude_sources=None: [])
+    before = pipeline.cancel_metrics()
+
+    async def collect():
+        out = []
+        async for c in pipeline.achat_stream(ChatRequest(message="hi", top_k=0), cancel=cancel):
+            out.append(c)
+            if c.type == "delta":
+                cancel.set()
+        return out
+
+    chunks = asyncio.run(collect())
+    assert [c.type for c in chunks] == ["meta", "delta"] and closed
+    after = pipeline.cancel_metrics()
+    assert after["streams"] == before["streams"] + 1
+    assert after["tokens_saved"] == before["tokens_saved"] + 99
@@ -0,0 +1,39 @@
+import sys, pathlib
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+from core.prompts import renderer
+from core.sessions import BaseSessionStore, ChatSession
+from core.summarizer import SummaryWorker
+
+
+class FakeStore(BaseSessionStore):
+    def __init__(self, session):
+        self.session = session
+        self.saves = 0
+
+    def load(self, session_id):
+        return self.session if session_id == self.session.session_id else None
+
+    def save(self, session):
+        self.saves += 1
+        self.session = session
+
+
+def test_worker_coalesces_rapid_turns(monkeypatch):
+    calls = []
+    monkeypatch.setattr(renderer, "generate_title", lambda s, user_id=None: "title")
+    monkeypatch.setattr(
+        renderer, "summarize_exchanges", lambda old, ex, user_id=None: calls.append(list(ex)) or "summary"
+    )
+    session = ChatSession.new(user_id="default")
+    store = FakeStore(session)
+    worker = SummaryWorker(store, delay=0.2)
+    for i in range(3):
+        worker.submit(session.session_id, f"q{i}", f"a{i}")
+    assert worker.is_pending(session.session_id)
+    worker.stop()
+
+    assert calls == [[("q0", "a0"), ("q1", "a1"), ("q2", "a2")]]
+    assert store.saves == 1
+    assert (store.session.title, store.session.summary) == ("title", "summary")
+    assert not worker.is_pending(session.session_id)